@@ -1,144 +1,379 @@
-import os
 import time
-from datetime import datetime
-from google.cloud import videointelligence, firestore
-import google.generativeai as genai
-import json
-from google.oauth2 import service_account
+import logging
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from google.cloud import firestore
+
+from annotation_cache import get_person_tracks
+from live_stream import IncrementalDensityMonitor, ReplaySource
+from firestore_batch import BatchedWriter
+from surge_detector import DetectorRegistry, SurgeDetector
+from video_sources import VideoSource, load_sources
+from multi_source import SourceScheduler, summarize_frames
+from kinematics import IncrementalTurbulence, summarize_frames_with_flow
+from heatmap import store_heatmaps, zone_density, ZONE_ROWS, ZONE_COLS
+from clients import get_genai, lazy_firestore
+from metrics import ALERTS_FIRED, FIRESTORE_WRITES, stage_timer
+from geo_index import geo_fields
+from rollups import RollupAggregator
+
+log = logging.getLogger(__name__)
+
+# ✅ Shared Firestore client, created on first use (Gemini is configured lazily too)
+db = lazy_firestore()
 
-# ✅ Load Firebase credentials from environment variable
-service_account_info = json.loads(os.environ["GOOGLE_APPLICATION_CREDENTIALS_JSON"])
-credentials = service_account.Credentials.from_service_account_info(service_account_info)
-
-# ✅ GOOGLE CLOUD SERVICES SETUP
-PROJECT_ID = "cedar-spring-455002-r4"
-DATABASE_ID = "crowddensity"
-
-# ✅ Initialize Firestore using the credentials
-db = firestore.Client(credentials=credentials, project=PROJECT_ID, database=DATABASE_ID)
-
-# ✅ GOOGLE CLOUD GEMINI API SETUP
-genai.configure(api_key=os.environ["GEMINI_API_KEY"])
 # ✅ CONSTANTS
 THRESHOLD_COUNT = 18  # People count threshold
 THRESHOLD_DURATION = 1  # In seconds (testing mode)
 FPS = 10  # Frames per second
 FRAME_LIMIT = THRESHOLD_DURATION * FPS
 VIDEO_FILE = "gs://stampede_video/video.mp4"
+DEFAULT_CAMERA_ID = "default"
+ALERT_HYSTERESIS = 0  # People below THRESHOLD_COUNT before a surge is considered over
+ZONE_THRESHOLD_COUNT = None  # People in one heatmap zone that count as a surge (None = off)
+TURBULENCE_THRESHOLD = None  # Zone counter-flow/acceleration score (0-1) that lowers the threshold (None = off)
+TURBULENT_THRESHOLD_FACTOR = 0.6  # Share of THRESHOLD_COUNT that is enough while a zone is turbulent
 
 # ✅ DEFAULT LOCATION
 DEFAULT_LOCATION = {"latitude": 19.0760, "longitude": 72.8777}  # Mumbai, India
 
-# ✅ Tracking Variables
-high_crowd_frames = []
-last_alert_time = None
+# ✅ DEFAULT SOURCE (used when no video_sources are configured)
+DEFAULT_SOURCE = VideoSource(
+    DEFAULT_CAMERA_ID, VIDEO_FILE, DEFAULT_LOCATION["latitude"], DEFAULT_LOCATION["longitude"],
+    THRESHOLD_COUNT, THRESHOLD_DURATION
+)
+
+# ✅ ALERT MESSAGES
+ALERT_MESSAGE_TTL = 3600  # In seconds, generated messages are reused this long
+TEMPLATE_ALERT_MESSAGE = (
+    "⚠️ {severity} crowd density: {count}+ people detected for {duration} seconds. "
+    "Please take necessary precautions."
+)
+
+def source_thresholds(source):
+    """``(threshold, duration)`` of a source, falling back to the module defaults."""
+    return source.threshold or THRESHOLD_COUNT, source.duration or THRESHOLD_DURATION
+
+
+def detector_settings(source):
+    threshold, duration = source_thresholds(source)
+    return {
+        "threshold": threshold,
+        "window_frames": max(1, int(duration * FPS)),
+        "cooldown": duration,
+        "hysteresis": ALERT_HYSTERESIS,
+        "turbulence_threshold": TURBULENCE_THRESHOLD,
+        "turbulence_factor": TURBULENT_THRESHOLD_FACTOR
+    }
+
+
+# ✅ Surge detectors for live cameras, one per camera/zone id
+live_detectors = DetectorRegistry(**detector_settings(DEFAULT_SOURCE))
+
+
+def new_detector(source=DEFAULT_SOURCE):
+    """A fresh detector for one batch run, so runs never share state."""
+    return SurgeDetector(source.camera_id, **detector_settings(source))
+
+
+def live_detector(source=DEFAULT_SOURCE):
+    return live_detectors.get(source.camera_id, **detector_settings(source))
 
+# ✅ Memoized AI messages per (threshold, duration, severity), generated off the frame loop
+alert_message_cache = TTLCache(maxsize=32, ttl=ALERT_MESSAGE_TTL)
+alert_message_lock = threading.Lock()
+alert_message_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="alert-message")
 
-def generate_ai_alert_message():
+
+def severity_bucket(people_count, threshold=THRESHOLD_COUNT):
+    """Buckets a people count relative to the alert threshold."""
+    if people_count >= 2 * threshold:
+        return "critical"
+    if people_count >= 1.5 * threshold:
+        return "high"
+    return "elevated"
+
+
+def generate_ai_alert_message(severity="high", threshold=THRESHOLD_COUNT, duration=THRESHOLD_DURATION):
     """Generates a natural language alert message using Gemini AI."""
     prompt = (
-        f"A high crowd density of {THRESHOLD_COUNT}+ people has been detected for {THRESHOLD_DURATION} seconds. "
+        f"A {severity} crowd density of {threshold}+ people has been detected for {duration} seconds. "
         "Describe this situation in a human-friendly way, emphasizing urgency."
     )
 
-    model = genai.GenerativeModel("gemini-1.5-pro-latest")
-    response = model.generate_content(prompt)
+    model = get_genai().GenerativeModel("gemini-1.5-pro-latest")
+    with stage_timer("gemini_call"):
+        response = model.generate_content(prompt)
 
     return response.text if response and response.text else "⚠️ High crowd density detected! Please take necessary precautions."
 
 
-def send_alert():
-    """Sends an AI-enhanced alert to Firestore when the threshold is exceeded."""
-    global high_crowd_frames
+def get_alert_message_future(severity, threshold=THRESHOLD_COUNT, duration=THRESHOLD_DURATION):
+    """Returns the cached (or newly started) AI message generation for these settings."""
+    key = (threshold, duration, severity)
+    with alert_message_lock:
+        future = alert_message_cache.get(key)
+        if future is None or (future.done() and future.exception() is not None):
+            future = alert_message_executor.submit(generate_ai_alert_message, severity, threshold, duration)
+            alert_message_cache[key] = future
+    return future
+
+
+def enrich_alert_message(alerts_ref, future):
+    """Replaces the templated message once the AI text is ready."""
+    def apply(done):
+        try:
+            ai_message = done.result()
+            # ``updated_at`` moves the Gemini cache's data version (gemini_context.alerts_version)
+            alerts_ref.update({"message": ai_message, "message_source": "ai", "updated_at": firestore.SERVER_TIMESTAMP})
+            FIRESTORE_WRITES.inc(path="direct")
+            print(f"📝 AI-Generated Message for alert {alerts_ref.id}: {ai_message}")
+        except Exception as e:
+            print(f"⚠️ Keeping templated message for alert {alerts_ref.id}: {e}")
 
-    if not high_crowd_frames:
+    future.add_done_callback(apply)
+
+
+def send_alert(surge, source=DEFAULT_SOURCE):
+    """Sends an alert to Firestore for a confirmed ``SurgeEvent`` at ``source``.
+
+    The alert is written straight away; if no AI message is cached yet it
+    carries a templated message that is replaced asynchronously.
+    """
+    if not surge.frame_numbers:
         return
 
-    ai_message = generate_ai_alert_message()
+    threshold, duration = source_thresholds(source)
+    severity = severity_bucket(surge.peak_count, threshold)
+    message_future = get_alert_message_future(severity, threshold, duration)
+    ai_ready = message_future.done() and message_future.exception() is None
+    if ai_ready:
+        message = message_future.result()
+    else:
+        message = TEMPLATE_ALERT_MESSAGE.format(
+            severity=severity.capitalize(), count=threshold, duration=duration
+        )
 
     alert_data = {
         "timestamp": datetime.utcnow(),
-        "message": ai_message,
-        "threshold": THRESHOLD_COUNT,
-        "duration_exceeded": THRESHOLD_DURATION,
-        "frame_numbers": high_crowd_frames.copy(),
-        "location": firestore.GeoPoint(DEFAULT_LOCATION["latitude"], DEFAULT_LOCATION["longitude"]),
+        "message": message,
+        "message_source": "ai" if ai_ready else "template",
+        "severity": severity,
+        "threshold": threshold,
+        "duration_exceeded": duration,
+        "frame_numbers": list(surge.frame_numbers),
+        "camera_id": surge.camera_id,
+        "peak_count": surge.peak_count,
+        "location": source.geopoint(),
+        **geo_fields(source.latitude, source.longitude),
         "status": "active"
     }
 
     alerts_ref = db.collection("alerts").document(str(int(time.time())))
     alerts_ref.set(alert_data)
+    FIRESTORE_WRITES.inc(path="direct")
+    ALERTS_FIRED.inc(camera_id=surge.camera_id)
+    if not ai_ready:
+        enrich_alert_message(alerts_ref, message_future)
 
     # 🔍 Debug Terminal Output
     print("🚨 ALERT GENERATED 🚨")
     print(f"🔴 Timestamp: {alert_data['timestamp']}")
-    print(f"📌 People Count Threshold: {THRESHOLD_COUNT}")
-    print(f"⏳ Duration Exceeded: {THRESHOLD_DURATION} seconds")
+    print(f"📌 People Count Threshold: {threshold}")
+    print(f"⏳ Duration Exceeded: {duration} seconds")
     print(f"🎥 Frames Triggering Alert: {alert_data['frame_numbers']}")
-    print(f"📍 Location: {DEFAULT_LOCATION}")
-    print(f"📝 AI-Generated Message: {ai_message}")
-
-    high_crowd_frames.clear()
-
-
-def update_firestore(frame_number, people_count):
-    """Updates Firestore with frame data and checks for alert conditions."""
-    global last_alert_time, high_crowd_frames
-
-    # ✅ Store frame data in Firestore
-    doc_ref = db.collection("crowd_data").document(str(frame_number))
-    doc_ref.set({
+    print(f"📍 Location: {source.camera_id} ({source.latitude}, {source.longitude})")
+    print(f"📝 Message ({alert_data['message_source']}): {message}")
+
+
+def update_firestore(frame_number, people_count, writer=None, detector=None, source=DEFAULT_SOURCE,
+                     turbulence=None):
+    """Updates Firestore with frame data and checks for alert conditions.
+
+    With a ``BatchedWriter`` the frame document is queued for a batched
+    commit; the alert check below still runs for every frame, in order.
+    ``detector`` holds the surge state of the camera being analyzed, and
+    ``turbulence`` (from kinematics) is stored and checked when given.
+    Returns True if this frame fired an alert.
+    """
+    if detector is None:
+        detector = live_detector(source)
+
+    # ✅ Store frame data in Firestore (default camera keeps the plain frame-number id)
+    doc_id = str(frame_number) if source.camera_id == DEFAULT_CAMERA_ID else f"{source.camera_id}_{frame_number}"
+    doc_ref = db.collection("crowd_data").document(doc_id)
+    frame_data = {
         "frame_number": frame_number,
         "people_count": people_count,
-        "location": firestore.GeoPoint(DEFAULT_LOCATION["latitude"], DEFAULT_LOCATION["longitude"])
-    })
-
-    print(f"✅ Firestore Updated: Frame {frame_number}, People Count: {people_count}")
-
-    # ✅ Check alert condition
-    if people_count >= THRESHOLD_COUNT:
-        high_crowd_frames.append(frame_number)
-        if len(high_crowd_frames) >= FRAME_LIMIT:
-            if last_alert_time is None or (time.time() - last_alert_time > THRESHOLD_DURATION):
-                send_alert()
-                last_alert_time = time.time()
+        "camera_id": source.camera_id,
+        "location": source.geopoint()
+    }
+    if turbulence is not None:
+        frame_data["turbulence"] = round(turbulence, 3)
+    if writer is not None:
+        writer.set(doc_ref, frame_data)
     else:
-        high_crowd_frames.clear()
+        doc_ref.set(frame_data)
+        FIRESTORE_WRITES.inc(path="direct")
 
+    log.debug("✅ Firestore Updated: Frame %s, People Count: %s", frame_number, people_count)
 
-def analyze_crowd_density():
-    """Analyzes the video for crowd density using Google Video Intelligence API."""
-    print("🔄 Starting AI Crowd Analysis...")
-    client = videointelligence.VideoIntelligenceServiceClient()
-    features = [videointelligence.Feature.OBJECT_TRACKING]
-    request = videointelligence.AnnotateVideoRequest(input_uri=VIDEO_FILE, features=features)
-
-    operation = client.annotate_video(request=request)
-    print("📽️ Processing video... (this may take a while)")
-
-    result = operation.result(timeout=600)
-    annotations = result.annotation_results[0].object_annotations
+    # ✅ Check alert condition
+    surge = detector.update(frame_number, people_count, turbulence or 0.0)
+    if surge is None:
+        return False
+    send_alert(surge, source)
+    return True
 
-    frame_counts = {}
 
-    for annotation in annotations:
-        if annotation.entity.description.lower() == "person":
-            for frame in annotation.frames:
-                time_offset = frame.time_offset
-                seconds = time_offset.seconds + (time_offset.microseconds / 1e6)
-                frame_number = int(seconds * FPS)
+def analyze_crowd_density(progress=None):
+    """Analyzes the video for crowd density using Google Video Intelligence API.
 
-                frame_counts[frame_number] = frame_counts.get(frame_number, 0) + 1
+    ``progress`` is an optional callback receiving keyword progress updates.
+    """
+    print("🔄 Starting AI Crowd Analysis...")
+    if progress:
+        progress(stage="annotating")
+    tracks = get_person_tracks(VIDEO_FILE)
+
+    summary = process_frame_counts(DEFAULT_SOURCE, *summarize_source(DEFAULT_SOURCE, tracks), progress=progress)
+    if progress:
+        progress(stage="done", writes_flushed=summary["writes_flushed"])
+    print(f"✅ AI-enhanced crowd density analysis completed! {summary}")
+    return summary
+
+
+def summarize_source(source, tracks):
+    """Per-frame counts and grids of a source, plus turbulence when it feeds the alerts."""
+    if TURBULENCE_THRESHOLD is None:
+        return summarize_frames(tracks.seconds, tracks.centroids(), FPS)
+    return summarize_frames_with_flow(tracks.track_id, tracks.seconds, tracks.centroids(), FPS)
+
+
+def process_frame_counts(source, frame_numbers, counts, grids=None, turbulence=None, progress=None):
+    """Stores sorted per-frame counts (and heatmaps) of one source and runs its surge checks."""
+    run_started = datetime.now(timezone.utc)
+    zones = zone_density(grids).tolist() if grids is not None and ZONE_THRESHOLD_COUNT else None
+    zone_detectors = new_zone_detectors(source) if zones else None
+    detector = new_detector(source)
+    frame_list, counts = frame_numbers.tolist(), counts.tolist()
+    turbulence = turbulence.tolist() if turbulence is not None else [None] * len(frame_list)
+    alerts = 0
+
+    with BatchedWriter(db) as writer:
+        for frames_processed, (frame_number, count, score) in enumerate(zip(frame_list, counts, turbulence), 1):
+            alerts += update_firestore(frame_number, count, writer=writer, detector=detector, source=source,
+                                       turbulence=score)
+            if zones:
+                alerts += check_zone_surges(frame_number, zones[frames_processed - 1], zone_detectors)
+            if progress:
+                progress(stage="processing", frames_processed=frames_processed,
+                         frames_total=len(frame_list), writes_flushed=writer.writes_flushed)
+
+        heatmap_docs = store_heatmaps(writer, source, frame_numbers, grids, FPS, run_started) if grids is not None else 0
+        rollups = RollupAggregator(writer, source.camera_id)
+        rollups.add_many(run_started.timestamp() + frame_numbers / FPS, counts)
+        rollup_docs = rollups.flush()
+
+    summary = writer.stats()
+    summary.update({"camera_id": source.camera_id, "frames": len(frame_list), "alerts": alerts,
+                    "heatmap_docs": heatmap_docs, "rollup_docs": rollup_docs})
+    return summary
+
+
+def new_zone_detectors(source):
+    """One detector per heatmap zone, alerting as a sub-source of ``source``."""
+    detectors = {}
+    for row in range(ZONE_ROWS):
+        for col in range(ZONE_COLS):
+            zone = VideoSource(f"{source.camera_id}/zone-{row}-{col}", source.video_uri, source.latitude,
+                               source.longitude, ZONE_THRESHOLD_COUNT, source.duration)
+            detectors[row, col] = (zone, new_detector(zone))
+    return detectors
+
+
+def check_zone_surges(frame_number, zone_counts, zone_detectors):
+    """Feeds one frame's per-zone counts to the zone detectors; returns alerts fired."""
+    alerts = 0
+    for (row, col), (zone, detector) in zone_detectors.items():
+        surge = detector.update(frame_number, zone_counts[row][col])
+        if surge is not None:
+            send_alert(surge, zone)
+            alerts += 1
+    return alerts
+
+
+def analyze_all_sources(sources=None, progress=None):
+    """Analyzes every configured camera concurrently; results are keyed by camera id."""
+    sources = sources if sources is not None else load_sources(DEFAULT_SOURCE)
+    print(f"🔄 Starting AI Crowd Analysis for {len(sources)} sources...")
+
+    results = SourceScheduler().run(
+        sources,
+        summarize=summarize_source,
+        handle=lambda source, frame_counts: process_frame_counts(source, *frame_counts),
+        progress=progress
+    )
+    print(f"✅ Multi-source crowd density analysis completed! {results}")
+    return results
+
+
+def analyze_live_stream(source, progress=None, video_source=DEFAULT_SOURCE):
+    """Runs the density check incrementally over a live track event source.
+
+    ``source`` yields ``live_stream.TrackEvent``s (a ``StreamingAnnotationSource``
+    for a camera, or a ``ReplaySource`` offline). Frames are checked as soon
+    as they close; with TURBULENCE_THRESHOLD set, each frame's turbulence is
+    scored from the last few frames, like the batch runs. The summary
+    reports capture-to-alert latency.
+    """
+    print("📡 Starting live crowd analysis...")
+    monitor = IncrementalDensityMonitor(FPS)
+    flow = IncrementalTurbulence(FPS) if TURBULENCE_THRESHOLD is not None else None
+    detector = live_detector(video_source)
+    frames = 0
+    alert_latencies = []
+
+    with BatchedWriter(db) as writer:
+        rollups = RollupAggregator(writer, video_source.camera_id)
+        for frame_number, track_ids, centroids, captured_at in monitor.consume_frames(source):
+            frames += 1
+            count = len(track_ids)
+            turbulence = flow.update(frame_number, track_ids, centroids) if flow is not None else None
+            rollups.add(captured_at, count)
+            if update_firestore(frame_number, count, writer=writer, detector=detector, source=video_source,
+                                turbulence=turbulence):
+                latency = time.time() - captured_at
+                alert_latencies.append(latency)
+                log.info("⏱️ Alert raised %.2fs after frame %s was captured", latency, frame_number)
+            if progress:
+                progress(stage="streaming", frames_processed=frames, alerts=len(alert_latencies),
+                         writes_flushed=writer.writes_flushed)
+        rollups.flush()
+
+    summary = writer.stats()
+    summary.update({
+        "frames": frames,
+        "alerts": len(alert_latencies),
+        "max_alert_latency_s": round(max(alert_latencies), 3) if alert_latencies else None,
+        "mean_alert_latency_s": round(sum(alert_latencies) / len(alert_latencies), 3) if alert_latencies else None
+    })
+    print(f"✅ Live crowd analysis finished! {summary}")
+    return summary
 
-    for frame_number, count in sorted(frame_counts.items()):
-        update_firestore(frame_number, count)
 
-    print("✅ AI-enhanced crowd density analysis completed!")
+# ✅ Callable by Flask
+def run_ai_crowd_detection(progress=None):
+    return analyze_crowd_density(progress)
 
 
-# ✅ Callable by Flask
-def run_ai_crowd_detection():
-    analyze_crowd_density()
+def run_live_crowd_detection(source=None, progress=None):
+    """Live mode; without a source, replays VIDEO_FILE's tracks in real time."""
+    if source is None:
+        source = ReplaySource(get_person_tracks(VIDEO_FILE))
+    return analyze_live_stream(source, progress)
 
 
 # ✅ Direct CLI Run (if needed)
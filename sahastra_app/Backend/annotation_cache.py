@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+
+from clients import get_storage_client, get_video_client
+from metrics import stage_timer
+
+# ✅ CACHE SETTINGS
+CACHE_DIR = os.environ.get(
+    "ANNOTATION_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".annotation_cache")
+)
+CACHE_MAX_BYTES = int(os.environ.get("ANNOTATION_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+CACHE_FORMAT_VERSION = 1
+DEFAULT_FEATURES = ("OBJECT_TRACKING",)
+PROVIDER = os.environ.get("ANNOTATION_PROVIDER", "videointelligence")  # Or "opencv" for local detection
+ANNOTATION_TIMEOUT = 600  # In seconds
+
+
+class PersonTracks:
+    """Struct-of-arrays view of every person track found in one video.
+
+    Row ``i`` is one sighting of track ``track_id[i]`` at ``seconds[i]`` with
+    its normalized bounding box. Rows keep the order the annotator returned
+    them in (track by track, frame by frame).
+    """
+
+    FIELDS = ("track_id", "seconds", "left", "top", "right", "bottom")
+    DTYPES = (np.int64, np.float64, np.float32, np.float32, np.float32, np.float32)
+
+    def __init__(self, track_id, seconds, left, top, right, bottom):
+        self.track_id = np.asarray(track_id, dtype=np.int64)
+        self.seconds = np.asarray(seconds, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.float32)
+        self.top = np.asarray(top, dtype=np.float32)
+        self.right = np.asarray(right, dtype=np.float32)
+        self.bottom = np.asarray(bottom, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.track_id)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds tracks from ``(track_id, seconds, left, top, right, bottom)`` tuples."""
+        columns = list(zip(*rows)) or [()] * len(cls.FIELDS)
+        return cls(*[np.asarray(col, dtype=dtype) for col, dtype in zip(columns, cls.DTYPES)])
+
+    def frame_numbers(self, fps):
+        """Frame number of every row at the given sampling rate."""
+        return (self.seconds * fps).astype(np.int64)
+
+    def centroids(self):
+        """(N, 2) array of box centres in normalized image coordinates."""
+        x = (self.left + self.right) / 2
+        y = (self.top + self.bottom) / 2
+        return np.stack([x, y], axis=1)
+
+    def iter_points(self, fps):
+        """Yields ``(track_id, frame_number, x, y)`` for every row, in order."""
+        centroids = self.centroids()
+        return zip(
+            self.track_id.tolist(),
+            self.frame_numbers(fps).tolist(),
+            centroids[:, 0].tolist(),
+            centroids[:, 1].tolist()
+        )
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, **{name: getattr(self, name) for name in self.FIELDS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(*[data[name] for name in cls.FIELDS])
+
+
+def video_fingerprint(video_uri):
+    """Returns the object generation/etag of ``video_uri``, or None if unknown.
+
+    Lookup errors also give None, so the analysis runs uncached rather than failing.
+    """
+    try:
+        if video_uri.startswith("gs://"):
+            bucket_name, _, blob_name = video_uri[len("gs://"):].partition("/")
+            blob = get_storage_client().bucket(bucket_name).get_blob(blob_name)
+            if blob is None:
+                return None
+            return f"{blob.generation}:{blob.etag}"
+
+        if os.path.exists(video_uri):
+            stat = os.stat(video_uri)
+            return f"{stat.st_mtime_ns}:{stat.st_size}"
+    except Exception as e:
+        print(f"⚠️ Could not fingerprint {video_uri}: {e}")
+
+    return None
+
+
+class VideoIntelligenceProvider:
+    """Annotates videos with the Google Video Intelligence API."""
+
+    name = "videointelligence"
+
+    def fingerprint(self, video_uri):
+        return video_fingerprint(video_uri)
+
+    def annotate(self, video_uri, features):
+        from google.cloud import videointelligence
+
+        client = get_video_client()
+        request = videointelligence.AnnotateVideoRequest(
+            input_uri=video_uri,
+            features=[videointelligence.Feature[name] for name in features]
+        )
+
+        operation = client.annotate_video(request=request)
+        print("📽️ Processing video... (this may take a while)")
+
+        result = operation.result(timeout=ANNOTATION_TIMEOUT)
+        annotations = result.annotation_results[0].object_annotations
+
+        rows = []
+        for annotation in annotations:
+            if annotation.entity.description.lower() == "person":
+                for frame in annotation.frames:
+                    time_offset = frame.time_offset
+                    seconds = time_offset.seconds + (time_offset.microseconds / 1e6)
+                    box = frame.normalized_bounding_box
+                    rows.append((annotation.track_id, seconds, box.left, box.top, box.right, box.bottom))
+
+        return PersonTracks.from_rows(rows)
+
+
+class StaticProvider:
+    """Local fake annotator serving pre-built tracks, for tests and offline runs."""
+
+    name = "static"
+
+    def __init__(self, tracks_by_uri, fingerprint="static"):
+        self.tracks_by_uri = tracks_by_uri
+        self._fingerprint = fingerprint
+        self.calls = 0
+
+    def fingerprint(self, video_uri):
+        return self._fingerprint
+
+    def annotate(self, video_uri, features):
+        self.calls += 1
+        return self.tracks_by_uri[video_uri]
+
+
+class AnnotationCache:
+    """On-disk cache of person tracks keyed by video URI, generation and features."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, provider=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.provider = provider or VideoIntelligenceProvider()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def key(self, video_uri, fingerprint, features):
+        material = json.dumps(
+            [CACHE_FORMAT_VERSION, self.provider.name, video_uri, fingerprint, sorted(features)]
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _lock_for(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get_person_tracks(self, video_uri, features=DEFAULT_FEATURES):
+        """Returns cached person tracks, annotating the video only on a miss."""
+        fingerprint = self.provider.fingerprint(video_uri)
+        if fingerprint is None:
+            print(f"⚠️ No generation for {video_uri}, annotation will not be cached.")
+            return self.provider.annotate(video_uri, features)
+
+        key = self.key(video_uri, fingerprint, features)
+        path = os.path.join(self.cache_dir, key + ".npz")
+
+        # Concurrent analyses of the same clip wait for one annotation
+        with self._lock_for(key):
+            if os.path.exists(path):
+                try:
+                    started = time.perf_counter()
+                    tracks = PersonTracks.load(path)
+                    os.utime(path)
+                    print(f"⚡ Annotation cache hit for {video_uri} "
+                          f"({len(tracks)} rows in {(time.perf_counter() - started) * 1000:.1f} ms)")
+                    return tracks
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"⚠️ Dropping unreadable cache entry {path}: {e}")
+                    self._remove(path)
+
+            tracks = self.provider.annotate(video_uri, features)
+            self._store(path, tracks)
+            return tracks
+
+    def _store(self, path, tracks):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            tracks.save(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write annotation cache entry: {e}")
+            self._remove(tmp_path)
+            return
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Deletes least recently used entries until the cache fits ``max_bytes``."""
+        try:
+            names = [n for n in os.listdir(self.cache_dir) if n.endswith(".npz")]
+        except FileNotFoundError:
+            return
+
+        entries = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# ✅ Shared default cache
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def make_provider(name=PROVIDER):
+    if name == "opencv":
+        from opencv_detector import OpenCVProvider
+        return OpenCVProvider()
+    if name == "videointelligence":
+        return VideoIntelligenceProvider()
+    raise ValueError(f"Unknown ANNOTATION_PROVIDER {name!r}, expected 'videointelligence' or 'opencv'")
+
+
+def get_annotation_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = AnnotationCache(provider=make_provider())
+        return _default_cache
+
+
+def set_provider(provider):
+    """Swaps the annotator behind the shared cache (e.g. a StaticProvider in tests)."""
+    get_annotation_cache().provider = provider
+
+
+def get_person_tracks(video_uri, features=DEFAULT_FEATURES):
+    with stage_timer("annotation_wait"):
+        return get_annotation_cache().get_person_tracks(video_uri, features)
@@ -1,79 +1,211 @@
-from flask import Flask, request, jsonify
+import time
+BOOT_STARTED = time.perf_counter()
+
+from flask import Flask, request, jsonify, Response, g, stream_with_context
 from flask_cors import CORS
-from datetime import datetime
+import zipfile
+from datetime import datetime, timedelta, timezone
 from google.cloud import firestore
-from google.cloud.firestore_v1 import GeoPoint
-import google.generativeai as genai
-import os
-import json
-from google.oauth2 import service_account
+from google.cloud.firestore_v1.base_query import FieldFilter
 
 # ✅ Import internal modules
-from ai_analysis import run_ai_crowd_detection
+import clients
+import metrics
+metrics.configure_logging()
+from ai_analysis import analyze_all_sources, run_ai_crowd_detection, run_live_crowd_detection
+from live_stream import ReplaySource, StreamingAnnotationSource, file_chunks, resolve_input
 from crowd_navigation import analyze_crowd_density
 from user_bestpath import run_user_exit_assignment
+from pagination import (NEXT_PAGE_HEADER, PageRequestError, build_page_query, parse_limit, parse_select, parse_since,
+                        project, read_page, stream_json_list)
+from jobs import FAILED, JobRunner, QueueFullError
+from gemini_context import (ALERT_SUMMARY_FIELDS, CONTEXT_MAX_ALERTS, CONTEXT_WINDOW_HOURS, GeminiAssistant,
+                            alerts_version)
+from heatmap import load_heatmap, parse_time
+from rollups import DEFAULT_POINTS, MAX_POINTS, load_timeseries
+from track_store import TrackStore, json_chunks
+from live_feed import ChangeFeed, FeedFullError, FeedSource, sse_stream
+import geo_index
+from metrics import FIRESTORE_READS, FIRESTORE_WRITES, REQUEST_SECONDS, count_reads
 
 # ✅ Initialize Flask App
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=[NEXT_PAGE_HEADER])  # Lets browser dashboards read the page cursor
+
+# ✅ Shared Firestore client; created per process on first use (see gunicorn.conf.py)
+db = clients.lazy_firestore()
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-# ✅ Load Firebase credentials from environment variable
-service_account_info = json.loads(os.environ["GOOGLE_APPLICATION_CREDENTIALS_JSON"])
-credentials = service_account.Credentials.from_service_account_info(service_account_info)
 
-# ✅ Firestore Initialization
-PROJECT_ID = "cedar-spring-455002-r4"
-DATABASE_ID = "crowddensity"
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method,
+                                status=str(response.status_code))
+    return response
 
-# ✅ Initialize Firestore using the credentials
-db = firestore.Client(credentials=credentials, project=PROJECT_ID, database=DATABASE_ID)
+# ✅ Background runner for long analyses
+job_runner = JobRunner()
 
-# ✅ Gemini API Configuration
-genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+# ✅ Gemini assistant with budgeted context and response cache
+gemini_assistant = GeminiAssistant()
+
+
+def submit_job(kind, func, params=None):
+    """Queues an analysis and answers right away with its job id."""
+    try:
+        job, created = job_runner.submit(kind, func, params)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+
+    return jsonify({
+        "message": "Job queued." if created else "Identical job already in progress.",
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}"
+    }), 202
+
+
+# ✅ Response field -> Firestore field, for ?select= projections
+ALERT_FIELDS = {"message": "message", "latitude": "location", "longitude": "location", "timestamp": "timestamp"}
+SOS_FIELDS = {"timestamp": "timestamp", "location": "location"}
+
+
+def serialize_alert(doc):
+    data = doc.to_dict()
+    latitude, longitude = geo_index.location_of(data) or (None, None)  # GeoPoint or {latitude, longitude}
+    return {
+        'id': doc.id,
+        'message': data.get('message', 'No message'),
+        'latitude': latitude,
+        'longitude': longitude,
+        'timestamp': data.get('timestamp', 'No timestamp')
+    }
+
+
+def serialize_sos_request(doc):
+    data = doc.to_dict()
+    location = data.get('location', None)
+
+    if location:
+        latitude = location.latitude  # ✅ GeoPoint access
+        longitude = location.longitude
+    else:
+        latitude = None
+        longitude = None
+
+    return {
+        'id': doc.id,
+        'timestamp': str(data.get('timestamp', '')),
+        'location': {
+            'latitude': latitude,
+            'longitude': longitude
+        }
+    }
+
+
+def stream_page(collection_name, field_sources, serialize, since_as_string=False, geo_sources=None):
+    """Streams one newest-first page of a collection as a chunked JSON list.
+
+    Query args: ``limit``, ``start_after`` (id of the last item of the
+    previous page), ``since`` (ISO timestamp) and ``select`` (fields).
+    Pages hold ``limit`` items (100 by default); when more remain the
+    ``X-Next-Start-After`` header carries the next ``start_after``.
+    ``near=lat,lng&radius=metres`` or ``bbox=west,south,east,north``
+    switch to a geohash search, which returns one page without a cursor;
+    it covers ``geo_sources`` (``[(collection, timestamp_as_string)]``) if given.
+    """
+    geo = geo_index.parse_geo_args(request.args)
+    headers = {}
+    if geo is None:
+        query, selected, limit = build_page_query(db.collection(collection_name), request.args, field_sources, since_as_string)
+        docs, next_start_after = read_page(count_reads(query.stream(), collection_name), limit)
+        if next_start_after:
+            headers[NEXT_PAGE_HEADER] = next_start_after
+    else:
+        if request.args.get('start_after'):
+            raise PageRequestError("'start_after' cannot be combined with 'near'/'bbox'")
+        since = request.args.get('since')
+        since = parse_since(since) if since else None
+        selected = parse_select(request.args.get('select'), field_sources)
+        limit = parse_limit(request.args, default=geo_index.DEFAULT_LIMIT)
+        sources = geo_sources or [(collection_name, since_as_string)]
+        docs = geo_index.search_collections(db, sources, geo, limit, since)
+    chunks = stream_json_list(docs, lambda doc: project(serialize(doc), selected), app.json.dumps)
+    return Response(stream_with_context(chunks), status=200, mimetype="application/json", headers=headers)
 
 
 # ✅ GET Alerts
 @app.route('/alerts', methods=['GET'])
 def get_alerts():
     try:
-        alerts_ref = db.collection('alerts')
-        docs = alerts_ref.stream()
-
-        alert_list = []
-        for doc in docs:
-            data = doc.to_dict()
-            alert_list.append({
-                'message': data.get('message', 'No message'),
-                'latitude': data.get('location').latitude if data.get('location') else None,
-                'longitude': data.get('location').longitude if data.get('location') else None,
-                'timestamp': data.get('timestamp', 'No timestamp')
-            })
-
-        return jsonify(alert_list), 200
+        # Geo searches also cover alerts sent through /send_alert, which go to ``alerts2``
+        return stream_page('alerts', ALERT_FIELDS, serialize_alert,
+                           geo_sources=[('alerts', False), ('alerts2', True)])
 
+    except PageRequestError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"🔥 Error fetching alerts: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route("/run_crowd_navigation", methods=["GET"])
+@app.route("/run_crowd_navigation", methods=["GET", "POST"])
 def run_crowd_navigation():
+    # POST runs in the background; GET keeps the blocking behaviour for existing clients
+    if request.method == "POST":
+        return submit_job("crowd_navigation", analyze_crowd_density)
+
     try:
-        results = analyze_crowd_density()
-        return jsonify({
-            "message": "Crowd navigation completed successfully.",
-            "results": results
-                    }), 200
+        filters = parse_track_filters()
+    except PageRequestError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        return track_store_response(analyze_crowd_density(), "Crowd navigation completed successfully.", filters)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def parse_track_filters():
+    """``(track_id, start_frame, end_frame)`` from the query string, None where absent."""
+    filters = []
+    for name in ('track_id', 'start_frame', 'end_frame'):
+        value = request.args.get(name)
+        try:
+            filters.append(int(value) if value is not None else None)
+        except ValueError:
+            raise PageRequestError(f"'{name}' must be an integer")
+    return filters
+
+
+def track_store_response(store, message, filters):
+    """Streams navigation rows; ``?start_frame=&end_frame=`` or ``?track_id=`` narrow them."""
+    track_id, start_frame, end_frame = filters
+    if track_id is not None:
+        store = store.track(track_id)
+    if start_frame is not None or end_frame is not None:
+        store = store.frame_range(start_frame, end_frame)
+    return Response(json_chunks(store, message, app.json.dumps), status=200, mimetype="application/json")
+
+
 # ✅ Internal Utility — Fetch alert data for Gemini
 def fetch_alert_data():
+    # Only the newest alerts of the context window, so a cache miss costs a bounded read
     try:
+        since = datetime.now(timezone.utc) - timedelta(hours=CONTEXT_WINDOW_HOURS)
         alerts_ref = db.collection('alerts')
-        docs = alerts_ref.stream()
+        docs = (alerts_ref.where(filter=FieldFilter('timestamp', '>=', since))
+                .order_by('timestamp', direction=firestore.Query.DESCENDING)
+                .limit(CONTEXT_MAX_ALERTS)
+                .select(ALERT_SUMMARY_FIELDS)
+                .stream())
         alert_data = [doc.to_dict() for doc in docs]
+        FIRESTORE_READS.inc(len(alert_data), collection='alerts')
         print(f"📊 Retrieved {len(alert_data)} records from 'alerts' collection.")
         return alert_data
     except Exception as e:
@@ -88,27 +220,25 @@ def gemini_query():
     if not query:
         return jsonify({"error": "Missing query parameter"}), 400
 
-    crowd_data = fetch_alert_data()
-    if not crowd_data:
+    version = alerts_version(db.collection('alerts'))
+    ai_response, cached = gemini_assistant.answer(query, fetch_alert_data, version)
+    if ai_response is None:
         return jsonify({"ai_response": "The provided data is an empty list, meaning there are no crowd observations."})
 
-    model = genai.GenerativeModel("gemini-1.5-pro-latest")
-    context = f"""
-    You are an AI assistant analyzing crowd movement data.
-    Here is the latest crowd data:\n{crowd_data}\n
-    Answer the admin query based on this data:
-    """
-    response = model.generate_content(context + query)
-
     return jsonify({
         "query": query,
-        "ai_response": response.text
+        "ai_response": ai_response,
+        "cached": cached
     })
 
 
 # ✅ AI Crowd Detection Trigger
-@app.route('/run_ai_crowd_analysis', methods=['GET'])
+@app.route('/run_ai_crowd_analysis', methods=['GET', 'POST'])
 def run_ai_crowd_analysis():
+    # POST runs in the background; GET keeps the blocking behaviour for existing clients
+    if request.method == 'POST':
+        return submit_job("ai_crowd_analysis", run_ai_crowd_detection)
+
     try:
         summary = run_ai_crowd_detection()
         return jsonify({
@@ -119,6 +249,123 @@ def run_ai_crowd_analysis():
         return jsonify({"error": str(e)}), 500
 
 
+# ✅ Multi-camera Crowd Detection
+@app.route('/run_multi_source_analysis', methods=['POST'])
+def run_multi_source_analysis():
+    """Analyzes every camera in ``video_sources`` (or VIDEO_SOURCES_JSON) in parallel."""
+    return submit_job("multi_source_analysis", lambda progress: analyze_all_sources(progress=progress))
+
+
+# ✅ Live (streaming) Crowd Detection
+@app.route('/run_live_crowd_analysis', methods=['POST'])
+def run_live_crowd_analysis():
+    """Body: ``{"stream_path": "camera1.pipe"}`` for a live feed, or
+    ``{"replay_file": "tracks.npz", "speed": 1.0}`` to replay stored tracks.
+
+    Both names are resolved inside LIVE_INPUT_DIR; anything outside it is rejected."""
+    data = request.get_json(silent=True) or {}
+    try:
+        speed = float(data.get("speed", 1.0))
+    except (TypeError, ValueError):
+        speed = 0.0
+    if not 0 < speed < float("inf"):
+        return jsonify({"error": "'speed' must be a positive number"}), 400
+
+    try:
+        if data.get("stream_path"):
+            path = resolve_input(data["stream_path"], allow_pipe=True)
+            source = StreamingAnnotationSource(file_chunks(path))
+            params = {"stream_path": path}
+        elif data.get("replay_file"):
+            path = resolve_input(data["replay_file"])
+            source = ReplaySource.from_file(path, speed)
+            params = {"replay_file": path, "speed": speed}
+        else:
+            source = None
+            params = {}
+    except (ValueError, KeyError, OSError, EOFError, zipfile.BadZipFile) as e:
+        # A truncated or corrupt .npz raises EOFError/BadZipFile from np.load
+        return jsonify({"error": f"Invalid live input: {e}"}), 400
+
+    return submit_job("live_crowd_analysis", lambda progress: run_live_crowd_detection(source, progress), params)
+
+
+# ✅ Crowd Heatmap (latest, or peak per cell over ?start=&end= ISO times)
+@app.route('/heatmap', methods=['GET'])
+def get_heatmap():
+    camera_id = request.args.get('camera_id', 'default')
+    try:
+        start = parse_time(request.args.get('start'))
+        end = parse_time(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': f"Invalid time: {e}"}), 400
+
+    try:
+        heatmap = load_heatmap(db, camera_id, start, end)
+        if heatmap is None:
+            return jsonify({'error': 'No heatmap data for this camera and range'}), 404
+        return jsonify(heatmap), 200
+    except Exception as e:
+        print(f"🔥 Error loading heatmap: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+# ✅ Crowd Time Series (people counts over ?start=&end=, downsampled to ?step= seconds or ?points=)
+@app.route('/crowd_timeseries', methods=['GET'])
+def get_crowd_timeseries():
+    camera_id = request.args.get('camera_id', 'default')
+    try:
+        end = parse_time(request.args.get('end')) or datetime.now(timezone.utc)
+        start = parse_time(request.args.get('start')) or end - timedelta(hours=1)
+    except ValueError as e:
+        return jsonify({'error': f"Invalid time: {e}"}), 400
+
+    try:
+        step = float(request.args['step']) if request.args.get('step') else None
+        points = int(request.args.get('points', DEFAULT_POINTS))
+    except ValueError:
+        return jsonify({'error': "'step' and 'points' must be numbers"}), 400
+    span = (end - start).total_seconds()
+    if span <= 0:
+        return jsonify({'error': "'start' must be before 'end'"}), 400
+    if not 1 <= points <= MAX_POINTS or (step is not None and (step <= 0 or span / step > MAX_POINTS)):
+        return jsonify({'error': f"At most {MAX_POINTS} points per series"}), 400
+
+    try:
+        return jsonify(load_timeseries(db, camera_id, start, end, step, points)), 200
+    except Exception as e:
+        print(f"🔥 Error loading crowd time series: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+# ✅ Background Job Status
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+# ✅ Background Job Result
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job.status == FAILED:
+        return jsonify({"error": job.error}), 500
+    if not job.finished:
+        return jsonify(job.to_dict()), 202
+    if isinstance(job.result, TrackStore):
+        try:
+            filters = parse_track_filters()
+        except PageRequestError as e:
+            return jsonify({'error': str(e)}), 400
+        return track_store_response(job.result, f"Job {job.id} completed successfully.", filters)
+    return jsonify({"job_id": job.id, "results": job.result}), 200
+
+
 # ✅ Alert POST Route
 @app.route('/send_alert', methods=['POST'])
 def send_alert():
@@ -138,11 +385,13 @@ def send_alert():
                 "latitude": latitude,
                 "longitude": longitude
             },
+            **geo_index.geo_fields(latitude, longitude),
             "severity": severity,
             "message": message,
             "status": "active",
             "timestamp": datetime.utcnow().isoformat()
         })
+        FIRESTORE_WRITES.inc(path="direct")
 
         print(f"✅ Alert stored successfully: {alert_ref.id}")
         return jsonify({"message": "Alert sent successfully!", "alert_id": alert_ref.id}), 201
@@ -154,6 +403,10 @@ def send_alert():
 
 @app.route('/send_sos', methods=['POST'])
 def send_sos():
+    """Acknowledged once durably logged; committed to ``sos_requests`` in bulk.
+
+    Optional ``device_id`` collapses repeat presses from one phone.
+    """
     data = request.get_json()
     latitude = data.get("latitude")
     longitude = data.get("longitude")
@@ -162,14 +415,8 @@ def send_sos():
         return jsonify({"error": "Missing required fields: latitude, longitude"}), 400
 
     try:
-        sos_ref = db.collection("sos_requests").document()
-        sos_ref.set({
-            "location": GeoPoint(latitude, longitude),  # ✅ Correct GeoPoint format
-            "timestamp": datetime.utcnow().isoformat()  # ⏰ Store ISO timestamp
-        })
-
-        print(f"✅ SOS request stored successfully: {sos_ref.id}")
-        return jsonify({"message": "SOS request sent successfully!", "sos_id": sos_ref.id}), 201
+        sos_id, duplicate = clients.get_sos_ingestor().submit(latitude, longitude, data.get("device_id"))
+        return jsonify({"message": "SOS request sent successfully!", "sos_id": sos_id, "duplicate": duplicate}), 201
 
     except Exception as e:
         print(f"❌ Error storing SOS request: {e}")
@@ -177,35 +424,68 @@ def send_sos():
 @app.route('/admin/sos_requests', methods=['GET'])
 def get_sos_requests():
     try:
-        sos_ref = db.collection('sos_requests')
-        docs = sos_ref.stream()
+        return stream_page('sos_requests', SOS_FIELDS, serialize_sos_request, since_as_string=True)
 
-        sos_list = []
-        for doc in docs:
-            data = doc.to_dict()
-            location = data.get('location', None)
+    except PageRequestError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"🔥 Error: {e}")
+        return jsonify({'error': str(e)}), 500
 
-            if location:
-                latitude = location.latitude  # ✅ GeoPoint access
-                longitude = location.longitude
-            else:
-                latitude = None
-                longitude = None
 
-            sos_list.append({
-                'id': doc.id,
-                'timestamp': str(data.get('timestamp', '')),
-                'location': {
-                    'latitude': latitude,
-                    'longitude': longitude
-                }
-            })
+# ✅ Live Feed (Server-Sent Events)
+LIVE_FEED_SOURCES = [
+    FeedSource("alerts", "alert", serialize_alert, False),
+    FeedSource("sos_requests", "sos", serialize_sos_request, True)
+]
 
-        return jsonify(sos_list), 200
 
-    except Exception as e:
-        print(f"🔥 Error: {e}")
-        return jsonify({'error': str(e)}), 500
+def get_live_feed():
+    """The worker's single change listener, shared by every connected dashboard."""
+    return clients.get_or_create("live_feed", lambda: ChangeFeed(clients.get_firestore(), LIVE_FEED_SOURCES).start())
+
+
+@app.route('/live_feed', methods=['GET'])
+def live_feed():
+    """Streams new/changed alerts and SOS requests.
+
+    ``events=alert,sos`` narrows the stream; reconnecting clients resume
+    from the ``Last-Event-ID`` header (or ``?last_event_id=``). Each client
+    holds a worker thread, so past MAX_SSE_CONNECTIONS per worker new
+    clients get a 503 and EventSource retries.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    events = request.args.get('events')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be an integer'}), 400
+    events = set(events.split(',')) if events else None
+
+    try:
+        subscription = get_live_feed().subscribe(last_event_id, events)
+    except FeedFullError as e:
+        return jsonify({'error': str(e)}), 503, {"Retry-After": "5"}
+
+    chunks = sse_stream(subscription, app.json.dumps)
+    return Response(stream_with_context(chunks), status=200, mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ✅ Prometheus Metrics (this worker process)
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.registry.render(), status=200, mimetype="text/plain; version=0.0.4")
+
+
+# ✅ Startup Report
+@app.route('/startup_report', methods=['GET'])
+def startup_report():
+    return jsonify(clients.startup_report()), 200
+
+
+clients.record_timing("app_import", time.perf_counter() - BOOT_STARTED)
+print(f"🚀 App imported in {(time.perf_counter() - BOOT_STARTED) * 1000:.0f} ms (clients are created on first use)")
 
 
 # ✅ Run Server
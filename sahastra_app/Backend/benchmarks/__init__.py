@@ -0,0 +1 @@
+"""Synthetic-load benchmarks; see ``benchmarks/run.py``."""
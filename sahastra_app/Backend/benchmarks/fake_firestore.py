@@ -0,0 +1,287 @@
+import time
+import uuid
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from google.cloud import firestore
+
+# What ``count().get()`` yields per aggregation
+AggregationResult = namedtuple("AggregationResult", "alias value read_time")
+# ``on_snapshot`` change entries; ``type.name`` is ADDED/MODIFIED/REMOVED as in the real client
+ChangeType = namedtuple("ChangeType", "name")
+DocumentChange = namedtuple("DocumentChange", "type document")
+
+
+class Counters:
+    """Document reads/writes and round trips seen by a FakeFirestore."""
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.rpcs = 0
+        self._lock = threading.Lock()
+
+    def add(self, reads=0, writes=0, rpcs=1):
+        with self._lock:
+            self.reads += reads
+            self.writes += writes
+            self.rpcs += rpcs
+
+    def reset(self):
+        with self._lock:
+            self.reads = self.writes = self.rpcs = 0
+
+    def to_dict(self):
+        return {"reads": self.reads, "writes": self.writes, "rpcs": self.rpcs}
+
+
+class FakeFirestore:
+    """In-memory stand-in for ``firestore.Client``.
+
+    Covers what the backend uses: documents, batches, ordered/filtered/
+    projected queries with cursors, ``count()`` and ``on_snapshot``.
+    Every round trip sleeps ``latency`` seconds and is counted, so a
+    benchmark shows both time and Firestore cost.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.counters = Counters()
+        self._collections = {}
+        self._listeners = {}
+        self._lock = threading.RLock()
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def seed(self, collection, docs):
+        """Loads documents without counting them as writes."""
+        with self._lock:
+            store = self._collections.setdefault(collection, {})
+            for doc_id, data in docs:
+                store[doc_id] = dict(data)
+
+    def _rpc(self, reads=0, writes=0):
+        self.counters.add(reads, writes)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _docs(self, collection):
+        with self._lock:
+            return list(self._collections.get(collection, {}).items())
+
+    def _write(self, collection, doc_id, data, merge=False, update=False):
+        data = {key: _resolve(value) for key, value in data.items()}
+        with self._lock:
+            store = self._collections.setdefault(collection, {})
+            if update and doc_id not in store:
+                raise KeyError(f"No document to update: {collection}/{doc_id}")
+            before = store.get(doc_id)
+            if (merge or update) and before is not None:
+                store[doc_id] = {**before, **data}
+            else:
+                store[doc_id] = data
+            after = store[doc_id]
+            listeners = list(self._listeners.get(collection, ()))
+
+        for query, callback in listeners:
+            was, now = before is not None and query._accepts(before), query._accepts(after)
+            if not (was or now):
+                continue
+            kind = "MODIFIED" if was and now else "ADDED" if now else "REMOVED"
+            self.counters.add(reads=1, rpcs=0)  # Listeners are billed per changed document
+            change = DocumentChange(ChangeType(kind), FakeSnapshot(self, collection, doc_id, after))
+            docs = [FakeSnapshot(self, collection, i, d) for i, d in query._matching()]
+            callback(docs, [change], datetime.now(timezone.utc))
+
+
+def _resolve(value):
+    # Firestore stores every timestamp in UTC and returns it timezone-aware
+    if value is firestore.SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class FakeDocument:
+    def __init__(self, db, collection, doc_id=None):
+        self._db = db
+        self._collection = collection
+        self.id = doc_id or uuid.uuid4().hex[:20]
+
+    def set(self, data, merge=False):
+        self._db._rpc(writes=1)
+        self._db._write(self._collection, self.id, data, merge)
+
+    def update(self, data):
+        self._db._rpc(writes=1)
+        self._db._write(self._collection, self.id, data, update=True)
+
+    def get(self):
+        self._db._rpc(reads=1)
+        with self._db._lock:
+            data = self._db._collections.get(self._collection, {}).get(self.id)
+        return FakeSnapshot(self._db, self._collection, self.id, data)
+
+
+class FakeSnapshot:
+    def __init__(self, db, collection, doc_id, data, fields=None):
+        self.id = doc_id
+        self.reference = FakeDocument(db, collection, doc_id)
+        self.exists = data is not None
+        self._data = data
+        self._fields = fields
+
+    def to_dict(self):
+        if self._data is None:
+            return None
+        if self._fields is None:
+            return dict(self._data)
+        return {key: value for key, value in self._data.items() if key in self._fields}
+
+    def get(self, field):
+        return self._data[field]
+
+
+class FakeQuery:
+    def __init__(self, db, collection, filters=(), orders=(), limit=None, fields=None, after=None):
+        self._db = db
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._fields = fields
+        self._after = after
+
+    def _copy(self, **changes):
+        state = {"filters": self._filters, "orders": self._orders, "limit": self._limit,
+                 "fields": self._fields, "after": self._after}
+        state.update(changes)
+        return FakeQuery(self._db, self._collection, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=firestore.Query.ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction == firestore.Query.DESCENDING),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=set(field_paths))
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot.id)
+
+    def count(self):
+        return FakeAggregation(self)
+
+    def on_snapshot(self, callback):
+        """Delivers the current results once, then a change per matching write."""
+        with self._db._lock:
+            self._db._listeners.setdefault(self._collection, []).append((self, callback))
+        docs = self._matching()
+        self._db._rpc(reads=len(docs))
+        snapshots = [FakeSnapshot(self._db, self._collection, i, d) for i, d in docs]
+        changes = [DocumentChange(ChangeType("ADDED"), snapshot) for snapshot in snapshots]
+        callback(snapshots, changes, datetime.now(timezone.utc))
+        return FakeWatch(self._db, self._collection, (self, callback))
+
+    def _accepts(self, data):
+        return all(_matches(data.get(field), op, value) for field, op, value in self._filters)
+
+    def _matching(self):
+        docs = [(doc_id, data) for doc_id, data in self._db._docs(self._collection) if self._accepts(data)]
+        for field, descending in reversed(self._orders):
+            docs = [d for d in docs if d[1].get(field) is not None]
+            docs.sort(key=lambda d: d[1][field], reverse=descending)
+        if self._after is not None:
+            ids = [doc_id for doc_id, _ in docs]
+            docs = docs[ids.index(self._after) + 1:] if self._after in ids else []
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return docs
+
+    def stream(self):
+        docs = self._matching()
+        self._db._rpc(reads=max(1, len(docs)))
+        return iter([FakeSnapshot(self._db, self._collection, doc_id, data, self._fields) for doc_id, data in docs])
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, name):
+        super().__init__(db, name)
+        self.id = name
+
+    def document(self, doc_id=None):
+        return FakeDocument(self._db, self._collection, doc_id)
+
+
+class FakeWatch:
+    def __init__(self, db, collection, listener):
+        self._db = db
+        self._collection = collection
+        self._listener = listener
+
+    def unsubscribe(self):
+        with self._db._lock:
+            self._db._listeners.get(self._collection, []).remove(self._listener)
+
+
+class FakeAggregation:
+    def __init__(self, query):
+        self._query = query
+
+    def get(self):
+        # Billed as one read per up to 1000 index entries
+        total = len(self._query._matching())
+        self._query._db._rpc(reads=max(1, -(-total // 1000)))
+        return [[AggregationResult("count", total, None)]]
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, doc_ref, data, merge=False):
+        self._writes.append((doc_ref, data, merge))
+
+    def commit(self):
+        self._db._rpc(writes=len(self._writes))
+        for doc_ref, data, merge in self._writes:
+            self._db._write(doc_ref._collection, doc_ref.id, data, merge)
+        self._writes = []
+
+
+def _matches(actual, op, expected):
+    if op == "in":
+        return actual in expected
+    if actual is None:
+        return False
+    if op == "array_contains":
+        return expected in actual
+    if op == "==":
+        return actual == expected
+    if op == "!=":
+        return actual != expected
+    if op == "<":
+        return actual < expected
+    if op == "<=":
+        return actual <= expected
+    if op == ">":
+        return actual > expected
+    if op == ">=":
+        return actual >= expected
+    raise ValueError(f"Unsupported operator: {op}")
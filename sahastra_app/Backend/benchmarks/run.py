@@ -0,0 +1,389 @@
+"""Synthetic-load benchmarks for the analysis and API hot paths.
+
+Run from the Backend directory::
+
+    python -m benchmarks.run --people 500 --frames 300 --output bench.json
+
+Firestore is replaced by an in-memory fake (``--latency-ms`` per round
+trip), Gemini by a stub model and Video Intelligence by synthetic
+tracks, so results depend only on the code under test. Output is JSON;
+keep one file per commit and diff them to spot regressions.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import platform
+import statistics
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.synthetic import MOTION_MODELS, generate_alerts, generate_exits, generate_tracks, generate_video
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return StubResponse(f"Stub answer for a {len(prompt)}-character prompt.")
+
+
+class StubGenai:
+    """Stands in for the ``google.generativeai`` module."""
+
+    def __init__(self, latency=0.0):
+        self.model = StubModel(latency)
+
+    def GenerativeModel(self, name):
+        return self.model
+
+
+# ✅ Scenarios: each runs one iteration and returns (items processed, extra metrics)
+def bench_crowd_navigation(ctx):
+    import crowd_navigation
+
+    store = crowd_navigation.analyze_crowd_density()
+    return len(store), {}
+
+
+def bench_user_bestpath(ctx):
+    import user_bestpath
+
+    summary = user_bestpath.analyze_crowd_density()
+    return ctx.rows, {key: summary[key] for key in ("exit_changes", "assign_hit_rate") if key in summary}
+
+
+def bench_ai_analysis(ctx):
+    import ai_analysis
+
+    summary = ai_analysis.analyze_crowd_density()
+    return ctx.rows, {"alerts": summary.get("alerts")} if isinstance(summary, dict) else {}
+
+
+def bench_kinematics(ctx):
+    """Velocities, zone flow and turbulence for every track at once; compare frames/sec with ``--fps``."""
+    from kinematics import zone_turbulence
+
+    frames, turbulence = zone_turbulence(ctx.tracks.track_id, ctx.tracks.seconds, ctx.tracks.centroids(), ctx.args.fps)
+    return len(frames), {"tracks_per_frame": ctx.args.people, "max_turbulence": round(float(turbulence.max()), 3)}
+
+
+def bench_alerts_route(ctx):
+    response = ctx.client.get(f"/alerts?limit={ctx.args.page_size}")
+    body = response.get_data()
+    assert response.status_code == 200, body[:200]
+    return len(json.loads(body)), {}
+
+
+def bench_alerts_near(ctx):
+    """``/alerts?near=`` around the venue centre; Firestore reads should track the matches, not ``--alerts``."""
+    response = ctx.client.get(f"/alerts?near=28.6139,77.2090&radius={ctx.args.radius}&limit={ctx.args.page_size}")
+    body = response.get_data()
+    assert response.status_code == 200, body[:200]
+    return len(json.loads(body)), {}
+
+
+def bench_crowd_timeseries(ctx):
+    """Chart of ``--timeseries-hours`` of rollups (seeded once at 10 fps); reads should stay in the single digits."""
+    if not ctx.timeseries_seeded:
+        seed_rollups(ctx)
+    end = datetime.now(timezone.utc).replace(microsecond=0)
+    start = end - timedelta(hours=ctx.args.timeseries_hours)
+    response = ctx.client.get("/crowd_timeseries", query_string={"start": start.isoformat(), "end": end.isoformat()})
+    assert response.status_code == 200, response.get_data()[:200]
+    body = response.get_json()
+    return len(body["points"]), {"rollup_seconds": body["rollup_seconds"]}
+
+
+def seed_rollups(ctx):
+    import numpy as np
+    from firestore_batch import BatchedWriter
+    from rollups import RollupAggregator
+
+    frames = int(ctx.args.timeseries_hours * 3600 * ctx.args.fps)
+    timestamps = time.time() - frames / ctx.args.fps + np.arange(frames) / ctx.args.fps
+    counts = np.random.default_rng(ctx.args.seed).poisson(ctx.args.people / 10, frames)
+    with BatchedWriter(ctx.db, background=False) as writer:
+        rollups = RollupAggregator(writer, "default")
+        rollups.add_many(timestamps, counts)
+        rollups.flush()
+    ctx.timeseries_seeded = True
+
+
+def bench_send_sos(ctx):
+    for i in range(ctx.args.requests):
+        response = ctx.client.post("/send_sos", json={"latitude": 28.61 + i * 1e-3, "longitude": 77.20})
+        assert response.status_code in (200, 201, 202), response.get_data()[:200]
+    return ctx.args.requests, {}
+
+
+def bench_sos_ingest(ctx):
+    """Incident burst straight into the ingestor: every device presses SOS ``sos_repeats`` times."""
+    import clients
+
+    ingestor = clients.get_sos_ingestor()
+    devices = ctx.args.sos_devices
+    presses = [(28.61 + (i % devices) * 1e-4, 77.20, f"device-{ctx.iteration}-{i % devices}")
+               for i in range(devices * ctx.args.sos_repeats)]
+    with ThreadPoolExecutor(max_workers=ctx.args.sos_threads) as pool:
+        duplicates = sum(duplicate for _, duplicate in pool.map(lambda p: ingestor.submit(*p), presses))
+    ingestor.commit()
+    return len(presses), {"duplicates_per_iteration": duplicates}
+
+
+def bench_live_feed(ctx):
+    """Fan-out: ``sse_clients`` subscribers of one worker's feed, ``requests`` alerts written per iteration."""
+    from live_feed import SSE_CONNECTIONS
+
+    if ctx.feed_clients is None:
+        ctx.feed_clients = start_feed_clients(ctx)
+    received = ctx.feed_clients
+
+    written = {}
+    base = [len(r) for r in received]
+    for i in range(ctx.args.requests):
+        ref = ctx.db.collection("alerts").document()
+        written[ref.id] = time.perf_counter()
+        ref.set({"message": f"Live alert {i}", "timestamp": datetime.now(timezone.utc)})
+
+    deadline = time.perf_counter() + 30
+    while any(len(r) - b < len(written) for r, b in zip(received, base)) and time.perf_counter() < deadline:
+        time.sleep(0.001)
+
+    latencies = sorted((at - written[doc_id]) * 1000 for r, b in zip(received, base)
+                       for doc_id, at in r[b:] if doc_id in written)
+    expected = len(written) * len(received)
+    return expected, {
+        "connections": SSE_CONNECTIONS.value(),
+        "delivered_fraction": round(len(latencies) / expected, 4),
+        "delivery_ms_p50": round(latencies[len(latencies) // 2], 3) if latencies else None,
+        "delivery_ms_p99": round(latencies[int(len(latencies) * 0.99)], 3) if latencies else None
+    }
+
+
+def start_feed_clients(ctx):
+    from app import get_live_feed
+
+    feed = get_live_feed()
+    # Fan-out is measured on the feed itself, above the per-worker thread cap of /live_feed
+    feed.max_connections = max(feed.max_connections or 0, ctx.args.sse_clients)
+    received = [[] for _ in range(ctx.args.sse_clients)]
+    ready = threading.Barrier(len(received) + 1)
+
+    def consume(log):
+        events = feed.subscribe()
+        ready.wait()
+        for event in events:
+            if event is not None:
+                log.append((event.data["item"]["id"], time.perf_counter()))
+
+    for log in received:
+        threading.Thread(target=consume, args=(log,), daemon=True).start()
+    ready.wait()
+    return received
+
+
+def bench_opencv_detector(ctx):
+    """Local detection over a synthetic clip; frames/sec per core sizes edge boxes."""
+    from opencv_detector import OpenCVProvider
+
+    if ctx.video_path is None:
+        ctx.video_path = generate_video(os.path.join(tempfile.mkdtemp(prefix="bench_video_"), "clip.avi"),
+                                        seconds=ctx.args.video_seconds, seed=ctx.args.seed)
+    provider = OpenCVProvider(fps=ctx.args.fps, processes=ctx.args.detector_processes)
+    tracks = provider.detect(ctx.video_path)
+    stats = provider.last_stats
+    return stats["frames"], {
+        "processes": stats["processes"],
+        "frame_size": stats["frame_size"],
+        "frames_per_second_per_core": stats["frames_per_second_per_core"],
+        "decode_seconds": stats["decode_seconds"],
+        "detections": len(tracks),
+        "tracks": len(set(tracks.track_id.tolist()))
+    }
+
+
+def bench_gemini_query(ctx):
+    cached = 0
+    for i in range(ctx.args.requests):
+        response = ctx.client.get("/gemini_query", query_string={"query": f"Where is it crowded? {i % 4}"})
+        assert response.status_code == 200, response.get_data()[:200]
+        cached += bool(response.get_json().get("cached"))
+    return ctx.args.requests, {"cached_fraction": round(cached / ctx.args.requests, 3)}
+
+
+SCENARIOS = {
+    "crowd_navigation": bench_crowd_navigation,
+    "user_bestpath": bench_user_bestpath,
+    "ai_analysis": bench_ai_analysis,
+    "kinematics": bench_kinematics,
+    "alerts_route": bench_alerts_route,
+    "alerts_near": bench_alerts_near,
+    "crowd_timeseries": bench_crowd_timeseries,
+    "send_sos": bench_send_sos,
+    "sos_ingest": bench_sos_ingest,
+    "gemini_query": bench_gemini_query,
+    "live_feed": bench_live_feed,
+    "opencv_detector": bench_opencv_detector,
+}
+
+
+class Context:
+    """Fakes and inputs shared by every scenario."""
+
+    def __init__(self, args):
+        self.args = args
+        self.iteration = 0
+        self.feed_clients = None
+        self.timeseries_seeded = False
+        self.video_path = None
+        os.environ.setdefault("ANNOTATION_CACHE_DIR", tempfile.mkdtemp(prefix="bench_annotations_"))
+        os.environ.setdefault("SOS_WAL_DIR", tempfile.mkdtemp(prefix="bench_sos_wal_"))
+
+        import clients
+        import annotation_cache
+        from annotation_cache import StaticProvider
+
+        self.db = FakeFirestore(latency=args.latency_ms / 1000)
+        self.genai = StubGenai(latency=args.model_latency_ms / 1000)
+        clients.set_client("firestore", self.db)
+        clients.set_client("genai", self.genai)
+        self.db.seed("exit_points", generate_exits(args.exits, args.seed))
+        self.db.seed("alerts", generate_alerts(args.alerts, args.seed))
+
+        tracks = generate_tracks(args.people, args.frames, args.fps, args.motion, seed=args.seed)
+        self.rows = len(tracks)
+        self.tracks = tracks
+        import ai_analysis
+        import crowd_navigation
+        import user_bestpath
+
+        uris = {ai_analysis.VIDEO_FILE, crowd_navigation.VIDEO_FILE, user_bestpath.VIDEO_FILE}
+        fingerprint = f"synthetic:{args.people}:{args.frames}:{args.fps}:{args.motion}:{args.seed}"
+        annotation_cache.set_provider(StaticProvider({uri: tracks for uri in uris}, fingerprint))
+
+        from app import app
+        self.client = app.test_client()
+
+
+def summarize(timings):
+    return {
+        "min": round(min(timings), 6),
+        "median": round(statistics.median(timings), 6),
+        "mean": round(statistics.fmean(timings), 6),
+        "max": round(max(timings), 6)
+    }
+
+
+def run_scenario(ctx, name, func, args):
+    for _ in range(args.warmup):
+        ctx.iteration += 1
+        func(ctx)
+
+    ctx.db.counters.reset()
+    timings, items, extra = [], 0, {}
+    for _ in range(args.repeat):
+        ctx.iteration += 1
+        started = time.perf_counter()
+        items, extra = func(ctx)
+        timings.append(time.perf_counter() - started)
+
+    counters = ctx.db.counters.to_dict()
+    median = statistics.median(timings)
+    return {
+        "scenario": name,
+        "iterations": args.repeat,
+        "items_per_iteration": items,
+        "items_per_second": round(items / median, 1) if median else None,
+        "seconds": summarize(timings),
+        "firestore_per_iteration": {key: value / args.repeat for key, value in counters.items()},
+        **extra
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--people", type=int, default=200, help="Tracked people per frame")
+    parser.add_argument("--frames", type=int, default=300, help="Frames of synthetic video")
+    parser.add_argument("--fps", type=float, default=10, help="Frame rate of the synthetic annotations")
+    parser.add_argument("--motion", choices=MOTION_MODELS, default="random_walk")
+    parser.add_argument("--exits", type=int, default=8)
+    parser.add_argument("--alerts", type=int, default=1000, help="Alerts seeded for the read routes")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per iteration for POST/Gemini routes")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--timeseries-hours", type=float, default=6, help="History charted by /crowd_timeseries")
+    parser.add_argument("--radius", type=float, default=300, help="Metres, for the near= query")
+    parser.add_argument("--sos-devices", type=int, default=2000, help="Devices in the SOS burst")
+    parser.add_argument("--sos-repeats", type=int, default=3, help="SOS presses per device")
+    parser.add_argument("--sos-threads", type=int, default=32, help="Concurrent SOS submitters")
+    parser.add_argument("--sse-clients", type=int, default=200, help="Live-feed connections held by one worker")
+    parser.add_argument("--video-seconds", type=float, default=10, help="Length of the synthetic clip for opencv_detector")
+    parser.add_argument("--detector-processes", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Injected latency per Firestore round trip")
+    parser.add_argument("--model-latency-ms", type=float, default=0.0, help="Injected latency per Gemini call")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="Comma-separated scenarios to run")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="Keep the backend's own output")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.only.split(",") if args.only else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+
+    log = io.StringIO()
+    results = []
+    with redirect_stdout(sys.stdout if args.verbose else log):
+        ctx = Context(args)
+        for name in names:
+            results.append(run_scenario(ctx, name, SCENARIOS[name], args))
+            print(f"⏱️ {name}: {results[-1]['seconds']['median'] * 1000:.1f} ms median", file=sys.stderr)
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "verbose")},
+        "results": results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
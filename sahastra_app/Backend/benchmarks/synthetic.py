@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from google.cloud.firestore_v1 import GeoPoint
+
+from annotation_cache import PersonTracks
+from geo_index import geo_fields
+
+# ✅ GENERATOR SETTINGS
+BOX_SIZE = 0.04  # Person bounding box side, normalized
+MOTION_MODELS = ("static", "random_walk", "flow")
+
+
+def generate_tracks(people=200, frames=300, fps=10, motion="random_walk", speed=0.005, seed=0):
+    """Synthetic person tracks, one box per person per frame.
+
+    ``static`` people never move, ``random_walk`` people wander ``speed``
+    per frame, and ``flow`` people head for the bottom edge (an exit
+    rush) with some jitter.
+    """
+    if motion not in MOTION_MODELS:
+        raise ValueError(f"Unknown motion model {motion!r}, expected one of {MOTION_MODELS}")
+    rng = np.random.default_rng(seed)
+
+    steps = np.zeros((frames, people, 2))
+    if motion == "random_walk":
+        steps = rng.normal(0, speed, (frames, people, 2))
+    elif motion == "flow":
+        steps = rng.normal(0, speed / 3, (frames, people, 2))
+        steps[..., 1] += speed
+    steps[0] = 0
+    centers = np.clip(rng.random((people, 2)) + np.cumsum(steps, axis=0), BOX_SIZE, 1 - BOX_SIZE)
+
+    half = BOX_SIZE / 2
+    return PersonTracks(
+        np.tile(np.arange(people, dtype=np.int64), frames),
+        np.repeat(np.arange(frames) / fps, people),
+        (centers[..., 0] - half).ravel(),
+        (centers[..., 1] - half).ravel(),
+        (centers[..., 0] + half).ravel(),
+        (centers[..., 1] + half).ravel()
+    )
+
+
+def generate_video(path, seconds=10, fps=30, width=1280, height=720, people=12, seed=0):
+    """Writes an MJPEG clip of upright figures walking across a textured floor; returns ``path``."""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    floor = rng.integers(90, 160, (height, width, 3), dtype=np.uint8)
+    start = rng.random((people, 2)) * [width, height * 0.6] + [0, height * 0.2]
+    velocity = rng.normal(0, 3, (people, 2))
+    tall = int(height * 0.3)
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    try:
+        for frame in range(int(seconds * fps)):
+            image = floor.copy()
+            for x, y in (start + velocity * frame) % [width, height * 0.8]:
+                x, y = int(x), int(y)
+                cv2.circle(image, (x, y), tall // 8, (40, 40, 60), -1)
+                cv2.rectangle(image, (x - tall // 6, y + tall // 8), (x + tall // 6, y + tall // 2), (30, 30, 120), -1)
+                cv2.line(image, (x - tall // 10, y + tall // 2), (x - tall // 8, y + tall), (20, 20, 20), tall // 16)
+                cv2.line(image, (x + tall // 10, y + tall // 2), (x + tall // 8, y + tall), (20, 20, 20), tall // 16)
+            writer.write(image)
+    finally:
+        writer.release()
+    return path
+
+
+def generate_exits(count=8, seed=0):
+    """``(doc_id, data)`` pairs for the ``exit_points`` collection."""
+    rng = np.random.default_rng(seed)
+    docs = []
+    for i, (x, y) in enumerate(rng.random((count, 2)).tolist()):
+        exit_id = f"exit_{i}"
+        docs.append((exit_id, {
+            "exit_id": exit_id,
+            "coordinates": {"x": x, "y": y},
+            "congestion_level": int(rng.integers(0, 5)),
+            "priority": int(rng.integers(0, 3)),
+            "description": f"Synthetic exit {i}"
+        }))
+    return docs
+
+
+def generate_alerts(count=1000, seed=0, latitude=28.6139, longitude=77.2090):
+    """``(doc_id, data)`` pairs for the ``alerts`` collection, one per second."""
+    rng = np.random.default_rng(seed)
+    started = datetime.now(timezone.utc) - timedelta(seconds=count)
+    docs = []
+    for i in range(count):
+        lat, lon = latitude + rng.normal(0, 0.01), longitude + rng.normal(0, 0.01)
+        docs.append((str(i), {
+            "message": "⚠️ High crowd density detected!",
+            "location": GeoPoint(lat, lon),
+            **geo_fields(lat, lon),
+            "timestamp": started + timedelta(seconds=i),
+            "severity": "high",
+            "camera_id": "default",
+            "peak_count": int(rng.integers(18, 60))
+        }))
+    return docs
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import threading
+
+# ✅ GOOGLE CLOUD SETTINGS
+PROJECT_ID = "cedar-spring-455002-r4"
+DATABASE_ID = "crowddensity"
+
+# ✅ Per-process registry; rebuilt in every forked gunicorn worker
+_clients = {}
+_timings = {}
+_lock = threading.RLock()
+_owner_pid = os.getpid()
+_process_started = time.perf_counter()
+
+
+def reset():
+    """Forgets every client so the current process builds its own (call after fork)."""
+    global _clients, _lock, _owner_pid
+    _clients = {}
+    _lock = threading.RLock()
+    _owner_pid = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset)
+
+
+def _get(name, factory):
+    """Returns the named client, creating it on first use in this process."""
+    if os.getpid() != _owner_pid:
+        reset()
+
+    client = _clients.get(name)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            started = time.perf_counter()
+            client = factory()
+            _timings[name] = time.perf_counter() - started
+            _clients[name] = client
+            print(f"🔌 Initialized {name} in {_timings[name] * 1000:.0f} ms")
+        return client
+
+
+def _make_credentials():
+    from google.oauth2 import service_account
+
+    service_account_info = json.loads(os.environ["GOOGLE_APPLICATION_CREDENTIALS_JSON"])
+    return service_account.Credentials.from_service_account_info(service_account_info)
+
+
+def _make_firestore():
+    from google.cloud import firestore
+
+    return firestore.Client(credentials=get_credentials(), project=PROJECT_ID, database=DATABASE_ID)
+
+
+def _make_genai():
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    return genai
+
+
+def _make_video_client():
+    from google.cloud import videointelligence
+
+    return videointelligence.VideoIntelligenceServiceClient()
+
+
+def _make_streaming_video_client():
+    from google.cloud import videointelligence
+
+    return videointelligence.StreamingVideoIntelligenceServiceClient()
+
+
+def _make_storage_client():
+    from google.cloud import storage
+
+    return storage.Client()
+
+
+def _make_exits_registry():
+    from exits_registry import ExitsRegistry
+
+    return ExitsRegistry(get_firestore()).start()
+
+
+def _make_sos_ingestor():
+    import atexit
+    from sos_ingest import SosIngestor
+
+    ingestor = SosIngestor(get_firestore())
+    atexit.register(ingestor.close)
+    return ingestor
+
+
+def get_credentials():
+    return _get("credentials", _make_credentials)
+
+
+def get_firestore():
+    return _get("firestore", _make_firestore)
+
+
+def get_genai():
+    """The ``google.generativeai`` module, imported and configured on first use."""
+    return _get("genai", _make_genai)
+
+
+def get_video_client():
+    return _get("videointelligence", _make_video_client)
+
+
+def get_streaming_video_client():
+    return _get("videointelligence_streaming", _make_streaming_video_client)
+
+
+def get_storage_client():
+    return _get("storage", _make_storage_client)
+
+
+def get_exits_registry():
+    """Live ``exit_points`` table, loaded once and kept in sync by a listener."""
+    return _get("exits_registry", _make_exits_registry)
+
+
+def get_sos_ingestor():
+    """Write-ahead SOS intake; replays what a crashed worker left behind on creation."""
+    return _get("sos_ingestor", _make_sos_ingestor)
+
+
+def get_or_create(name, factory):
+    """Any other per-process object (listeners, background threads) built on first use."""
+    return _get(name, factory)
+
+
+def set_client(name, client):
+    """Installs a client directly, e.g. an in-memory Firestore fake."""
+    with _lock:
+        _clients[name] = client
+
+
+class LazyClient:
+    """Module-level stand-in that resolves the real client on first attribute access."""
+
+    def __init__(self, getter):
+        self._getter = getter
+
+    def __getattr__(self, name):
+        return getattr(self._getter(), name)
+
+
+def lazy_firestore():
+    return LazyClient(get_firestore)
+
+
+def record_timing(name, seconds):
+    _timings[name] = seconds
+
+
+def startup_report():
+    """Import and client initialization times for this process, in milliseconds."""
+    return {
+        "pid": os.getpid(),
+        "uptime_ms": round((time.perf_counter() - _process_started) * 1000, 1),
+        "timings_ms": {name: round(seconds * 1000, 1) for name, seconds in _timings.items()},
+        "initialized_clients": sorted(_clients)
+    }
@@ -1,20 +1,16 @@
 import os
 import math
-from flask import Flask, jsonify
-from google.cloud import videointelligence, firestore
-import json
-from google.oauth2 import service_account
+from flask import Flask, Response
 
-# ✅ Load Firebase credentials from environment variable
-service_account_info = json.loads(os.environ["GOOGLE_APPLICATION_CREDENTIALS_JSON"])
-credentials = service_account.Credentials.from_service_account_info(service_account_info)
+from annotation_cache import get_person_tracks
+from exit_engine import ExitsTable
+from heatmap import build_heatmaps, exit_density
+from track_store import TRACK_STORE_DIR, TrackStore, json_chunks, save_run
+from clients import get_exits_registry, lazy_firestore
+from metrics import stage_timer
 
-# ✅ FIRESTORE SETUP
-PROJECT_ID = "cedar-spring-455002-r4"
-DATABASE_ID = "crowddensity"
-
-# ✅ Initialize Firestore using the credentials
-db = firestore.Client(credentials=credentials, project=PROJECT_ID, database=DATABASE_ID)
+# ✅ FIRESTORE SETUP (shared client, created on first use)
+db = lazy_firestore()
 
 # ✅ FLASK SETUP
 app = Flask(__name__)
@@ -24,96 +20,66 @@ FPS = 1
 VIDEO_FILE = "gs://stampede_video/video.mp4"
 PENALTY_FACTOR = 10
 PRIORITY_WEIGHT = 1  # You can adjust this
+HEATMAP_CONGESTION_WEIGHT = 0  # Congestion added per person crowding an exit (0 = off)
 
-# ✅ Fetch exits from Firestore with all fields
+# ✅ Exits with all fields (live copy, no Firestore read per run)
 def fetch_exits():
-    print("🔄 Fetching exit points from Firestore...")
-    exit_ref = db.collection("exit_points").stream()
-    exits = {}
-    for doc in exit_ref:
-        data = doc.to_dict()
-        exits[data["exit_id"]] = {
-            "coordinates": data["coordinates"],
-            "congestion_level": data.get("congestion_level", 0),
-            "priority": data.get("priority", 0),
-            "description": data.get("description", "No Description")
-        }
-    print(f"✅ Found {len(exits)} exits: {list(exits.keys())}")
-    return exits
+    return get_exits_registry().exits()
 
 # ✅ Euclidean Distance
 def calculate_distance(coord1, coord2):
     return math.sqrt((coord1["x"] - coord2["x"]) ** 2 + (coord1["y"] - coord2["y"]) ** 2)
 
-# ✅ Best Exit Calculation with Priority
-def find_best_exit(person_coords, exits):
-    best_exit = None
-    best_score = float("inf")
-    for exit_id, exit_data in exits.items():
-        distance = calculate_distance(person_coords, exit_data["coordinates"])
-        congestion = exit_data["congestion_level"]
-        priority = exit_data.get("priority", 0)
-        score = distance + (congestion * PENALTY_FACTOR) - (priority * PRIORITY_WEIGHT)
-
-        if score < best_score:
-            best_score = score
-            best_exit = exit_id
+# ✅ Best Exit Calculation with Priority (single person, walking distance if a venue map is set)
+def find_best_exit(person_coords, exits=None):
+    table = exits if isinstance(exits, ExitsTable) else get_exits_registry().table_for(exits)
+    return table.best_exit_ids([(person_coords["x"], person_coords["y"])], PENALTY_FACTOR, PRIORITY_WEIGHT)[0]
 
-    return best_exit
+# ✅ Best Exit Calculation with Priority (whole crowd)
+def find_best_exits(points, table):
+    """Returns the best exit index for every row of an (N, 2) array of centroids."""
+    return table.best_exit_indices(points, PENALTY_FACTOR, PRIORITY_WEIGHT)
 
 # ✅ Main Video Analysis
-def analyze_crowd_density():
-    client = videointelligence.VideoIntelligenceServiceClient()
-    features = [videointelligence.Feature.OBJECT_TRACKING]
-    request = videointelligence.AnnotateVideoRequest(input_uri=VIDEO_FILE, features=features)
-
+def analyze_crowd_density(progress=None):
     print("🔄 Processing video...")
-    operation = client.annotate_video(request=request)
-    result = operation.result(timeout=600)
-    annotations = result.annotation_results[0].object_annotations
-
-    exits = fetch_exits()
-    output_data = []
-
-    for annotation in annotations:
-        if annotation.entity.description.lower() == "person":
-            person_id = annotation.track_id
-            for frame in annotation.frames:
-                time_offset = frame.time_offset
-                seconds = time_offset.seconds + (time_offset.microseconds / 1e6)
-                frame_number = int(seconds * FPS)
-
-                box = frame.normalized_bounding_box
-                x, y = (box.left + box.right) / 2, (box.top + box.bottom) / 2
-                person_coords = {"x": x, "y": y}
-                best_exit = find_best_exit(person_coords, exits)
-
-                exit_data = exits[best_exit]
-                description = exit_data.get("description", "No Description")
-
-                output_data.append({
-                    "frame": frame_number,
-                    "person_id": person_id,
-                    "x": round(x, 2),
-                    "y": round(y, 2),
-                    "exit_id": best_exit,
-                    "exit_description": description
-                })
-
+    if progress:
+        progress(stage="annotating")
+    tracks = get_person_tracks(VIDEO_FILE)
+
+    if progress:
+        progress(stage="assigning exits", rows_total=len(tracks))
+    with stage_timer("exit_fetch"):
+        table = get_exits_registry().table()
+    if HEATMAP_CONGESTION_WEIGHT:
+        # Average crowding around each exit over the clip adds to its congestion
+        _, grids = build_heatmaps(tracks.frame_numbers(FPS), tracks.centroids())
+        if len(grids):
+            congestion = table.congestion + HEATMAP_CONGESTION_WEIGHT * exit_density(table, grids.mean(axis=0))
+            table = ExitsTable(table.exit_ids, table.coordinates, congestion, table.priority,
+                               table.descriptions, table.venue)
+    with stage_timer("assignment"):
+        best_exits = find_best_exits(tracks.centroids(), table)
+    store = TrackStore.from_tracks(tracks, FPS, best_exits, table)
+
+    if TRACK_STORE_DIR:
+        # Keep the run on disk and serve it memory-mapped
+        store = save_run(store)
+
+    if progress:
+        progress(stage="done", rows_processed=len(store))
     print("✅ Crowd density analysis with exit assignment completed!")
-    return output_data
+    return store
 
 # ✅ Flask Route
 @app.route("/run_crowd_navigation", methods=["GET"])
 def run_crowd_navigation():
     try:
-        results = analyze_crowd_density()
-        return jsonify({
-            "message": "Crowd navigation completed successfully.",
-            "results": results
-        }), 200
+        store = analyze_crowd_density()
+        return Response(json_chunks(store, "Crowd navigation completed successfully."),
+                        status=200, mimetype="application/json")
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
 # ✅ Run Flask app
 if __name__ == "__main__":
@@ -0,0 +1,184 @@
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # SciPy is optional, broadcasting covers every case
+    cKDTree = None
+
+# ✅ ENGINE SETTINGS
+KDTREE_MIN_EXITS = 64  # Use a KD-tree from this many exits on (when scores reduce to distance)
+CHUNK_CELLS = 4_000_000  # Max person x exit scores held in memory at once
+MOVE_EPSILON = 0.01  # Tracks moving less than this (normalized units) keep their cached distances
+
+
+class ExitsTable:
+    """Exits compiled into flat arrays so whole crowds can be scored at once.
+
+    ``coordinates`` is (M, 2) and ``congestion``/``priority`` are (M,). Index
+    ``i`` in every array refers to ``exit_ids[i]``. With a ``venue`` map,
+    distances are walking distances around walls instead of straight lines.
+    """
+
+    def __init__(self, exit_ids, coordinates, congestion, priority, descriptions=None, venue=None):
+        self.exit_ids = list(exit_ids)
+        self.coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        self.congestion = np.asarray(congestion, dtype=np.float64)
+        self.priority = np.asarray(priority, dtype=np.float64)
+        self.descriptions = list(descriptions) if descriptions is not None else ["No Description"] * len(self.exit_ids)
+        self.venue = venue
+        self._kdtree = None
+
+    def __len__(self):
+        return len(self.exit_ids)
+
+    @classmethod
+    def from_exits(cls, exits, venue=None):
+        """Compiles the ``fetch_exits()`` dict into a table."""
+        exit_ids = list(exits.keys())
+        return cls(
+            exit_ids,
+            [(exits[e]["coordinates"]["x"], exits[e]["coordinates"]["y"]) for e in exit_ids],
+            [exits[e].get("congestion_level", 0) for e in exit_ids],
+            [exits[e].get("priority", 0) for e in exit_ids],
+            [exits[e].get("description", "No Description") for e in exit_ids],
+            venue
+        )
+
+    def exit_id(self, index):
+        return self.exit_ids[index] if index >= 0 else None
+
+    def offsets(self, penalty_factor, priority_weight):
+        """Per-exit score added on top of the walking distance."""
+        return self.congestion * penalty_factor - self.priority * priority_weight
+
+    def distances(self, points):
+        """(N, M) distances from every point to every exit."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self.venue is None:
+            return self._euclidean(points)
+
+        distances = self.venue.path_distances(points, self.coordinates).astype(np.float64)
+        # Someone walled off from every exit still gets the straight-line answer
+        stranded = ~np.isfinite(distances).any(axis=1)
+        if stranded.any():
+            distances[stranded] = self._euclidean(points[stranded])
+        return distances
+
+    def _euclidean(self, points):
+        diff = points[:, None, :] - self.coordinates[None, :, :]
+        return np.sqrt(np.einsum("nmk,nmk->nm", diff, diff))
+
+    def scores(self, points, penalty_factor, priority_weight):
+        """(N, M) exit scores; lower is better."""
+        return self.distances(points) + self.offsets(penalty_factor, priority_weight)
+
+    def best_exit_indices(self, points, penalty_factor, priority_weight):
+        """Index of the best exit for each of the N points, or -1 without exits."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(self) == 0:
+            return np.full(len(points), -1, dtype=np.int64)
+
+        offsets = self.offsets(penalty_factor, priority_weight)
+
+        # With equal offsets the best exit is simply the nearest one
+        if cKDTree is not None and self.venue is None and len(self) >= KDTREE_MIN_EXITS and np.ptp(offsets) == 0:
+            if self._kdtree is None:
+                self._kdtree = cKDTree(self.coordinates)
+            return self._kdtree.query(points)[1].astype(np.int64)
+
+        best = np.empty(len(points), dtype=np.int64)
+        step = max(1, CHUNK_CELLS // len(self))
+        for start in range(0, len(points), step):
+            chunk = points[start:start + step]
+            best[start:start + step] = np.argmin(self.distances(chunk) + offsets, axis=1)
+        return best
+
+    def best_exit_ids(self, points, penalty_factor, priority_weight):
+        return [self.exit_id(i) for i in self.best_exit_indices(points, penalty_factor, priority_weight).tolist()]
+
+
+class IncrementalAssigner:
+    """Best exits frame by frame, reusing work for people who stood still.
+
+    Each track keeps the position its exit distances were computed at, the
+    (M,) distance vector and its current exit. A track is only re-measured
+    once it has moved more than ``epsilon`` from that position; when just
+    congestion or priority change, cached distances are re-scored without
+    touching the geometry. ``hits``/``misses`` count reused vs re-measured
+    tracks.
+    """
+
+    def __init__(self, table, penalty_factor, priority_weight, epsilon=MOVE_EPSILON):
+        self.penalty_factor = penalty_factor
+        self.priority_weight = priority_weight
+        self.epsilon = epsilon
+        self.hits = 0
+        self.misses = 0
+        self.table = None
+        self._layout = None
+        self.set_table(table)
+
+    def set_table(self, table):
+        """Switches to a new exits table, dropping cached distances only if exits moved."""
+        layout = (tuple(table.exit_ids), table.coordinates.tobytes(), id(table.venue))
+        if layout != self._layout:
+            self._layout = layout
+            self._slots = {}  # track_id -> row in the arrays below
+            self._free = []
+            self._positions = np.empty((0, 2))
+            self._distances = np.empty((0, len(table)))
+            self._best = np.empty(0, dtype=np.int64)
+        self.table = table
+        self._offsets = table.offsets(self.penalty_factor, self.priority_weight)
+        if len(self._best) and len(table):
+            self._best = np.argmin(self._distances + self._offsets, axis=1)
+
+    def assign(self, track_ids, points):
+        """Best exit index for each track in one frame (-1 without exits)."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        slots = self._slots_for(track_ids)
+        if not len(self.table):
+            return np.full(len(points), -1, dtype=np.int64)
+
+        moved = np.hypot(*(points - self._positions[slots]).T) > self.epsilon
+        moved |= ~np.isfinite(self._positions[slots, 0])  # New tracks
+        stale = slots[moved]
+        if len(stale):
+            self._positions[stale] = points[moved]
+            self._distances[stale] = self.table.distances(points[moved])
+            self._best[stale] = np.argmin(self._distances[stale] + self._offsets, axis=1)
+
+        self.misses += int(moved.sum())
+        self.hits += int(len(points) - moved.sum())
+        return self._best[slots]
+
+    def forget(self, track_id):
+        """Drops a track that left the scene so its row can be reused."""
+        slot = self._slots.pop(track_id, None)
+        if slot is not None:
+            self._positions[slot] = np.nan
+            self._free.append(slot)
+
+    def _slots_for(self, track_ids):
+        slots = np.empty(len(track_ids), dtype=np.int64)
+        for i, track_id in enumerate(track_ids):
+            slot = self._slots.get(track_id)
+            if slot is None:
+                slot = self._free.pop() if self._free else self._grow()
+                self._slots[track_id] = slot
+            slots[i] = slot
+        return slots
+
+    def _grow(self):
+        size = len(self._best)
+        capacity = max(64, size * 2)
+        self._positions = np.concatenate([self._positions, np.full((capacity - size, 2), np.nan)])
+        self._distances = np.concatenate([self._distances, np.zeros((capacity - size, self._distances.shape[1]))])
+        self._best = np.concatenate([self._best, np.full(capacity - size, -1, dtype=np.int64)])
+        self._free.extend(range(capacity - 1, size, -1))
+        return size
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"assign_hits": self.hits, "assign_misses": self.misses,
+                "assign_hit_rate": round(self.hits / total, 3) if total else 0.0}
@@ -0,0 +1,137 @@
+import os
+import threading
+
+from exit_engine import ExitsTable
+from metrics import FIRESTORE_READS
+from venue_map import get_venue_map
+
+# ✅ REGISTRY SETTINGS
+EXITS_COLLECTION = "exit_points"
+POLL_INTERVAL = float(os.environ.get("EXITS_POLL_INTERVAL", 1.0))  # Seconds, only without a snapshot listener
+INITIAL_LOAD_TIMEOUT = 10  # Seconds to wait for the listener's first snapshot
+
+
+def exit_from_doc(data):
+    return {
+        "coordinates": data["coordinates"],
+        "congestion_level": data.get("congestion_level", 0),
+        "priority": data.get("priority", 0),
+        "description": data.get("description", "No Description")
+    }
+
+
+class ExitsRegistry:
+    """In-memory copy of ``exit_points`` kept current by a snapshot listener.
+
+    The collection is read once; afterwards Firestore pushes changes and
+    the compiled ExitsTable is swapped in. ``version`` goes up with every
+    change, so callers holding derived state (scores, cached assignments)
+    know when to refresh; ``snapshot()`` reads it together with the table
+    it belongs to. Clients without ``on_snapshot`` (emulator setups,
+    in-memory fakes) are polled every ``poll_interval`` seconds instead.
+    """
+
+    def __init__(self, db, collection=EXITS_COLLECTION, poll_interval=POLL_INTERVAL):
+        self.db = db
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.version = 0
+        self.mode = None
+        self._exits = {}
+        self._table = ExitsTable.from_exits({})
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._stopped = threading.Event()
+        self._watch = None
+        self._poller = None
+
+    def start(self):
+        collection_ref = self.db.collection(self.collection)
+        try:
+            self._watch = collection_ref.on_snapshot(self._on_snapshot)
+            self.mode = "listener"
+        except Exception as e:
+            print(f"⚠️ Exit listener unavailable ({e}), polling every {self.poll_interval}s")
+
+        if self._watch is None or not self._loaded.wait(INITIAL_LOAD_TIMEOUT):
+            if self._watch is not None:
+                print("⚠️ No exit snapshot received in time, polling instead")
+                self._unsubscribe()
+            self._poll_once()
+            self._poller = threading.Thread(target=self._poll, name="exits-poller", daemon=True)
+            self._poller.start()
+            self.mode = "polling"
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._unsubscribe()
+
+    def _unsubscribe(self):
+        watch, self._watch = self._watch, None
+        if watch is not None:
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                print(f"⚠️ Failed to stop exit listener: {e}")
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # Firestore bills a listener for the documents that changed (all of them on the first delivery)
+        self._apply([doc.to_dict() for doc in docs], reads=len(changes))
+
+    def _poll_once(self):
+        records = [doc.to_dict() for doc in self.db.collection(self.collection).stream()]
+        self._apply(records, reads=len(records))
+
+    def _poll(self):
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self._poll_once()
+            except Exception as e:
+                print(f"🔥 Polling exits failed: {e}")
+
+    def _apply(self, records, reads):
+        exits = {data["exit_id"]: exit_from_doc(data) for data in records}
+        FIRESTORE_READS.inc(reads, collection=self.collection)
+        with self._lock:
+            if exits != self._exits or not self._loaded.is_set():
+                self._exits = exits
+                self._table = ExitsTable.from_exits(exits, get_venue_map())
+                self.version += 1
+                print(f"✅ Exits v{self.version}: {len(exits)} exits {list(exits.keys())}")
+        self._loaded.set()
+
+    def exits(self):
+        """``{exit_id: {...}}`` in the shape ``fetch_exits()`` has always returned."""
+        with self._lock:
+            exits = self._exits
+        return {exit_id: dict(data) for exit_id, data in exits.items()}
+
+    def table(self):
+        """The current compiled ExitsTable (shared; do not modify it in place)."""
+        return self.snapshot()[1]
+
+    def snapshot(self):
+        """``(version, table)`` read together."""
+        with self._lock:
+            return self._current()
+
+    def table_for(self, exits=None):
+        """Compiled table for a ``fetch_exits()`` dict (the current exits when None).
+
+        The shared table is returned when ``exits`` matches the registry,
+        so per-person callers do not recompile it; anything else is
+        compiled against the same venue map.
+        """
+        with self._lock:
+            _, table = self._current()
+            if exits is None or exits == self._exits:
+                return table
+        return ExitsTable.from_exits(exits, table.venue)
+
+    def _current(self):
+        venue = get_venue_map()
+        if self._table.venue is not venue:
+            self._table = ExitsTable.from_exits(self._exits, venue)
+            self.version += 1
+        return self.version, self._table
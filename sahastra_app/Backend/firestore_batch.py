@@ -0,0 +1,144 @@
+import time
+import logging
+import threading
+
+from metrics import FIRESTORE_WRITES, STAGE_SECONDS
+
+log = logging.getLogger(__name__)
+
+# ✅ BATCH SETTINGS
+MAX_BATCH_SIZE = 500  # Firestore limit for writes in one batch
+FLUSH_INTERVAL = 1.0  # In seconds
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.5  # In seconds, doubled after every failed attempt
+MAX_PENDING_BATCHES = 4  # Callers block once this many full batches are waiting
+
+
+class BatchedWriter:
+    """Write-behind buffer that commits Firestore ``set()`` calls in batches.
+
+    Writes are flushed by a background thread when ``max_batch_size`` are
+    pending or ``flush_interval`` seconds have passed, in the order they were
+    queued. Callers only block on a commit when the committer falls behind
+    by ``MAX_PENDING_BATCHES`` batches (or when no thread is running).
+    Only ``db.batch()`` is used, so the Firestore emulator or an in-memory
+    fake with the same interface works as a drop-in ``db``.
+    """
+
+    def __init__(self, db, max_batch_size=MAX_BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 max_retries=MAX_RETRIES, retry_backoff=RETRY_BACKOFF, background=True):
+        self.db = db
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self.batch_latencies = []  # Seconds per committed batch
+        self.writes_flushed = 0
+        self.batches_retried = 0
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        if background and flush_interval:
+            self._thread = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._thread.start()
+
+    def set(self, doc_ref, data, merge=False):
+        """Queues a write and flushes if the batch is full or overdue."""
+        with self._lock:
+            self._pending.append((doc_ref, data, merge))
+            pending = len(self._pending)
+            due = (pending >= self.max_batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+
+        if not due:
+            return
+        if self._thread is None or pending >= self.max_batch_size * MAX_PENDING_BATCHES:
+            self.flush()
+        else:
+            self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Commits every queued write. Failed writes are re-queued and the error raised."""
+        with self._flush_lock:
+            with self._lock:
+                writes, self._pending = self._pending, []
+                self._last_flush = time.monotonic()
+
+            for start in range(0, len(writes), self.max_batch_size):
+                chunk = writes[start:start + self.max_batch_size]
+                try:
+                    self._commit(chunk)
+                except Exception:
+                    with self._lock:
+                        self._pending[:0] = writes[start:]
+                    raise
+
+    def _commit(self, writes):
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                batch = self.db.batch()
+                for doc_ref, data, merge in writes:
+                    batch.set(doc_ref, data, merge=merge)
+                batch.commit()
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"❌ Batch of {len(writes)} writes failed after {attempt + 1} attempts: {e}")
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                print(f"⚠️ Batch commit failed ({e}), retrying in {delay:.2f}s")
+                self.batches_retried += 1
+                time.sleep(delay)
+                continue
+
+            latency = time.perf_counter() - started
+            self.batch_latencies.append(latency)
+            self.writes_flushed += len(writes)
+            STAGE_SECONDS.observe(latency, stage="firestore_batch")
+            FIRESTORE_WRITES.inc(len(writes), path="batch")
+            log.debug("📦 Committed batch of %d writes in %.1f ms", len(writes), latency * 1000)
+            return
+
+    def _flush_periodically(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self.pending():
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"🔥 Background flush failed: {e}")
+
+    def close(self):
+        """Stops the background flusher and commits whatever is left."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def stats(self):
+        latencies = self.batch_latencies
+        return {
+            "writes_flushed": self.writes_flushed,
+            "batches": len(latencies),
+            "batches_retried": self.batches_retried,
+            "max_batch_latency_ms": round(max(latencies) * 1000, 1) if latencies else 0,
+            "mean_batch_latency_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
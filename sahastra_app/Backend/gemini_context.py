@@ -0,0 +1,240 @@
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from cachetools import TTLCache
+from google.cloud import firestore
+
+from clients import get_genai
+from metrics import FIRESTORE_READS, stage_timer
+
+# ✅ CONTEXT SETTINGS
+GEMINI_MODEL = "gemini-1.5-pro-latest"
+DEFAULT_TOKEN_BUDGET = 2000  # Tokens of alert context per prompt
+CHARS_PER_TOKEN = 4  # Rough estimate for English text
+TIME_BUCKET_SECONDS = 3600  # Alerts are counted per hour
+TOP_LOCATIONS = 10
+RECENT_MESSAGES = 5
+MESSAGE_CHARS = 160
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_TTL = 3600  # In seconds
+VERSION_TTL = 5  # Seconds a data-version stamp is reused before Firestore is asked again
+CONTEXT_WINDOW_HOURS = 24  # Alerts older than this are left out of the prompt context
+CONTEXT_MAX_ALERTS = 2000  # Newest alerts read per cache miss
+
+# ✅ Only the fields the summary needs (no frame_numbers lists)
+ALERT_SUMMARY_FIELDS = ["timestamp", "severity", "location", "message", "status"]
+
+PROMPT_TEMPLATE = """
+    You are an AI assistant analyzing crowd movement data.
+    Here is a summary of the latest crowd alert data:\n{context}\n
+    Answer the admin query based on this data:
+    """
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _timestamp(value):
+    """Alerts store datetimes, SOS/alerts2 store ISO strings; returns an aware datetime."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _location(value):
+    """Handles both GeoPoints and ``{"latitude", "longitude"}`` dicts."""
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        latitude, longitude = value.get("latitude"), value.get("longitude")
+    else:
+        latitude, longitude = getattr(value, "latitude", None), getattr(value, "longitude", None)
+    if latitude is None or longitude is None:
+        return None
+    return round(float(latitude), 3), round(float(longitude), 3)
+
+
+def summarize_alerts(alerts, bucket_seconds=TIME_BUCKET_SECONDS):
+    """Pre-aggregates alert documents into counts by time bucket, severity and location."""
+    buckets, severities, locations, statuses = Counter(), Counter(), Counter(), Counter()
+    recent = []
+    first_seen = last_seen = None
+
+    for alert in alerts:
+        ts = _timestamp(alert.get("timestamp"))
+        if ts is not None:
+            bucket = int(ts.timestamp()) // bucket_seconds * bucket_seconds
+            buckets[bucket] += 1
+            first_seen = ts if first_seen is None or ts < first_seen else first_seen
+            last_seen = ts if last_seen is None or ts > last_seen else last_seen
+            recent.append((ts, str(alert.get("message", ""))))
+
+        severities[str(alert.get("severity", "unspecified"))] += 1
+        statuses[str(alert.get("status", "unknown"))] += 1
+        location = _location(alert.get("location"))
+        if location is not None:
+            locations[location] += 1
+
+    recent.sort(key=lambda item: item[0], reverse=True)
+    return {
+        "total": sum(severities.values()),
+        "first_seen": first_seen,
+        "last_seen": last_seen,
+        "buckets": sorted(buckets.items(), reverse=True),
+        "severities": severities.most_common(),
+        "statuses": statuses.most_common(),
+        "locations": locations.most_common(TOP_LOCATIONS),
+        "recent": recent[:RECENT_MESSAGES]
+    }
+
+
+def build_alert_context(alerts, token_budget=DEFAULT_TOKEN_BUDGET, bucket_seconds=TIME_BUCKET_SECONDS):
+    """Renders an alert summary that fits in ``token_budget`` tokens.
+
+    Lines are added most important first (totals, severities, locations,
+    recent messages, then time buckets newest first) and the rest dropped.
+    """
+    summary = summarize_alerts(alerts, bucket_seconds)
+
+    lines = [f"Total alerts: {summary['total']}"]
+    if summary["first_seen"] is not None:
+        lines.append(f"Period: {summary['first_seen']:%Y-%m-%d %H:%M} to {summary['last_seen']:%Y-%m-%d %H:%M} UTC")
+    lines.append("By severity: " + ", ".join(f"{k}={v}" for k, v in summary["severities"]))
+    lines.append("By status: " + ", ".join(f"{k}={v}" for k, v in summary["statuses"]))
+    if summary["locations"]:
+        lines.append("Top locations (lat, lng): " + ", ".join(
+            f"({lat}, {lng})={count}" for (lat, lng), count in summary["locations"]
+        ))
+    if summary["recent"]:
+        lines.append("Most recent alerts:")
+        lines.extend(f"- {ts:%Y-%m-%d %H:%M} {message[:MESSAGE_CHARS]}" for ts, message in summary["recent"])
+    if summary["buckets"]:
+        lines.append(f"Alerts per {bucket_seconds // 60} min (newest first):")
+        lines.extend(
+            f"- {datetime.fromtimestamp(start, timezone.utc):%Y-%m-%d %H:%M}: {count}"
+            for start, count in summary["buckets"]
+        )
+
+    context, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            context.append("(older data omitted)")
+            break
+        context.append(line)
+        used += cost
+    return "\n".join(context)
+
+
+_versions = TTLCache(maxsize=16, ttl=VERSION_TTL)
+_versions_lock = threading.Lock()
+
+
+def alerts_version(collection_ref):
+    """Cheap data-version stamp: document count, newest alert and latest edit.
+
+    Alerts rewritten in place (the AI message enrichment) set
+    ``updated_at``, so edits change the stamp as well as inserts; alerts
+    written before that field existed have no edits to report, and the
+    automatic single-field index serves the ``updated_at`` query. The
+    stamp is reused for ``VERSION_TTL`` seconds, so bursts of queries pay
+    its three round trips once. Returns None if it cannot be determined,
+    which disables caching.
+    """
+    with _versions_lock:
+        version = _versions.get(collection_ref.id)
+    if version is None:
+        version = _read_version(collection_ref)
+        if version is not None:
+            with _versions_lock:
+                _versions[collection_ref.id] = version
+    return version
+
+
+def _read_version(collection_ref):
+    def latest(field):
+        return list(collection_ref.order_by(field, direction=firestore.Query.DESCENDING).limit(1).stream())
+
+    try:
+        count = collection_ref.count().get()[0][0].value
+        newest, edited = latest("timestamp"), latest("updated_at")
+        FIRESTORE_READS.inc(3, collection=collection_ref.id)
+    except Exception as e:
+        print(f"⚠️ Could not stamp alert data version: {e}")
+        return None
+    newest_id = newest[0].id if newest else ""
+    edit = f"{edited[0].id}@{edited[0].to_dict().get('updated_at')}" if edited else ""
+    return f"{count}:{newest_id}:{edit}"
+
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!. ").lower()
+
+
+def default_model_factory():
+    return get_genai().GenerativeModel(GEMINI_MODEL)
+
+
+class GeminiAssistant:
+    """Answers admin questions over a token-budgeted alert summary.
+
+    Answers are cached by normalized query and data version until new
+    alerts change the version. ``model_factory`` returns any object with
+    ``generate_content(prompt).text``, so a local stub can replace Gemini.
+    """
+
+    def __init__(self, model_factory=default_model_factory, token_budget=DEFAULT_TOKEN_BUDGET,
+                 cache_size=RESPONSE_CACHE_SIZE, cache_ttl=RESPONSE_CACHE_TTL):
+        self.model_factory = model_factory
+        self.token_budget = token_budget
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._lock = threading.Lock()
+        self._model = None
+        self._alerts = (None, None)  # (version, alerts) of the last load, shared by every query
+
+    def _get_model(self):
+        if self._model is None:
+            self._model = self.model_factory()
+        return self._model
+
+    def answer(self, query, load_alerts, version=None):
+        """Returns ``(answer, cached)``; answer is None when there are no alerts.
+
+        ``load_alerts`` is only called on a cache miss, and only once per
+        data version however many different queries miss.
+        """
+        key = (normalize_query(query), version)
+        alerts = None
+        if version is not None:
+            with self._lock:
+                cached = self._cache.get(key)
+                loaded_version, loaded = self._alerts
+            if cached is not None:
+                return cached, True
+            if loaded_version == version:
+                alerts = loaded
+
+        if alerts is None:
+            alerts = load_alerts()
+            if version is not None:
+                with self._lock:
+                    self._alerts = (version, alerts)
+        if not alerts:
+            return None, False
+
+        context = build_alert_context(alerts, self.token_budget)
+        with stage_timer("gemini_call"):
+            response = self._get_model().generate_content(PROMPT_TEMPLATE.format(context=context) + query)
+        answer = response.text
+
+        if version is not None:
+            with self._lock:
+                self._cache[key] = answer
+        return answer, False
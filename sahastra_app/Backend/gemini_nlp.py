@@ -1,44 +1,29 @@
 from flask import Flask, request, jsonify
-import google.generativeai as genai
-from google.cloud import firestore
-import os
-import json
-from google.oauth2 import service_account
 
-# ✅ Load Firebase credentials from environment variable
-service_account_info = json.loads(os.environ["GOOGLE_APPLICATION_CREDENTIALS_JSON"])
-credentials = service_account.Credentials.from_service_account_info(service_account_info)
+from gemini_context import ALERT_SUMMARY_FIELDS, GeminiAssistant, alerts_version
+from clients import lazy_firestore
 
-# ✅ Configure Gemini & Firestore
-
-genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-PROJECT_ID = "cedar-spring-455002-r4"
-DATABASE_ID = "crowddensity"
-
-# ✅ Initialize Firestore using the credentials
-db = firestore.Client(credentials=credentials, project=PROJECT_ID, database=DATABASE_ID)
+# ✅ Shared Firestore client, created on first use (Gemini is configured lazily too)
+db = lazy_firestore()
 
 # ✅ Flask App
 app = Flask(__name__)
 
+# ✅ Gemini assistant with budgeted context and response cache
+gemini_assistant = GeminiAssistant()
+
 # ✅ Function to fetch ALL crowd alert data
 def get_crowd_data():
     alerts_ref = db.collection('alerts')
-    docs = alerts_ref.stream()
+    docs = alerts_ref.select(ALERT_SUMMARY_FIELDS).stream()
     crowd_data = [doc.to_dict() for doc in docs]
     print(f"📊 Retrieved {len(crowd_data)} records from Firestore.")
     return crowd_data
 
 # ✅ Gemini query function
-def ask_gemini(query, crowd_data):
-    model = genai.GenerativeModel("gemini-1.5-pro-latest")
-    context = f"""
-    You are an AI assistant analyzing crowd movement data.
-    Here is the latest crowd data:\n{crowd_data}\n
-    Answer the admin query based on this data:
-    """
-    response = model.generate_content(context + query)
-    return response.text
+def ask_gemini(query, crowd_data, version=None):
+    ai_response, _ = gemini_assistant.answer(query, lambda: crowd_data, version)
+    return ai_response
 
 # ✅ API Route
 @app.route("/gemini_query", methods=["GET"])
@@ -47,12 +32,12 @@ def gemini_query():
     if not user_query:
         return jsonify({"error": "Missing 'query' parameter"}), 400
 
-    crowd_data = get_crowd_data()
-    if not crowd_data:
+    version = alerts_version(db.collection('alerts'))
+    ai_response, cached = gemini_assistant.answer(user_query, get_crowd_data, version)
+    if ai_response is None:
         return jsonify({"query": user_query, "ai_response": "⚠️ No crowd data found in Firestore."})
 
-    ai_response = ask_gemini(user_query, crowd_data)
-    return jsonify({"query": user_query, "ai_response": ai_response})
+    return jsonify({"query": user_query, "ai_response": ai_response, "cached": cached})
 
 # ✅ Start Flask Server
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+import math
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from metrics import count_reads
+from pagination import PageRequestError
+
+# ✅ GEO INDEX SETTINGS
+GEOHASH_FIELD = "geohash"
+PREFIXES_FIELD = "geohash_prefixes"  # Every prefix of the geohash, so one cell is an array-contains match
+GEOHASH_PRECISION = 9  # Stored precision, ~5 m cells
+MAX_SCAN_CELLS = 32  # Geohash range scans per query; the cover is coarsened to stay under this
+SCAN_WORKERS = 8  # Range scans run concurrently
+DEFAULT_RADIUS_M = 300
+DEFAULT_LIMIT = 100  # Results of a near=/bbox= search without ``limit``
+MAX_RADIUS_M = 50000
+EARTH_RADIUS_M = 6371008.8
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Search area: a bounding box, plus a centre and radius for ``near=`` queries
+GeoQuery = namedtuple("GeoQuery", "south west north east center radius")
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Standard base-32 geohash of a point."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """``(latitude, longitude)`` span in degrees of one geohash cell."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def location_of(data):
+    """``(lat, lon)`` of a document, whether ``location`` is a GeoPoint or a plain dict."""
+    location = data.get("location")
+    if location is None:
+        return None
+    if isinstance(location, dict):
+        latitude, longitude = location.get("latitude"), location.get("longitude")
+    else:
+        latitude, longitude = location.latitude, location.longitude
+    if latitude is None or longitude is None:
+        return None
+    return float(latitude), float(longitude)
+
+
+def geo_fields(latitude, longitude):
+    """Index fields to store next to a document's ``location``."""
+    geohash = encode(float(latitude), float(longitude))
+    return {GEOHASH_FIELD: geohash, PREFIXES_FIELD: [geohash[:i] for i in range(1, len(geohash) + 1)]}
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def near(latitude, longitude, radius):
+    """GeoQuery for everything within ``radius`` metres of a point."""
+    dlat = math.degrees(radius / EARTH_RADIUS_M)
+    dlon = math.degrees(radius / (EARTH_RADIUS_M * max(math.cos(math.radians(latitude)), 1e-6)))
+    return GeoQuery(max(latitude - dlat, -90.0), max(longitude - dlon, -180.0),
+                    min(latitude + dlat, 90.0), min(longitude + dlon, 180.0),
+                    (latitude, longitude), radius)
+
+
+def contains(geo, point):
+    if point is None:
+        return False
+    latitude, longitude = point
+    if not (geo.south <= latitude <= geo.north and geo.west <= longitude <= geo.east):
+        return False
+    return geo.center is None or haversine_m(*geo.center, latitude, longitude) <= geo.radius
+
+
+def cover(geo, max_cells=MAX_SCAN_CELLS):
+    """Geohash prefixes whose cells together cover the search box.
+
+    Uses the finest precision that needs at most ``max_cells`` cells, so a
+    small radius scans a handful of small cells rather than one big one.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_span, lon_span = cell_size(precision)
+        rows = range(int((geo.south + 90) // lat_span), int(min(geo.north + 90, 180 - 1e-9) // lat_span) + 1)
+        cols = range(int((geo.west + 180) // lon_span), int(min(geo.east + 180, 360 - 1e-9) // lon_span) + 1)
+        if len(rows) * len(cols) <= max_cells or precision == 1:
+            return sorted({
+                encode(-90 + (row + 0.5) * lat_span, -180 + (col + 0.5) * lon_span, precision)
+                for row in rows for col in cols
+            })
+
+
+def _parse_floats(value, count, name):
+    try:
+        numbers = [float(part) for part in value.split(",")]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count or not all(math.isfinite(n) for n in numbers):
+        raise PageRequestError(f"'{name}' must be {count} comma-separated numbers")
+    return numbers
+
+
+def parse_geo_args(args):
+    """GeoQuery from ``near=lat,lng&radius=metres`` or ``bbox=west,south,east,north``; None if neither."""
+    if args.get("near") and args.get("bbox"):
+        raise PageRequestError("Use either 'near' or 'bbox', not both")
+
+    if args.get("near"):
+        latitude, longitude = _parse_floats(args["near"], 2, "near")
+        radius = _parse_floats(args.get("radius", str(DEFAULT_RADIUS_M)), 1, "radius")[0]
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise PageRequestError("'near' is not a valid latitude,longitude")
+        if not 0 < radius <= MAX_RADIUS_M:
+            raise PageRequestError(f"'radius' must be between 0 and {MAX_RADIUS_M} metres")
+        return near(latitude, longitude, radius)
+
+    if args.get("bbox"):
+        west, south, east, north = _parse_floats(args["bbox"], 4, "bbox")
+        if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+            raise PageRequestError("'bbox' must be west,south,east,north with west <= east and south <= north")
+        if haversine_m(south, west, north, east) > 2 * MAX_RADIUS_M:
+            raise PageRequestError(f"'bbox' is larger than {2 * MAX_RADIUS_M} metres across")
+        return GeoQuery(south, west, north, east, None, None)
+
+    return None
+
+
+def search(collection_ref, geo, limit, since=None):
+    """Newest-first documents inside ``geo``, at most ``limit`` of them.
+
+    Each covering cell is one newest-first query (``since`` applied by
+    Firestore) read in pages of ``limit`` until ``limit`` documents pass
+    the exact radius/box test, so a cell costs about ``limit`` reads
+    however much it has stored; only crowded cell corners outside the
+    area add pages. Needs the (geohash_prefixes, timestamp) index in
+    ``firestore.indexes.json``; documents without a ``timestamp``, or
+    written before the prefixes were stored (see ``backfill()``), are not found.
+    """
+    def scan(prefix):
+        query = collection_ref.where(filter=FieldFilter(PREFIXES_FIELD, "array_contains", prefix))
+        if since is not None:
+            query = query.where(filter=FieldFilter("timestamp", ">=", since))
+        query = query.order_by("timestamp", direction=firestore.Query.DESCENDING).limit(limit)
+        found, page_query = [], query
+        while True:
+            page = list(count_reads(page_query.stream(), collection_ref.id))
+            for doc in page:
+                data = doc.to_dict()
+                if contains(geo, location_of(data)):
+                    found.append((data.get("timestamp"), doc))
+            if len(found) >= limit or len(page) < limit:
+                return found[:limit]
+            page_query = query.start_after(page[-1])
+
+    prefixes = cover(geo)
+    with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(prefixes)), thread_name_prefix="geo-scan") as pool:
+        matches = [match for found in pool.map(scan, prefixes) for match in found]
+
+    matches.sort(key=lambda match: (match[0] is not None, match[0] or 0), reverse=True)
+    return [doc for _, doc in matches[:limit]]
+
+
+def timestamp_key(value):
+    """UTC datetime of a ``timestamp`` stored as a datetime or an ISO string (naive means UTC)."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def search_collections(db, sources, geo, limit, since=None):
+    """``search()`` over several collections, merged newest-first.
+
+    ``sources`` is ``[(collection_name, timestamp_as_string)]``: collections
+    storing ``timestamp`` as an ISO string (``alerts2``, ``sos_requests``)
+    get ``since`` as a naive UTC string, the others as a datetime, so each
+    query compares like with like.
+    """
+    since = timestamp_key(since)
+    matches = []
+    for name, as_string in sources:
+        bound = since.replace(tzinfo=None).isoformat() if since is not None and as_string else since
+        for doc in search(db.collection(name), geo, limit, bound):
+            matches.append((timestamp_key((doc.to_dict() or {}).get("timestamp")), doc))
+    matches.sort(key=lambda match: (match[0] is not None, match[0] or 0), reverse=True)
+    return [doc for _, doc in matches[:limit]]
+
+
+def backfill(db, collection_name):
+    """Adds the geohash fields to documents stored before they existed; returns how many were updated."""
+    from firestore_batch import BatchedWriter
+
+    collection_ref = db.collection(collection_name)
+    updated = 0
+    with BatchedWriter(db, background=False) as writer:
+        for doc in count_reads(collection_ref.stream(), collection_name):
+            data = doc.to_dict()
+            point = location_of(data)
+            if point is None or data.get(PREFIXES_FIELD):
+                continue
+            writer.set(collection_ref.document(doc.id), geo_fields(*point), merge=True)
+            updated += 1
+    return updated
+
+
+if __name__ == "__main__":
+    import sys
+    import clients
+
+    for name in sys.argv[1:] or ["alerts", "alerts2", "sos_requests"]:
+        print(f"🗺️ {name}: geohash added to {backfill(clients.get_firestore(), name)} documents")
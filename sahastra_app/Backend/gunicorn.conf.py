@@ -0,0 +1,20 @@
+import os
+
+import clients
+
+# ✅ Import the app once in the master, then fork workers from it.
+# Clients are created lazily, so no gRPC channel exists before the fork.
+preload_app = True
+
+# ✅ Threads per worker: each /live_feed client holds one open for as long as it stays connected,
+# up to MAX_SSE_CONNECTIONS (live_feed.py); the rest stay free for /send_sos and the API
+threads = int(os.environ.get("GUNICORN_THREADS", "32"))
+
+
+def post_fork(server, worker):
+    # Every worker builds its own Firestore/Gemini/Video clients on first use
+    clients.reset()
+
+
+def when_ready(server):
+    print(f"🚀 Gunicorn ready: {clients.startup_report()}")
@@ -0,0 +1,176 @@
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from metrics import count_reads
+
+# ✅ HEATMAP SETTINGS
+GRID_ROWS = 16
+GRID_COLS = 16
+WINDOW_SECONDS = 1  # Grids are aggregated (peak per cell) over windows this long
+WINDOWS_PER_DOC = 60  # Windows delta-compressed together in one Firestore document
+DOC_SECONDS = WINDOWS_PER_DOC * WINDOW_SECONDS  # Longest span of video one document covers
+HEATMAPS_COLLECTION = "heatmaps"
+ZONE_ROWS = 2  # Zones are blocks of cells used for per-zone density
+ZONE_COLS = 2
+
+
+def build_heatmaps(frame_numbers, centroids, rows=GRID_ROWS, cols=GRID_COLS):
+    """Bins person centroids into one grid per frame.
+
+    Returns ``(frames, grids)``: the sorted distinct frame numbers and a
+    (F, rows, cols) uint16 array of people per cell, built with a single
+    ``bincount`` over (frame, row, col) instead of a loop per cell.
+    """
+    frame_numbers = np.asarray(frame_numbers)
+    centroids = np.asarray(centroids, dtype=np.float64).reshape(-1, 2)
+    frames, frame_index = np.unique(frame_numbers, return_inverse=True)
+
+    col = np.clip((centroids[:, 0] * cols).astype(np.int64), 0, cols - 1)
+    row = np.clip((centroids[:, 1] * rows).astype(np.int64), 0, rows - 1)
+    flat = (frame_index * rows + row) * cols + col
+
+    counts = np.bincount(flat, minlength=len(frames) * rows * cols)
+    grids = np.minimum(counts, np.iinfo(np.uint16).max).astype(np.uint16)
+    return frames, grids.reshape(len(frames), rows, cols)
+
+
+def window_heatmaps(frames, grids, window_frames):
+    """Peak people per cell over fixed windows of ``window_frames`` frames."""
+    windows = np.asarray(frames) // window_frames
+    starts = np.flatnonzero(np.r_[True, windows[1:] != windows[:-1]])
+    if not len(starts):
+        return windows[:0] * window_frames, grids
+    return windows[starts] * window_frames, np.maximum.reduceat(grids, starts, axis=0)
+
+
+def zone_density(grids, zone_rows=ZONE_ROWS, zone_cols=ZONE_COLS):
+    """(F, zone_rows, zone_cols) people per zone, summed from the cell grids."""
+    frames, rows, cols = grids.shape
+    trimmed = grids[:, :rows - rows % zone_rows, :cols - cols % zone_cols]
+    blocks = trimmed.reshape(frames, zone_rows, rows // zone_rows, zone_cols, cols // zone_cols)
+    return blocks.sum(axis=(2, 4), dtype=np.int64)
+
+
+def encode_grids(grids):
+    """Delta-encodes grids along time, then deflates; unchanged cells cost ~nothing."""
+    deltas = np.diff(grids.astype(np.int32), axis=0, prepend=np.zeros((1,) + grids.shape[1:], np.int32))
+    return zlib.compress(deltas.tobytes(), 6)
+
+
+def decode_grids(data, shape):
+    deltas = np.frombuffer(zlib.decompress(data), dtype=np.int32).reshape(shape)
+    return np.cumsum(deltas, axis=0).astype(np.uint16)
+
+
+def exit_density(table, grid, radius_cells=1):
+    """People within ``radius_cells`` of each exit's cell in one grid (M,)."""
+    rows, cols = grid.shape
+    col = np.clip((table.coordinates[:, 0] * cols).astype(np.int64), 0, cols - 1)
+    row = np.clip((table.coordinates[:, 1] * rows).astype(np.int64), 0, rows - 1)
+
+    # Summed-area table makes every exit's neighbourhood an O(1) lookup
+    area = np.pad(grid.astype(np.float64).cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    top, bottom = np.clip(row - radius_cells, 0, rows), np.clip(row + radius_cells + 1, 0, rows)
+    left, right = np.clip(col - radius_cells, 0, cols), np.clip(col + radius_cells + 1, 0, cols)
+    return area[bottom, right] - area[top, right] - area[bottom, left] + area[top, left]
+
+
+def store_heatmaps(writer, source, frames, grids, fps, run_started, window_seconds=WINDOW_SECONDS):
+    """Queues windowed, compressed heatmaps of one run on a BatchedWriter.
+
+    Window times are wall-clock: ``run_started`` plus the video offset.
+    Documents hold the windows of fixed ``DOC_SECONDS`` slices of the
+    video (empty windows are skipped), so no document spans longer and
+    range reads can bound ``start_time``. Returns the number of documents queued.
+    """
+    window_frames = max(1, int(window_seconds * fps))
+    doc_frames = window_frames * max(1, int(DOC_SECONDS * fps) // window_frames)
+    starts, windows = window_heatmaps(frames, grids, window_frames)
+    collection = writer.db.collection(HEATMAPS_COLLECTION)
+    run_id = int(run_started.timestamp() * 1000)
+    docs = 0
+
+    bounds = np.flatnonzero(np.diff(starts // doc_frames)) + 1
+    for chunk_starts, chunk_grids in zip(np.split(starts, bounds), np.split(windows, bounds)):
+        if not len(chunk_starts):
+            continue
+        start_time = run_started + timedelta(seconds=int(chunk_starts[0]) / fps)
+        end_time = run_started + timedelta(seconds=(int(chunk_starts[-1]) + window_frames) / fps)
+
+        doc_ref = collection.document(f"{source.camera_id}_{run_id}_{int(chunk_starts[0])}")
+        writer.set(doc_ref, {
+            "camera_id": source.camera_id,
+            "start_time": start_time,
+            "end_time": end_time,
+            "window_frames": window_frames,
+            "fps": fps,
+            "shape": list(chunk_grids.shape),
+            "window_starts": chunk_starts.tolist(),
+            "grids": encode_grids(chunk_grids),
+            "location": source.geopoint()
+        })
+        docs += 1
+    return docs
+
+
+def load_heatmap(db, camera_id, start=None, end=None):
+    """Latest heatmap of a camera, or the per-cell peak over ``[start, end]``.
+
+    Range reads only fetch documents starting within ``DOC_SECONDS`` of
+    ``start`` (needs the composite index in ``firestore.indexes.json``).
+    Returns a dict ready for ``jsonify`` or None if nothing was stored.
+    """
+    query = db.collection(HEATMAPS_COLLECTION).where(filter=FieldFilter("camera_id", "==", camera_id))
+    if start is None and end is None:
+        docs = list(count_reads(query.order_by("end_time", direction=firestore.Query.DESCENDING).limit(1).stream(),
+                                HEATMAPS_COLLECTION))
+    else:
+        if start is not None:
+            # Documents starting up to one document span before ``start`` still overlap it
+            query = query.where(filter=FieldFilter("start_time", ">=", start - timedelta(seconds=DOC_SECONDS)))
+        if end is not None:
+            query = query.where(filter=FieldFilter("start_time", "<=", end))
+        docs = [doc for doc in count_reads(query.order_by("start_time").stream(), HEATMAPS_COLLECTION)
+                if start is None or doc.get("end_time") >= start]
+    if not docs:
+        return None
+
+    grids, times = [], []
+    for doc in docs:
+        data = doc.to_dict()
+        decoded = decode_grids(data["grids"], tuple(data["shape"]))
+        window = timedelta(seconds=data["window_frames"] / data["fps"])
+        doc_start = data["start_time"]
+        starts = [doc_start + timedelta(seconds=(s - data["window_starts"][0]) / data["fps"])
+                  for s in data["window_starts"]]
+        keep = [i for i, t in enumerate(starts)
+                if (start is None or t + window >= start) and (end is None or t <= end)]
+        if start is None and end is None:
+            keep = keep[-1:]
+        grids.append(decoded[keep])
+        times.extend(starts[i] for i in keep)
+
+    stacked = np.concatenate(grids) if grids else np.zeros((0, GRID_ROWS, GRID_COLS), np.uint16)
+    if not len(stacked):
+        return None
+    return {
+        "camera_id": camera_id,
+        "start_time": min(times).astimezone(timezone.utc).isoformat(),
+        "end_time": max(times).astimezone(timezone.utc).isoformat(),
+        "windows": len(stacked),
+        "grid_rows": stacked.shape[1],
+        "grid_cols": stacked.shape[2],
+        "grid": stacked.max(axis=0).tolist()
+    }
+
+
+def parse_time(value):
+    """ISO-8601 query argument -> aware datetime (UTC if no offset given)."""
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import uuid
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# ✅ JOB SETTINGS
+MAX_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+MAX_QUEUED_JOBS = int(os.environ.get("JOB_QUEUE_LIMIT", 8))
+JOB_RETENTION = 3600  # In seconds, finished jobs are forgotten after this
+MAX_FINISHED_JOBS = int(os.environ.get("JOB_RESULTS_LIMIT", 32))  # Oldest finished jobs (and results) beyond this are dropped
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class QueueFullError(RuntimeError):
+    """Raised when no more jobs can be queued."""
+
+
+def job_key(kind, params=None):
+    """Dedup key: the job kind plus its arguments, normalized so equal requests match."""
+    if not params:
+        return kind
+    return f"{kind}:{json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)}"
+
+
+class Job:
+    """One background analysis run and its progress."""
+
+    def __init__(self, kind, key, params=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.params = params or {}
+        self.status = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (SUCCEEDED, FAILED)
+
+    def update(self, **progress):
+        """Progress callback handed to the job function."""
+        self.progress = {**self.progress, **progress}
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobRunner:
+    """Bounded worker pool for long-running analyses.
+
+    Jobs of the same kind with the same ``params`` share one run while it
+    is queued or running. Finished jobs are kept for ``retention`` seconds,
+    and at most ``max_finished`` of them, so results cannot pile up. Job
+    state lives in this process, so status must be polled on the worker
+    that accepted the job.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, max_queued=MAX_QUEUED_JOBS, retention=JOB_RETENTION,
+                 max_finished=MAX_FINISHED_JOBS):
+        self.max_queued = max_queued
+        self.retention = retention
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, func, params=None):
+        """Queues ``func(progress)``; returns ``(job, created)``."""
+        key = job_key(kind, params)
+        with self._lock:
+            self._prune()
+
+            existing = self._in_flight.get(key)
+            if existing is not None:
+                return existing, False
+
+            queued = sum(1 for job in self._in_flight.values() if job.status == QUEUED)
+            if queued >= self.max_queued:
+                raise QueueFullError(f"Job queue is full ({self.max_queued} waiting)")
+
+            job = Job(kind, key, params)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+
+        self._executor.submit(self._run, job, func)
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, func):
+        job.status = RUNNING
+        job.started_at = time.time()
+        status = FAILED
+        try:
+            job.result = func(job.update)
+            status = SUCCEEDED
+        except Exception as e:
+            print(f"🔥 Job {job.id} ({job.kind}) failed: {e}")
+            traceback.print_exc()
+            job.error = str(e)
+        finally:
+            # Finish time and status change together, so _prune never sees one without the other
+            with self._lock:
+                job.finished_at = time.time()
+                job.status = status
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        finished = sorted((job for job in self._jobs.values() if job.finished and job.finished_at is not None),
+                          key=lambda job: job.finished_at)
+        excess = max(0, len(finished) - self.max_finished)
+        for i, job in enumerate(finished):
+            if i < excess or job.finished_at < cutoff:
+                del self._jobs[job.id]
@@ -0,0 +1,142 @@
+from collections import deque, namedtuple
+
+import numpy as np
+
+from heatmap import ZONE_COLS, ZONE_ROWS
+from multi_source import summarize_frames
+
+# ✅ KINEMATICS SETTINGS
+VELOCITY_LAG_FRAMES = 3  # Velocities span this many frames, smoothing out box jitter
+MOVING_SPEED = 0.03  # Mean speed (image widths/s) at which a zone counts as fully moving
+ACCEL_REFERENCE = 0.2  # Mean acceleration (image widths/s^2) that scores as a full surge
+MIN_ZONE_PEOPLE = 3  # Zones with fewer moving people score 0
+
+# Per frame and cell: people with a velocity, mean flow vector, mean speed and the scores
+FlowField = namedtuple("FlowField", "frames people flow_x flow_y speed counter_flow surge turbulence pressure")
+
+
+def track_kinematics(track_id, frame_numbers, centroids, fps, lag=VELOCITY_LAG_FRAMES):
+    """Per-row velocity (N, 2) and acceleration magnitude (N,) of every sighting.
+
+    Rows are sorted by track and frame once; each velocity is the
+    displacement from the same track's sighting ``lag`` rows earlier, so
+    there is no loop over frames or tracks. ``valid`` marks rows that have
+    a velocity (a track's first ``lag`` sightings do not).
+    """
+    track_id = np.asarray(track_id)
+    frame_numbers = np.asarray(frame_numbers)
+    centroids = np.asarray(centroids, dtype=np.float64).reshape(-1, 2)
+    n = len(track_id)
+    order = np.lexsort((frame_numbers, track_id))
+    tid, frames, pos = track_id[order], frame_numbers[order], centroids[order]
+
+    velocity = np.zeros((n, 2))
+    valid = np.zeros(n, bool)
+    accel = np.zeros(n)
+    if n > lag:
+        dt = (frames[lag:] - frames[:-lag]) / fps
+        # The earlier sighting must be the same track and not too far back (tracks can skip frames)
+        ok = (tid[lag:] == tid[:-lag]) & (dt > 0) & (dt <= 2 * lag / fps)
+        step = np.where(ok, dt, 1.0)
+        velocity[lag:] = np.where(ok[:, None], (pos[lag:] - pos[:-lag]) / step[:, None], 0.0)
+        valid[lag:] = ok
+
+        both = valid[lag:] & valid[:-lag]
+        dv = np.linalg.norm(velocity[lag:] - velocity[:-lag], axis=1)
+        accel[lag:] = np.where(both, dv / step, 0.0)
+
+    restore = np.empty_like(order)
+    restore[order] = np.arange(n)
+    return velocity[restore], accel[restore], valid[restore]
+
+
+def flow_field(frame_numbers, centroids, velocity, accel, valid, rows=ZONE_ROWS, cols=ZONE_COLS):
+    """Flow vectors and risk scores per (frame, cell) on a ``rows`` x ``cols`` grid.
+
+    Every statistic is a ``bincount`` over (frame, cell), like the
+    heatmaps. Scores per cell:
+
+    - ``counter_flow``: 1 - |sum of velocities| / sum of speeds, so 0 when
+      everyone moves the same way and near 1 when flows oppose, scaled
+      down for zones that are barely moving.
+    - ``surge``: mean acceleration against ``ACCEL_REFERENCE``, capped at 1.
+    - ``turbulence``: the larger of the two, 0 below ``MIN_ZONE_PEOPLE``.
+    - ``pressure``: people x velocity variance ("crowd pressure").
+    """
+    frame_numbers = np.asarray(frame_numbers)
+    centroids = np.asarray(centroids, dtype=np.float64).reshape(-1, 2)
+    frames, frame_index = np.unique(frame_numbers, return_inverse=True)
+
+    col = np.clip((centroids[:, 0] * cols).astype(np.int64), 0, cols - 1)
+    row = np.clip((centroids[:, 1] * rows).astype(np.int64), 0, rows - 1)
+    flat = ((frame_index * rows + row) * cols + col)[valid]
+    size = len(frames) * rows * cols
+    vx, vy = velocity[valid, 0], velocity[valid, 1]
+
+    def total(weights=None):
+        return np.bincount(flat, weights, minlength=size).reshape(len(frames), rows, cols).astype(np.float64)
+
+    people = total()
+    sum_x, sum_y = total(vx), total(vy)
+    sum_speed = total(np.hypot(vx, vy))
+    sum_square = total(vx * vx + vy * vy)
+    sum_accel = total(accel[valid])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        count = np.maximum(people, 1)
+        flow_x, flow_y = sum_x / count, sum_y / count
+        speed = sum_speed / count
+        alignment = np.where(sum_speed > 0, np.hypot(sum_x, sum_y) / sum_speed, 1.0)
+
+    counter_flow = (1 - alignment) * np.clip(speed / MOVING_SPEED, 0, 1)
+    surge = np.clip(sum_accel / count / ACCEL_REFERENCE, 0, 1)
+    turbulence = np.where(people >= MIN_ZONE_PEOPLE, np.maximum(counter_flow, surge), 0.0)
+    pressure = people * np.maximum(sum_square / count - flow_x ** 2 - flow_y ** 2, 0)
+    return FlowField(frames, people.astype(np.int64), flow_x, flow_y, speed, counter_flow, surge, turbulence, pressure)
+
+
+def zone_turbulence(track_id, seconds, centroids, fps):
+    """``(frames, turbulence)``: the highest zone turbulence score of every frame."""
+    frame_numbers = (np.asarray(seconds) * fps).astype(np.int64)
+    velocity, accel, valid = track_kinematics(track_id, frame_numbers, centroids, fps)
+    field = flow_field(frame_numbers, centroids, velocity, accel, valid)
+    return field.frames, field.turbulence.max(axis=(1, 2))
+
+
+class IncrementalTurbulence:
+    """``zone_turbulence`` for live streams, one closed frame at a time.
+
+    Keeps the last ``4 * lag`` frames of sightings, which is as far back as
+    an acceleration can reach (two velocity lags, each allowed to skip
+    frames), and scores the newest frame over just that window, so the
+    result matches the batch score for the same frame.
+    """
+
+    def __init__(self, fps, lag=VELOCITY_LAG_FRAMES):
+        self.fps = fps
+        self.lag = lag
+        self._frames = deque()  # (frame_number, track ids, centroids)
+
+    def update(self, frame_number, track_ids, centroids):
+        """Highest zone turbulence of ``frame_number`` (0 when nobody is moving yet)."""
+        centroids = np.asarray(centroids, dtype=np.float64).reshape(-1, 2)
+        self._frames.append((frame_number, np.asarray(track_ids), centroids))
+        while self._frames[0][0] < frame_number - 4 * self.lag:
+            self._frames.popleft()
+        if not len(self._frames[-1][1]):
+            return 0.0
+
+        frame_numbers = np.concatenate([np.full(len(ids), frame) for frame, ids, _ in self._frames])
+        track_id = np.concatenate([ids for _, ids, _ in self._frames])
+        positions = np.concatenate([points for _, _, points in self._frames])
+        velocity, accel, valid = track_kinematics(track_id, frame_numbers, positions, self.fps, self.lag)
+        current = frame_numbers == frame_number
+        field = flow_field(frame_numbers[current], positions[current], velocity[current], accel[current], valid[current])
+        return float(field.turbulence.max()) if len(field.frames) else 0.0
+
+
+def summarize_frames_with_flow(track_id, seconds, centroids, fps):
+    """``summarize_frames`` plus per-frame turbulence."""
+    frames, counts, grids = summarize_frames(seconds, centroids, fps)
+    _, turbulence = zone_turbulence(track_id, seconds, centroids, fps)  # Same rows, so the same frames
+    return frames, counts, grids, turbulence
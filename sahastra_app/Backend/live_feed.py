@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import threading
+from collections import deque, namedtuple
+from datetime import datetime, timezone
+
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from metrics import FIRESTORE_READS, registry
+
+# ✅ LIVE FEED SETTINGS
+BUFFER_SIZE = 1000  # Recent events kept for clients resuming with Last-Event-ID
+HEARTBEAT_SECONDS = 15  # Comment line sent to idle clients so proxies keep the stream open
+RETRY_MS = 3000  # Reconnect delay suggested to EventSource clients
+# Each connected client holds a gunicorn thread; keep this below GUNICORN_THREADS so other routes still get one
+MAX_SSE_CONNECTIONS = int(os.environ.get("MAX_SSE_CONNECTIONS", 24))
+
+SSE_CONNECTIONS = registry.gauge("sse_connections", "Connected live-feed clients in this worker.")
+SSE_EVENTS = registry.counter("sse_events_total", "Live-feed events received from Firestore.")
+
+# One event fanned out to every subscriber
+FeedEvent = namedtuple("FeedEvent", "id name data")
+
+# What a feed listens to: collection, SSE event name, serializer, and whether
+# its ``timestamp`` field is an ISO string (``sos_requests``) or a datetime
+FeedSource = namedtuple("FeedSource", "collection event serialize timestamp_as_string")
+
+
+class FeedFullError(Exception):
+    """Raised when a worker already serves ``max_connections`` live-feed clients."""
+
+
+class ChangeFeed:
+    """One Firestore listener per collection per process, fanned out to every client.
+
+    Each source is watched from the moment the feed starts
+    (``timestamp >= now``), so connecting costs no reads; every added,
+    modified or removed document becomes one event in a ring buffer that
+    all subscribers read. Event ids are strictly increasing microsecond
+    timestamps, so a client reconnecting to another worker still resumes
+    at roughly the right point.
+    """
+
+    def __init__(self, db, sources, buffer_size=BUFFER_SIZE, heartbeat=HEARTBEAT_SECONDS,
+                 max_connections=MAX_SSE_CONNECTIONS):
+        self.db = db
+        self.sources = list(sources)
+        self.heartbeat = heartbeat
+        self.max_connections = max_connections
+        self._connections = 0
+        self._events = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._changed = threading.Condition()
+        self._watches = []
+
+    def start(self):
+        started = datetime.now(timezone.utc)
+        for source in self.sources:
+            since = started.replace(tzinfo=None).isoformat() if source.timestamp_as_string else started
+            query = self.db.collection(source.collection).where(filter=FieldFilter("timestamp", ">=", since))
+            self._watches.append(query.on_snapshot(
+                lambda docs, changes, read_time, source=source: self._on_snapshot(source, changes)
+            ))
+        return self
+
+    def stop(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+
+    def _on_snapshot(self, source, changes):
+        if not changes:
+            return
+        FIRESTORE_READS.inc(len(changes), collection=source.collection)
+        with self._changed:
+            for change in changes:
+                self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+                data = {
+                    "type": change.type.name.lower(),
+                    "collection": source.collection,
+                    "item": source.serialize(change.document)
+                }
+                self._events.append(FeedEvent(self._last_id, source.event, data))
+                SSE_EVENTS.inc(event=source.event)
+            self._changed.notify_all()
+
+    def subscribe(self, last_id=None, events=None, stopped=None):
+        """Iterator of events as they arrive, or None on every idle ``heartbeat``.
+
+        Without ``last_id`` only events from now on are sent; the position
+        is taken here, not on the first ``next()``, so nothing published in
+        between is missed. Raises FeedFullError at ``max_connections``.
+        """
+        with self._changed:
+            if self.max_connections is not None and self._connections >= self.max_connections:
+                raise FeedFullError(f"Live feed is full ({self.max_connections} clients), retry later.")
+            self._connections += 1
+            if last_id is None:
+                last_id = self._last_id
+        SSE_CONNECTIONS.inc()
+        stream = self._follow(last_id, events, stopped)
+        next(stream)  # Enter the try block, so closing or dropping the stream frees the slot
+        return stream
+
+    def _follow(self, last_id, events, stopped):
+        try:
+            yield
+            while stopped is None or not stopped.is_set():
+                with self._changed:
+                    if self._last_id <= last_id and not self._changed.wait(self.heartbeat):
+                        pending = None
+                    else:
+                        pending = [e for e in self._events if e.id > last_id]
+                        last_id = max(last_id, self._last_id)
+                if pending is None:
+                    yield None
+                    continue
+                for event in pending:
+                    if events is None or event.name in events:
+                        yield event
+        finally:
+            with self._changed:
+                self._connections -= 1
+            SSE_CONNECTIONS.dec()
+
+
+def format_sse(event, dumps=json.dumps):
+    """One Server-Sent Events frame; None becomes a keep-alive comment."""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"id: {event.id}\nevent: {event.name}\ndata: {dumps(event.data)}\n\n"
+
+
+def sse_stream(subscription, dumps=json.dumps):
+    """SSE frames for a ``ChangeFeed.subscribe()`` iterator."""
+    yield f"retry: {RETRY_MS}\n\n"
+    for event in subscription:
+        yield format_sse(event, dumps)
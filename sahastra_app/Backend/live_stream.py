@@ -0,0 +1,160 @@
+import os
+import stat
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from annotation_cache import PersonTracks
+from clients import get_streaming_video_client
+
+# ✅ STREAMING SETTINGS
+LATENESS_FRAMES = 1  # A frame is closed once events this many frames newer arrive
+CHUNK_SIZE = 1024 * 1024  # Bytes per streaming annotation request
+# Camera pipes and replay files may only be read from this directory
+LIVE_INPUT_DIR = os.path.realpath(os.environ.get("LIVE_INPUT_DIR", os.path.join(os.path.dirname(__file__), "live_inputs")))
+
+# One person sighting; ``captured_at`` is the wall-clock time the frame was filmed
+TrackEvent = namedtuple("TrackEvent", "seconds track_id left top right bottom captured_at")
+
+
+class ReplaySource:
+    """Replays stored person tracks as a live event stream.
+
+    ``speed`` scales playback (1.0 = real time); ``None`` replays as fast
+    as possible, which is what offline tests want.
+    """
+
+    def __init__(self, tracks, speed=1.0):
+        self.tracks = tracks
+        self.speed = speed
+
+    @classmethod
+    def from_file(cls, path, speed=1.0):
+        return cls(PersonTracks.load(path), speed)
+
+    def __iter__(self):
+        order = np.argsort(self.tracks.seconds, kind="stable")
+        columns = [getattr(self.tracks, name)[order].tolist() for name in PersonTracks.FIELDS]
+        started = time.time()
+
+        for track_id, seconds, left, top, right, bottom in zip(*columns):
+            captured_at = started + (seconds / self.speed if self.speed else 0)
+            if self.speed:
+                delay = captured_at - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            yield TrackEvent(seconds, track_id, left, top, right, bottom, captured_at)
+
+
+def resolve_input(name, allow_pipe=False, base_dir=LIVE_INPUT_DIR):
+    """Real path of ``name`` inside ``base_dir``; raises ValueError for anything else.
+
+    Only regular files (and named pipes, when ``allow_pipe``) are accepted,
+    so a request cannot point the reader at devices or files elsewhere.
+    """
+    path = os.path.realpath(os.path.join(base_dir, str(name)))
+    if os.path.commonpath([path, base_dir]) != base_dir:
+        raise ValueError(f"'{name}' is outside the live input directory")
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        raise ValueError(f"'{name}' does not exist in the live input directory")
+    if not (stat.S_ISREG(mode) or (allow_pipe and stat.S_ISFIFO(mode))):
+        raise ValueError(f"'{name}' is not a readable {'file or pipe' if allow_pipe else 'file'}")
+    return path
+
+
+def file_chunks(path, chunk_size=CHUNK_SIZE):
+    """Reads a growing file or named pipe (e.g. ffmpeg output) chunk by chunk."""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class StreamingAnnotationSource:
+    """Person tracks from Video Intelligence streaming object tracking.
+
+    ``chunks`` is any iterable of video bytes, such as ``file_chunks()``
+    over a pipe fed by the camera.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def _requests(self, videointelligence):
+        config = videointelligence.StreamingVideoConfig(
+            feature=videointelligence.StreamingFeature.STREAMING_OBJECT_TRACKING,
+            object_tracking_config=videointelligence.StreamingObjectTrackingConfig()
+        )
+        yield videointelligence.StreamingAnnotateVideoRequest(video_config=config)
+        for chunk in self.chunks:
+            yield videointelligence.StreamingAnnotateVideoRequest(input_content=chunk)
+
+    def __iter__(self):
+        from google.cloud import videointelligence
+
+        client = get_streaming_video_client()
+        started = time.time()
+
+        for response in client.streaming_annotate_video(self._requests(videointelligence)):
+            if response.error.message:
+                raise RuntimeError(f"Streaming annotation failed: {response.error.message}")
+
+            for annotation in response.annotation_results.object_annotations:
+                if annotation.entity.description.lower() != "person":
+                    continue
+                for frame in annotation.frames:
+                    time_offset = frame.time_offset
+                    seconds = time_offset.seconds + (time_offset.microseconds / 1e6)
+                    box = frame.normalized_bounding_box
+                    yield TrackEvent(seconds, annotation.track_id, box.left, box.top,
+                                     box.right, box.bottom, started + seconds)
+
+
+class IncrementalDensityMonitor:
+    """Turns a track event stream into ordered per-frame people counts.
+
+    A frame is emitted once events ``lateness_frames`` newer have been seen,
+    so alert latency is bounded by a frame or two instead of clip length.
+    A person is counted once per frame even if reported several times
+    (the last reported box wins).
+    """
+
+    def __init__(self, fps, lateness_frames=LATENESS_FRAMES):
+        self.fps = fps
+        self.lateness_frames = lateness_frames
+        self._open = {}  # frame_number -> [{track id: centroid}, latest captured_at]
+        self._next_frame = None
+
+    def consume(self, events):
+        """Yields ``(frame_number, people_count, captured_at)`` in frame order."""
+        for frame_number, track_ids, _, captured_at in self.consume_frames(events):
+            yield frame_number, len(track_ids), captured_at
+
+    def consume_frames(self, events):
+        """Yields ``(frame_number, track_ids, centroids, captured_at)`` in frame order."""
+        for event in events:
+            frame_number = int(event.seconds * self.fps)
+            if self._next_frame is not None and frame_number < self._next_frame:
+                continue  # Too late, that frame was already emitted
+
+            state = self._open.setdefault(frame_number, [{}, event.captured_at])
+            state[0][event.track_id] = ((event.left + event.right) / 2, (event.top + event.bottom) / 2)
+            state[1] = max(state[1], event.captured_at)
+
+            yield from self._close_until(frame_number - self.lateness_frames)
+
+        yield from self._close_until(None)
+
+    def _close_until(self, last_frame):
+        for frame_number in sorted(self._open):
+            if last_frame is not None and frame_number > last_frame:
+                break
+            people, captured_at = self._open.pop(frame_number)
+            self._next_frame = frame_number + 1
+            centroids = np.array(list(people.values()), dtype=np.float64).reshape(-1, 2)
+            yield frame_number, np.fromiter(people, np.int64, len(people)), centroids, captured_at
@@ -0,0 +1,166 @@
+import os
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+# ✅ METRICS SETTINGS
+METRIC_PREFIX = "sahastra"
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()  # DEBUG brings back per-person/per-frame lines
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)  # Seconds
+
+
+def configure_logging(level=LOG_LEVEL):
+    """Sets up plain-message logging once; hot paths log at DEBUG and cost nothing at INFO."""
+    logging.basicConfig(level=level, format="%(message)s")
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.type = "counter"
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, dict(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self.type = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.type = "histogram"
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels):
+        series = self._series.get(tuple(sorted(labels.items())))
+        return series[-1] if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        samples = []
+        for key, values in series.items():
+            labels = dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_number(bound)}, cumulative))
+            samples.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, values[-1]))
+            samples.append((f"{self.name}_sum", labels, values[-2]))
+            samples.append((f"{self.name}_count", labels, values[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text format.
+
+    Each gunicorn worker keeps its own numbers; Prometheus tells them apart
+    by scrape target, or sums them.
+    """
+
+    def __init__(self, prefix=METRIC_PREFIX):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, help_text, **kwargs):
+        full_name = f"{self.prefix}_{name}"
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = cls(full_name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name, help_text):
+        return self._register(Counter, name, help_text)
+
+    def gauge(self, name, help_text):
+        return self._register(Gauge, name, help_text)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help_text, buckets=buckets)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+# ✅ Shared registry and the metrics the backend reports
+registry = MetricsRegistry()
+STAGE_SECONDS = registry.histogram("stage_seconds", "Time spent per analysis stage.")
+REQUEST_SECONDS = registry.histogram("http_request_seconds", "Flask route latency (to the first byte when streamed).")
+FIRESTORE_READS = registry.counter("firestore_reads_total", "Firestore documents read.")
+FIRESTORE_WRITES = registry.counter("firestore_writes_total", "Firestore documents written.")
+ALERTS_FIRED = registry.counter("alerts_fired_total", "Crowd surge alerts sent.")
+
+
+@contextmanager
+def stage_timer(stage):
+    """Records the duration of the ``with`` block under ``stage``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def count_reads(docs, collection):
+    """Passes documents through, counting each one as a Firestore read."""
+    for doc in docs:
+        FIRESTORE_READS.inc(collection=collection)
+        yield doc
@@ -0,0 +1,61 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from annotation_cache import get_person_tracks
+from heatmap import build_heatmaps
+
+# ✅ SCHEDULER SETTINGS
+MAX_PARALLEL_SOURCES = int(os.environ.get("MAX_PARALLEL_SOURCES", 8))  # Concurrent annotation waits
+
+
+def summarize_frames(seconds, centroids, fps):
+    """Per-frame ``(frame_numbers, counts, heatmap grids)``."""
+    frames, grids = build_heatmaps((np.asarray(seconds) * fps).astype(np.int64), centroids)
+    return frames, grids.sum(axis=(1, 2), dtype=np.int64), grids
+
+
+class SourceScheduler:
+    """Analyzes many cameras at once.
+
+    Each source runs on a thread pool of ``max_parallel``: the annotation
+    wait is network bound, and the post-processing is a few vectorized
+    NumPy passes, cheap enough to run on the same thread.
+    """
+
+    def __init__(self, max_parallel=MAX_PARALLEL_SOURCES):
+        self.max_parallel = max_parallel
+
+    def run(self, sources, summarize, handle, progress=None):
+        """Runs every source through annotation -> ``summarize`` -> ``handle``.
+
+        ``summarize(source, tracks)`` reduces a source's tracks, then
+        ``handle(source, summary)`` consumes the result. Returns
+        ``{camera_id: handle result}``; a failed source maps to
+        ``{"error": message}`` and does not stop the others.
+        """
+        sources = list(sources)
+        results = {}
+        if not sources:
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(sources)), thread_name_prefix="source") as threads:
+            futures = {threads.submit(self._run_one, source, summarize, handle): source for source in sources}
+
+            for future in as_completed(futures):
+                source = futures[future]
+                try:
+                    results[source.camera_id] = future.result()
+                except Exception as e:
+                    print(f"🔥 Analysis of {source.camera_id} failed: {e}")
+                    results[source.camera_id] = {"error": str(e)}
+                if progress:
+                    progress(sources_done=len(results), sources_total=len(sources))
+
+        return results
+
+    @staticmethod
+    def _run_one(source, summarize, handle):
+        tracks = get_person_tracks(source.video_uri)
+        return handle(source, summarize(source, tracks))
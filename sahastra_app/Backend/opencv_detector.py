@@ -0,0 +1,258 @@
+import os
+import time
+import logging
+import tempfile
+import multiprocessing
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from annotation_cache import PersonTracks, video_fingerprint
+from clients import get_storage_client
+from metrics import registry, stage_timer
+
+log = logging.getLogger(__name__)
+
+# ✅ DETECTOR SETTINGS
+DETECTOR_FPS = float(os.environ.get("DETECTOR_FPS", 10))  # Frames sampled per second of video (ai_analysis.FPS)
+DETECTOR_PROCESSES = int(os.environ.get("DETECTOR_PROCESSES", max(1, (os.cpu_count() or 2) - 1)))
+FRAME_WIDTH = int(os.environ.get("DETECTOR_FRAME_WIDTH", 640))  # Frames are downscaled to this width first
+SLOTS_PER_PROCESS = 2  # Shared-memory frame buffers per worker: one being detected, one being filled
+HOG_WIN_STRIDE = (8, 8)
+HOG_PADDING = (8, 8)
+HOG_SCALE = 1.05
+MIN_CONFIDENCE = 0.3  # HOG SVM score below which a detection is dropped
+NMS_THRESHOLD = 0.45  # Overlapping detections above this IoU are merged
+MATCH_IOU = 0.3  # A box overlapping a track's last box this much continues the track
+MAX_TRACK_GAP = 5  # Sampled frames a track may go undetected before it ends
+
+DETECTOR_FRAMES = registry.counter("detector_frames_total", "Frames run through the local person detector.")
+
+
+# ✅ Worker process side: attach to the shared frame buffers once, then detect per slot
+_worker = {}
+
+
+def _init_worker(shm_name, shape):
+    import cv2
+
+    cv2.setNumThreads(1)  # One core per process, so throughput per core is meaningful
+    shm = shared_memory.SharedMemory(name=shm_name)
+    hog = cv2.HOGDescriptor()
+    hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+    _worker.update(cv2=cv2, shm=shm, hog=hog, frames=np.ndarray(shape, np.uint8, buffer=shm.buf))
+
+
+def detect_people(slot, frame_number):
+    """Normalized ``(left, top, right, bottom)`` person boxes in one shared frame (runs in a worker)."""
+    cv2, frame = _worker["cv2"], _worker["frames"][slot]
+    height, width = frame.shape[:2]
+    rects, weights = _worker["hog"].detectMultiScale(frame, winStride=HOG_WIN_STRIDE, padding=HOG_PADDING,
+                                                     scale=HOG_SCALE)
+    if not len(rects):
+        return slot, frame_number, np.zeros((0, 4), np.float32)
+
+    keep = np.asarray(cv2.dnn.NMSBoxes(rects.tolist(), np.ravel(weights).tolist(),
+                                       MIN_CONFIDENCE, NMS_THRESHOLD), dtype=np.int64).ravel()
+    x, y, w, h = rects[keep].astype(np.float32).T
+    boxes = np.stack([x / width, y / height, (x + w) / width, (y + h) / height], axis=1)
+    return slot, frame_number, np.clip(boxes, 0, 1)
+
+
+# ✅ Parent side
+def sample_frames(capture, fps):
+    """Yields ``(frame_number, seconds, image)`` at ``fps``; skipped frames are grabbed but never decoded."""
+    import cv2
+
+    source_fps = capture.get(cv2.CAP_PROP_FPS) or fps
+    index, last_frame = 0, -1
+    while capture.grab():
+        seconds = index / source_fps
+        frame_number = int(seconds * fps)
+        index += 1
+        if frame_number == last_frame:
+            continue
+        ok, image = capture.retrieve()
+        if not ok:
+            break
+        last_frame = frame_number
+        yield frame_number, seconds, image
+
+
+def box_iou(a, b):
+    """(len(a), len(b)) IoU matrix of ``(left, top, right, bottom)`` boxes."""
+    left = np.maximum(a[:, None, 0], b[None, :, 0])
+    top = np.maximum(a[:, None, 1], b[None, :, 1])
+    right = np.minimum(a[:, None, 2], b[None, :, 2])
+    bottom = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+class IouTracker:
+    """Greedy IoU tracker: each box continues the best-overlapping live track or starts a new one."""
+
+    def __init__(self, match_iou=MATCH_IOU, max_gap=MAX_TRACK_GAP):
+        self.match_iou = match_iou
+        self.max_gap = max_gap
+        self._ids = np.zeros(0, np.int64)
+        self._boxes = np.zeros((0, 4), np.float32)
+        self._seen = np.zeros(0, np.int64)
+        self._next_id = 0
+
+    def update(self, frame_number, boxes):
+        """Track ids for one frame's boxes; frames must arrive in order."""
+        alive = frame_number - self._seen <= self.max_gap
+        self._ids, self._boxes, self._seen = self._ids[alive], self._boxes[alive], self._seen[alive]
+
+        ids = np.full(len(boxes), -1, np.int64)
+        if len(boxes) and len(self._ids):
+            iou = box_iou(self._boxes, boxes)
+            tracks, detections = np.unravel_index(np.argsort(iou, axis=None)[::-1], iou.shape)
+            used = np.zeros(len(self._ids), bool)
+            for track, detection in zip(tracks.tolist(), detections.tolist()):
+                if iou[track, detection] < self.match_iou:
+                    break
+                if used[track] or ids[detection] >= 0:
+                    continue
+                used[track] = True
+                ids[detection] = self._ids[track]
+                self._boxes[track] = boxes[detection]
+                self._seen[track] = frame_number
+
+        new = ids < 0
+        ids[new] = np.arange(self._next_id, self._next_id + new.sum())
+        self._next_id += int(new.sum())
+        self._ids = np.concatenate([self._ids, ids[new]])
+        self._boxes = np.concatenate([self._boxes, boxes[new]])
+        self._seen = np.concatenate([self._seen, np.full(new.sum(), frame_number, np.int64)])
+        return ids
+
+
+@contextmanager
+def local_video(video_uri):
+    """Path of a readable copy of ``video_uri``; ``gs://`` objects are downloaded to a temp file."""
+    if not video_uri.startswith("gs://"):
+        yield video_uri
+        return
+    bucket_name, _, blob_name = video_uri[len("gs://"):].partition("/")
+    suffix = os.path.splitext(blob_name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as f:
+        get_storage_client().bucket(bucket_name).blob(blob_name).download_to_filename(f.name)
+        yield f.name
+
+
+class OpenCVProvider:
+    """Local person detection, a drop-in for the Video Intelligence annotator.
+
+    The parent decodes the video, keeping one frame per ``1 / fps``
+    seconds, and copies each into a shared-memory slot; a spawned process
+    pool runs OpenCV's HOG people detector on the slots, and an IoU
+    tracker links the boxes into tracks. Output is the same PersonTracks
+    the cache stores for Video Intelligence, so the analyses run unchanged.
+    """
+
+    name = "opencv"
+
+    def __init__(self, fps=DETECTOR_FPS, processes=DETECTOR_PROCESSES, frame_width=FRAME_WIDTH):
+        self.fps = fps
+        self.processes = processes
+        self.frame_width = frame_width
+        self.last_stats = None
+
+    def fingerprint(self, video_uri):
+        source = video_fingerprint(video_uri)
+        return None if source is None else f"{source}:{self.fps}:{self.frame_width}"
+
+    def annotate(self, video_uri, features):
+        with local_video(video_uri) as path, stage_timer("local_detection"):
+            tracks = self.detect(path)
+        log.info("🎯 %s: %s", video_uri, self.last_stats)
+        return tracks
+
+    def detect(self, path):
+        import cv2
+
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video {path}")
+        width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        scale = min(1.0, self.frame_width / width)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        shape = (self.processes * SLOTS_PER_PROCESS, size[1], size[0], 3)
+
+        shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+        frames = np.ndarray(shape, np.uint8, buffer=shm.buf)
+        free = list(range(shape[0]))
+        pending, detections, seconds_of = set(), {}, {}
+        decode_seconds = 0.0
+
+        def collect(done):
+            for future in done:
+                slot, frame_number, boxes = future.result()
+                detections[frame_number] = boxes
+                free.append(slot)
+
+        started = time.perf_counter()
+        try:
+            mp_context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=self.processes, mp_context=mp_context,
+                                     initializer=_init_worker, initargs=(shm.name, shape)) as pool:
+                samples = sample_frames(capture, self.fps)
+                while True:
+                    decode_started = time.perf_counter()
+                    sample = next(samples, None)
+                    decode_seconds += time.perf_counter() - decode_started
+                    if sample is None:
+                        break
+                    frame_number, seconds, image = sample
+                    if not free:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    slot = free.pop()
+                    if scale < 1:
+                        cv2.resize(image, size, dst=frames[slot], interpolation=cv2.INTER_AREA)
+                    else:
+                        frames[slot] = image
+                    seconds_of[frame_number] = seconds
+                    pending.add(pool.submit(detect_people, slot, frame_number))
+                collect(wait(pending).done)
+        finally:
+            capture.release()
+            del frames
+            shm.close()
+            shm.unlink()
+        elapsed = time.perf_counter() - started
+
+        tracker = IouTracker()
+        columns = []
+        for frame_number in sorted(detections):
+            boxes = detections[frame_number]
+            if len(boxes):
+                ids = tracker.update(frame_number, boxes)
+                columns.append((ids, np.full(len(boxes), seconds_of[frame_number]), boxes))
+        DETECTOR_FRAMES.inc(len(detections))
+
+        frames_per_second = len(detections) / elapsed if elapsed else 0.0
+        self.last_stats = {
+            "frames": len(detections),
+            "processes": self.processes,
+            "frame_size": list(size),
+            "seconds": round(elapsed, 3),
+            "decode_seconds": round(decode_seconds, 3),
+            "frames_per_second": round(frames_per_second, 2),
+            "frames_per_second_per_core": round(frames_per_second / min(self.processes, os.cpu_count() or 1), 2)
+        }
+
+        if not columns:
+            return PersonTracks.from_rows([])
+        track_id = np.concatenate([c[0] for c in columns])
+        seconds = np.concatenate([c[1] for c in columns])
+        boxes = np.concatenate([c[2] for c in columns])
+        order = np.lexsort((seconds, track_id))  # Track by track, frame by frame, like the annotator
+        return PersonTracks(track_id[order], seconds[order], *boxes[order].T)
@@ -0,0 +1,118 @@
+from datetime import datetime
+from itertools import islice
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+# ✅ PAGINATION SETTINGS
+DEFAULT_PAGE_SIZE = 100  # Page size without ``limit``; NEXT_PAGE_HEADER says whether more remain
+MAX_PAGE_SIZE = 500
+NEXT_PAGE_HEADER = "X-Next-Start-After"  # ``start_after`` value for the next page, only sent when there is one
+
+
+class PageRequestError(ValueError):
+    """Raised for malformed ``limit``/``start_after``/``since``/``select`` arguments."""
+
+
+def parse_since(value, as_string=False):
+    """Parses an ISO-8601 ``since=`` argument.
+
+    Collections that store ISO strings (``sos_requests``) are compared as
+    strings, which sort chronologically; the rest compare datetimes.
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise PageRequestError(f"Invalid 'since' timestamp: {value}")
+    return parsed.isoformat() if as_string else parsed
+
+
+def parse_select(value, field_sources):
+    """Returns the requested response fields, checked against ``field_sources``."""
+    if not value:
+        return None
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in field_sources]
+    if unknown:
+        raise PageRequestError(f"Unknown 'select' fields: {', '.join(unknown)}")
+    return fields
+
+
+def parse_limit(args, default=DEFAULT_PAGE_SIZE):
+    """``limit=`` as an int, or ``default`` when it is not given."""
+    if args.get("limit") is None:
+        return default
+    try:
+        limit = int(args["limit"])
+    except ValueError:
+        raise PageRequestError("'limit' must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise PageRequestError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def build_page_query(collection_ref, args, field_sources, since_as_string=False):
+    """Builds a newest-first, cursor-paginated query from request arguments.
+
+    The query fetches one document past the page so ``read_page()`` can
+    tell whether another page follows. ``order_by("timestamp")`` skips
+    documents without a ``timestamp`` field, so legacy documents missing
+    it never appear in a page. ``field_sources`` maps each response field
+    to the Firestore field it is read from, so ``select=`` projects the
+    read as well as the response.
+    Returns ``(query, selected_fields, limit)``.
+    """
+    limit = parse_limit(args)
+    query = collection_ref.order_by("timestamp", direction=firestore.Query.DESCENDING)
+
+    since = args.get("since")
+    if since:
+        query = query.where(filter=FieldFilter("timestamp", ">=", parse_since(since, since_as_string)))
+
+    selected = parse_select(args.get("select"), field_sources)
+    if selected:
+        query = query.select(sorted({field_sources[f] for f in selected}))
+
+    start_after = args.get("start_after")
+    if start_after:
+        cursor = collection_ref.document(start_after).get()
+        if not cursor.exists:
+            raise PageRequestError(f"Unknown 'start_after' document: {start_after}")
+        query = query.start_after(cursor)
+
+    return query.limit(limit + 1), selected, limit
+
+
+def read_page(docs, limit):
+    """Splits the results of a ``build_page_query()`` query into ``(page, next_start_after)``."""
+    page = list(islice(docs, limit + 1))
+    if len(page) > limit:
+        return page[:limit], page[limit - 1].id
+    return page, None
+
+
+def project(item, selected):
+    """Keeps only the selected response fields (plus ``id``, the page cursor)."""
+    if not selected:
+        return item
+    return {key: value for key, value in item.items() if key == "id" or key in selected}
+
+
+def stream_json_list(docs, serialize, dumps):
+    """Yields a JSON array chunk by chunk while documents arrive.
+
+    The first document is fetched before the generator is returned, so
+    query errors surface before any response headers are sent.
+    """
+    docs = iter(docs)
+    first = next(docs, None)
+
+    def generate():
+        if first is None:
+            yield "[]"
+            return
+        yield "[" + dumps(serialize(first))
+        for doc in docs:
+            yield "," + dumps(serialize(doc))
+        yield "]"
+
+    return generate()
@@ -0,0 +1,212 @@
+import zlib
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from metrics import count_reads
+
+# ✅ ROLLUP SETTINGS
+ROLLUPS_COLLECTION = "crowd_rollups"
+RESOLUTIONS = (1, 10, 60)  # Bucket widths in seconds, finest first
+BUCKETS_PER_DOC = 60  # Buckets stored together in one Firestore document
+FLUSH_SECONDS = 5  # Live rollups are written at most this often (in stream time)
+DEFAULT_POINTS = 300  # Points per chart when no ``step`` is requested
+MAX_POINTS = 2000
+# People-count histogram bins: exact up to 20, then ~15% wide; p95 is read from these
+HIST_EDGES = np.unique(np.r_[np.arange(20), np.geomspace(20, 10000, 45).astype(np.int64)])
+STATS = ("min", "max", "sum", "samples")
+
+
+def _empty(buckets):
+    stats = np.zeros((buckets, len(STATS)))
+    stats[:, 0] = np.inf
+    stats[:, 1] = -np.inf
+    return stats, np.zeros((buckets, len(HIST_EDGES)), np.uint32)
+
+
+def encode_rollup(stats, hist):
+    return zlib.compress(stats.astype(np.float64).tobytes(), 6), zlib.compress(hist.astype(np.uint32).tobytes(), 6)
+
+
+def decode_rollup(data):
+    stats = np.frombuffer(zlib.decompress(data["stats"]), np.float64).reshape(-1, len(STATS)).copy()
+    hist = np.frombuffer(zlib.decompress(data["hist"]), np.uint32).reshape(len(stats), -1).copy()
+    return stats, hist
+
+
+def doc_id(camera_id, resolution, doc_index, run_id, part=0):
+    return f"{camera_id}_{resolution}s_{doc_index}_{run_id}_{part}"
+
+
+class RollupAggregator:
+    """Per-source min/max/mean/p95 people counts over 1 s, 10 s and 1 min buckets.
+
+    Counts are folded into in-memory buckets as frames arrive; each
+    resolution keeps ``BUCKETS_PER_DOC`` buckets per document, so an hour
+    of 1-minute buckets is one read per run. Every aggregator writes its
+    own documents (tagged with ``run_id``) and never reads any, so
+    overlapping runs, workers and restarts cannot overwrite each other's
+    counts; ``load_timeseries`` merges all runs covering a window. A
+    document forgotten after a flush that receives a late frame is
+    started again as a new ``part``.
+    """
+
+    def __init__(self, writer, camera_id, resolutions=RESOLUTIONS, flush_seconds=FLUSH_SECONDS, run_id=None):
+        self.writer = writer
+        self.camera_id = camera_id
+        self.resolutions = resolutions
+        self.flush_seconds = flush_seconds
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self._docs = {}  # (resolution, doc index) -> (stats, hist, part)
+        self._dirty = set()
+        self._flushes = 0
+        self._flushed_at = None
+        self._latest = None
+
+    def _doc(self, resolution, doc_index):
+        key = (resolution, doc_index)
+        if key not in self._docs:
+            self._docs[key] = (*_empty(BUCKETS_PER_DOC), self._flushes)
+        return self._docs[key]
+
+    def add_many(self, timestamps, counts):
+        """Folds in people ``counts`` seen at epoch-second ``timestamps``."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        counts = np.asarray(counts, dtype=np.float64)
+        if not len(timestamps):
+            return
+        bins = np.searchsorted(HIST_EDGES, counts, side="right") - 1
+
+        for resolution in self.resolutions:
+            buckets = np.floor(timestamps / resolution).astype(np.int64)
+            doc_indices = buckets // BUCKETS_PER_DOC
+            for doc_index in np.unique(doc_indices).tolist():
+                rows = doc_indices == doc_index
+                slots = buckets[rows] - doc_index * BUCKETS_PER_DOC
+                stats, hist, _ = self._doc(resolution, doc_index)
+                np.minimum.at(stats[:, 0], slots, counts[rows])
+                np.maximum.at(stats[:, 1], slots, counts[rows])
+                np.add.at(stats[:, 2], slots, counts[rows])
+                np.add.at(stats[:, 3], slots, 1)
+                np.add.at(hist, (slots, bins[rows]), 1)
+                self._dirty.add((resolution, doc_index))
+
+        newest = float(timestamps.max())
+        self._latest = newest if self._latest is None else max(self._latest, newest)
+        if self._flushed_at is None:
+            self._flushed_at = self._latest
+        elif self._latest - self._flushed_at >= self.flush_seconds:
+            self.flush()
+
+    def add(self, timestamp, count):
+        self.add_many([timestamp], [count])
+
+    def flush(self):
+        """Queues every changed document on the writer; returns how many."""
+        collection = self.writer.db.collection(ROLLUPS_COLLECTION)
+        for resolution, doc_index in sorted(self._dirty):
+            stats, hist, part = self._docs[(resolution, doc_index)]
+            start = doc_index * BUCKETS_PER_DOC * resolution
+            encoded_stats, encoded_hist = encode_rollup(stats, hist)
+            self.writer.set(collection.document(doc_id(self.camera_id, resolution, doc_index, self.run_id, part)), {
+                "camera_id": self.camera_id,
+                "run_id": self.run_id,
+                "resolution": resolution,
+                "start_time": datetime.fromtimestamp(start, timezone.utc),
+                "end_time": datetime.fromtimestamp(start + BUCKETS_PER_DOC * resolution, timezone.utc),
+                "stats": encoded_stats,
+                "hist": encoded_hist
+            })
+        flushed = len(self._dirty)
+        self._dirty.clear()
+        self._flushes += 1
+        self._flushed_at = self._latest
+
+        # Live streams only move forward; forget documents that can no longer change
+        if self._latest is not None:
+            self._docs = {key: value for key, value in self._docs.items()
+                          if (key[1] + 1) * BUCKETS_PER_DOC * key[0] > self._latest - self.flush_seconds}
+        return flushed
+
+
+def choose_resolution(step, resolutions=RESOLUTIONS):
+    """The coarsest stored resolution no wider than ``step`` seconds."""
+    fitting = [r for r in resolutions if r <= step]
+    return max(fitting) if fitting else min(resolutions)
+
+
+def percentile_from_hist(hist, q):
+    """Per-row ``q`` percentile, as the top of the histogram bin it falls in."""
+    totals = hist.sum(axis=1, keepdims=True)
+    cumulative = hist.cumsum(axis=1)
+    index = (cumulative < np.ceil(totals * q)).sum(axis=1)
+    upper = np.r_[HIST_EDGES[1:] - 1, HIST_EDGES[-1]]
+    return upper[np.minimum(index, len(HIST_EDGES) - 1)]
+
+
+def load_timeseries(db, camera_id, start, end, step=None, points=DEFAULT_POINTS):
+    """People-count series of a camera over ``[start, end)`` at ``step`` seconds.
+
+    Reads the coarsest rollup that still resolves ``step`` (by default
+    ``(end - start) / points``), then merges its buckets into steps;
+    documents of different runs covering the same buckets merge the same way.
+    """
+    span = (end - start).total_seconds()
+    step = max(float(step) if step else span / points, RESOLUTIONS[0])
+    resolution = choose_resolution(step)
+    step = max(resolution, int(round(step / resolution)) * resolution)
+
+    # Documents starting up to one document span before ``start`` still overlap it
+    earliest = start - timedelta(seconds=BUCKETS_PER_DOC * resolution)
+    query = (db.collection(ROLLUPS_COLLECTION)
+             .where(filter=FieldFilter("camera_id", "==", camera_id))
+             .where(filter=FieldFilter("resolution", "==", resolution))
+             .where(filter=FieldFilter("start_time", ">", earliest))
+             .where(filter=FieldFilter("start_time", "<", end))
+             .order_by("start_time"))
+    start_epoch, end_epoch = start.timestamp(), end.timestamp()
+    groups = {}  # step index -> (stats, hist) merged over its buckets
+    docs_read = 0
+    for doc in count_reads(query.stream(), ROLLUPS_COLLECTION):
+        docs_read += 1
+        data = doc.to_dict()
+        stats, hist = decode_rollup(data)
+        bucket_starts = data["start_time"].timestamp() + np.arange(len(stats)) * resolution
+        keep = (stats[:, 3] > 0) & (bucket_starts >= start_epoch) & (bucket_starts < end_epoch)
+        for bucket_start, row, row_hist in zip(bucket_starts[keep], stats[keep], hist[keep]):
+            group = int((bucket_start - start_epoch) // step)
+            if group in groups:
+                merged, merged_hist = groups[group]
+                merged[0] = min(merged[0], row[0])
+                merged[1] = max(merged[1], row[1])
+                merged[2:] += row[2:]
+                merged_hist += row_hist
+            else:
+                groups[group] = (row.copy(), row_hist.astype(np.int64))
+
+    order = sorted(groups)
+    series = []
+    if order:
+        stats = np.array([groups[g][0] for g in order])
+        p95 = np.minimum(percentile_from_hist(np.array([groups[g][1] for g in order]), 0.95), stats[:, 1])
+        for g, row, p in zip(order, stats, p95.tolist()):
+            series.append({
+                "time": (start + timedelta(seconds=g * step)).astimezone(timezone.utc).isoformat(),
+                "min": int(row[0]),
+                "max": int(row[1]),
+                "mean": round(row[2] / row[3], 2),
+                "p95": int(max(p, row[0])),
+                "samples": int(row[3])
+            })
+
+    return {
+        "camera_id": camera_id,
+        "start_time": start.astimezone(timezone.utc).isoformat(),
+        "end_time": end.astimezone(timezone.utc).isoformat(),
+        "step_seconds": step,
+        "rollup_seconds": resolution,
+        "docs_read": docs_read,
+        "points": series
+    }
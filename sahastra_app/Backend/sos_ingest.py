@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import logging
+import threading
+from datetime import datetime
+
+from google.cloud.firestore_v1 import GeoPoint
+
+from firestore_batch import BatchedWriter
+from geo_index import geo_fields
+from metrics import FIRESTORE_WRITES, registry
+
+log = logging.getLogger(__name__)
+
+# ✅ SOS INGEST SETTINGS
+SOS_COLLECTION = "sos_requests"
+WAL_DIR = os.environ.get(
+    "SOS_WAL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sos_wal")
+)
+WAL_FSYNC = os.environ.get("SOS_WAL_FSYNC", "1") != "0"  # Acknowledge only after the log hits the disk
+DEDUP_WINDOW_SECONDS = 30  # Repeat SOS from one device/place within this window are collapsed
+DEDUP_PRECISION = 4  # Decimal places of lat/lon identifying "the same place" (~11 m)
+COMMIT_INTERVAL = 0.2  # Seconds between bulk commits to Firestore
+MAX_DEDUP_KEYS = 10000  # Expired keys are swept once this many are remembered
+
+SOS_ACCEPTED = registry.counter("sos_accepted_total", "SOS requests logged for commit.")
+SOS_DUPLICATES = registry.counter("sos_duplicates_total", "SOS requests collapsed into an earlier one.")
+
+
+def sos_document(record):
+    """The ``sos_requests`` document for a logged SOS, shaped like the old inline write."""
+    data = {
+        "location": GeoPoint(record["latitude"], record["longitude"]),
+        **geo_fields(record["latitude"], record["longitude"]),
+        "timestamp": record["timestamp"]
+    }
+    if record.get("device_id"):
+        data["device_id"] = record["device_id"]
+    return data
+
+
+class SosLog:
+    """Append-only JSON-lines log owned (``flock``-ed) by one process.
+
+    Appends are group-committed: whichever caller finds the log idle
+    fsyncs everything queued so far, so a burst of requests shares one
+    disk flush. Written records also queue up, in file order, for
+    ``take_unsent()``; ``<log>.checkpoint`` holds the byte offset up to
+    which records are known to be in Firestore. Emptying the log waits for
+    any fsync in flight and starts a new ``epoch``, so offsets from before
+    the truncation are never mistaken for durable ones.
+    """
+
+    def __init__(self, path, fsync=WAL_FSYNC):
+        self.path = path
+        self.fsync = fsync
+        self._file = open(path, "a+b")
+        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._written = self._size  # Bytes handed to the OS
+        self._durable = self._size  # Bytes known to be on disk
+        self._syncing = False
+        self._epoch = 0  # Bumped every time the log is emptied
+        self._unsent = []  # (end_offset, record) in file order
+
+    def append(self, record):
+        """Logs one record durably; returns its end offset."""
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        with self._lock:
+            self._file.write(line)
+            self._written += len(line)
+            end = self._written
+            epoch = self._epoch
+            self._unsent.append((end, record))
+            # A new epoch means the log was emptied, which only happens once this record is committed
+            while self._epoch == epoch and self._durable < end:
+                if self._syncing:
+                    self._synced.wait()
+                    continue
+                self._syncing = True
+                target = self._written
+                self._lock.release()
+                try:
+                    self._file.flush()
+                    if self.fsync:
+                        os.fsync(self._file.fileno())
+                finally:
+                    self._lock.acquire()
+                    self._syncing = False
+                self._durable = max(self._durable, target)
+                self._synced.notify_all()
+        return end
+
+    def take_unsent(self):
+        with self._lock:
+            unsent, self._unsent = self._unsent, []
+            return unsent
+
+    def requeue(self, records):
+        with self._lock:
+            self._unsent[:0] = records
+
+    def checkpoint(self):
+        try:
+            with open(self.path + ".checkpoint") as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def set_checkpoint(self, offset):
+        """Records progress; the log is emptied once every record is committed."""
+        with self._lock:
+            while self._syncing and offset >= self._written:
+                self._synced.wait()  # The fsync in flight was sized for the old file
+            if offset >= self._written:
+                self._file.truncate(0)
+                self._epoch += 1
+                self._written = self._durable = 0
+                offset = 0
+        tmp = self.path + ".checkpoint.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp, self.path + ".checkpoint")
+
+    def close(self):
+        self._file.close()
+
+
+def read_records(path, offset=0):
+    """``(end_offset, record)`` pairs logged after ``offset``; a torn last line is skipped."""
+    records = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            if not line.endswith(b"\n"):
+                break
+            records.append((offset, json.loads(line)))
+    return records
+
+
+class SosIngestor:
+    """Fast path for ``/send_sos``.
+
+    A request is acknowledged once it is in the local write-ahead log; a
+    background committer writes logged SOS to Firestore in bulk through a
+    BatchedWriter. Document ids are chosen up front, so replaying the log
+    after a crash rewrites the same documents instead of duplicating
+    them. Repeat SOS from the same device (or, without a device id, the
+    same spot) inside ``dedup_window`` seconds return the first SOS id.
+    """
+
+    def __init__(self, db, wal_dir=WAL_DIR, dedup_window=DEDUP_WINDOW_SECONDS,
+                 commit_interval=COMMIT_INTERVAL, fsync=WAL_FSYNC, clock=time.monotonic):
+        self.db = db
+        self.wal_dir = wal_dir
+        self.dedup_window = dedup_window
+        self.commit_interval = commit_interval
+        self.clock = clock
+        self._recent = {}  # dedup key -> (sos_id, first seen)
+        self._queued_end = 0  # Log offset of the last record handed to the writer
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+        os.makedirs(wal_dir, exist_ok=True)
+        self.log = SosLog(os.path.join(wal_dir, f"sos-{os.getpid()}-{uuid.uuid4().hex[:8]}.log"), fsync)
+        self._writer = BatchedWriter(db, background=False)
+        self.replayed = self._replay_orphans()
+        self._thread = threading.Thread(target=self._commit_loop, name="sos-committer", daemon=True)
+        self._thread.start()
+
+    def dedup_key(self, latitude, longitude, device_id=None):
+        if device_id:
+            return ("device", device_id)
+        return ("place", round(latitude, DEDUP_PRECISION), round(longitude, DEDUP_PRECISION))
+
+    def submit(self, latitude, longitude, device_id=None):
+        """Logs an SOS; returns ``(sos_id, duplicate)``."""
+        key = self.dedup_key(latitude, longitude, device_id)
+        now = self.clock()
+        with self._lock:
+            seen = self._recent.get(key)
+            if seen is not None and now - seen[1] <= self.dedup_window:
+                SOS_DUPLICATES.inc()
+                return seen[0], True
+            sos_id = uuid.uuid4().hex[:20]
+            self._recent[key] = (sos_id, now)
+            if len(self._recent) > MAX_DEDUP_KEYS:
+                self._expire(now)
+
+        record = {"id": sos_id, "latitude": latitude, "longitude": longitude,
+                  "device_id": device_id, "timestamp": datetime.utcnow().isoformat()}
+        try:
+            self.log.append(record)
+        except Exception:
+            # Not logged: a retry must be taken as a new SOS, not answered with this id
+            with self._lock:
+                if self._recent.get(key, (None,))[0] == sos_id:
+                    del self._recent[key]
+            raise
+        SOS_ACCEPTED.inc()
+        return sos_id, False
+
+    def _expire(self, now):
+        self._recent = {key: seen for key, seen in self._recent.items() if now - seen[1] <= self.dedup_window}
+
+    def _replay_orphans(self):
+        """Commits what crashed processes logged but never wrote to Firestore."""
+        replayed = 0
+        for name in sorted(os.listdir(self.wal_dir)):
+            path = os.path.join(self.wal_dir, name)
+            if not name.endswith(".log") or path == self.log.path:
+                continue
+            try:
+                orphan = SosLog(path)
+            except BlockingIOError:
+                continue  # Owned by a live worker
+            try:
+                records = read_records(path, orphan.checkpoint())
+                for _, record in records:
+                    self._writer.set(self.db.collection(SOS_COLLECTION).document(record["id"]), sos_document(record))
+                self._writer.flush()
+                FIRESTORE_WRITES.inc(len(records), path="sos_replay")
+                replayed += len(records)
+            except Exception as e:
+                log.error("🔥 Could not replay %s, keeping it for the next start: %s", path, e)
+                continue
+            finally:
+                orphan.close()
+            for leftover in (path, path + ".checkpoint"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        if replayed:
+            log.warning("♻️ Replayed %d logged SOS requests from a previous run", replayed)
+        return replayed
+
+    def _commit_loop(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.commit_interval)
+            self._wake.clear()
+            self.commit()
+
+    def commit(self):
+        """Writes every logged SOS to Firestore; returns how many were committed."""
+        pending = self.log.take_unsent()
+        queued = 0
+        try:
+            for end, record in pending:
+                queued += 1
+                self._queued_end = end
+                self._writer.set(self.db.collection(SOS_COLLECTION).document(record["id"]), sos_document(record))
+            if not self._writer.pending():
+                return 0
+            self._writer.flush()
+        except Exception as e:
+            # The writer keeps failed writes queued, so the next commit retries them
+            log.error("🔥 SOS commit failed, will retry: %s", e)
+            self.log.requeue(pending[queued:])
+            return 0
+
+        FIRESTORE_WRITES.inc(len(pending), path="sos")
+        self.log.set_checkpoint(self._queued_end)
+        return len(pending)
+
+    def close(self):
+        """Commits what is left and stops the committer."""
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+        self.commit()
+        self.log.close()
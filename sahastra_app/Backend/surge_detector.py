@@ -0,0 +1,113 @@
+import time
+import threading
+from collections import namedtuple
+
+# What a detector reports when a surge is confirmed
+SurgeEvent = namedtuple("SurgeEvent", "camera_id frame_numbers peak_count")
+
+
+class SurgeDetector:
+    """Sliding-window crowd surge detector for one camera or zone.
+
+    The last ``window_frames`` frames live in a ring buffer with a running
+    count of high frames, so each update is O(1). A surge fires when at
+    least ``required_frames`` of the window are high and ``cooldown``
+    seconds have passed since the last one; the window then starts over.
+    With ``hysteresis`` a frame stays high until the count drops below
+    ``threshold - hysteresis``, so a crowd hovering at the limit does not
+    keep resetting the window. With ``turbulence_threshold`` a frame whose
+    motion turbulence reaches it is already high at
+    ``threshold * turbulence_factor`` people.
+    """
+
+    def __init__(self, camera_id, threshold, window_frames, required_frames=None,
+                 cooldown=0.0, hysteresis=0, turbulence_threshold=None, turbulence_factor=1.0, clock=time.time):
+        if window_frames < 1:
+            raise ValueError("window_frames must be at least 1")
+        self.camera_id = camera_id
+        self.threshold = threshold
+        self.window_frames = window_frames
+        self.required_frames = required_frames or window_frames
+        self.cooldown = cooldown
+        self.hysteresis = hysteresis
+        self.turbulence_threshold = turbulence_threshold
+        self.turbulence_factor = turbulence_factor
+        self.clock = clock
+
+        self._flags = [False] * window_frames
+        self._frames = [None] * window_frames
+        self._counts = [0] * window_frames
+        self._pos = 0
+        self._high = 0
+        self._active = False
+        self._last_alert = None
+        self._lock = threading.Lock()  # Only contended if one camera is fed from two threads
+
+    def update(self, frame_number, people_count, turbulence=0.0):
+        """Adds one frame; returns a SurgeEvent if it confirms a surge, else None."""
+        with self._lock:
+            limit = self.threshold - self.hysteresis if self._active else self.threshold
+            if self.turbulence_threshold is not None and turbulence >= self.turbulence_threshold:
+                limit *= self.turbulence_factor
+            high = people_count >= limit
+            self._active = high
+
+            pos = self._pos
+            self._high += high - self._flags[pos]
+            self._flags[pos] = high
+            self._frames[pos] = frame_number
+            self._counts[pos] = people_count
+            self._pos = (pos + 1) % self.window_frames
+
+            if self._high < self.required_frames:
+                return None
+
+            now = self.clock()
+            if self._last_alert is not None and now - self._last_alert <= self.cooldown:
+                return None
+
+            event = SurgeEvent(self.camera_id, self._window_frames(), max(self._counts))
+            self._last_alert = now
+            self._clear()
+            return event
+
+    def _window_frames(self):
+        order = [(self._pos + i) % self.window_frames for i in range(self.window_frames)]
+        return [self._frames[i] for i in order if self._flags[i]]
+
+    def _clear(self):
+        self._flags = [False] * self.window_frames
+        self._counts = [0] * self.window_frames
+        self._high = 0
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+            self._active = False
+            self._last_alert = None
+
+
+class DetectorRegistry:
+    """Lazily creates one SurgeDetector per camera/zone id.
+
+    Detectors share nothing, so hundreds of camera streams can be
+    evaluated concurrently; the registry lock is only taken on creation.
+    """
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self._detectors = {}
+        self._lock = threading.Lock()
+
+    def get(self, camera_id, **overrides):
+        detector = self._detectors.get(camera_id)
+        if detector is None:
+            with self._lock:
+                detector = self._detectors.get(camera_id)
+                if detector is None:
+                    detector = SurgeDetector(camera_id, **{**self.defaults, **overrides})
+                    self._detectors[camera_id] = detector
+        return detector
+
+    def __len__(self):
+        return len(self._detectors)
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ANNOTATION_CACHE_DIR", tempfile.mkdtemp(prefix="test_annotations_"))
+os.environ.setdefault("SOS_WAL_DIR", tempfile.mkdtemp(prefix="test_sos_wal_"))
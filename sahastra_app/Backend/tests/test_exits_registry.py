@@ -0,0 +1,57 @@
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.synthetic import generate_exits
+from exits_registry import ExitsRegistry
+from metrics import FIRESTORE_READS
+
+
+def counted_reads(collection):
+    return FIRESTORE_READS.value(collection=collection)
+
+
+def test_listener_reads_count_changed_documents_only():
+    db = FakeFirestore()
+    db.seed("exits_under_test", generate_exits(6))
+    before = counted_reads("exits_under_test")
+
+    registry = ExitsRegistry(db, collection="exits_under_test").start()
+    assert registry.mode == "listener"
+    assert counted_reads("exits_under_test") - before == 6
+
+    version = registry.version
+    db.collection("exits_under_test").document("exit_2").set({"congestion_level": 9}, merge=True)
+    assert counted_reads("exits_under_test") - before == 7
+    assert counted_reads("exits_under_test") - before == db.counters.to_dict()["reads"]
+
+    snapshot_version, _ = registry.snapshot()
+    assert snapshot_version == version + 1
+    assert registry.exits()["exit_2"]["congestion_level"] == 9
+    registry.stop()
+
+
+def test_polling_counts_every_document_it_reads():
+    db = FakeFirestore()
+    db.seed("polled_exits", generate_exits(4))
+    registry = ExitsRegistry(db, collection="polled_exits", poll_interval=3600)
+    before = counted_reads("polled_exits")
+    registry._poll_once()
+    registry._poll_once()
+    assert counted_reads("polled_exits") - before == 8
+    assert len(registry.exits()) == 4
+
+
+def test_table_for_reuses_the_shared_table_for_current_exits():
+    db = FakeFirestore()
+    db.seed("exits_for_lookup", generate_exits(5))
+    registry = ExitsRegistry(db, collection="exits_for_lookup").start()
+
+    table = registry.table()
+    assert registry.table_for() is table
+    assert registry.table_for(registry.exits()) is table
+
+    edited = registry.exits()
+    edited["exit_1"]["congestion_level"] = 50
+    other = registry.table_for(edited)
+    assert other is not table
+    assert other.exit_ids == table.exit_ids
+    assert other.congestion.tolist()[1] == 50
+    registry.stop()
@@ -0,0 +1,69 @@
+import pytest
+
+import firestore_batch
+from benchmarks.fake_firestore import FakeFirestore
+from firestore_batch import BatchedWriter
+
+
+class FlakyFirestore(FakeFirestore):
+    """Fails the next ``failures`` batch commits."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def batch(self):
+        batch = super().batch()
+        commit = batch.commit
+
+        def flaky_commit():
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("deadline exceeded")
+            commit()
+
+        batch.commit = flaky_commit
+        return batch
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(firestore_batch.time, "sleep", delays.append)
+    return delays
+
+
+def stored(db, collection="counts"):
+    return {doc.id: doc.to_dict() for doc in db.collection(collection).stream()}
+
+
+def test_failed_commits_are_retried_with_doubling_backoff(sleeps):
+    db = FlakyFirestore(failures=3)
+    writer = BatchedWriter(db, retry_backoff=0.5, background=False)
+    for i in range(3):
+        writer.set(db.collection("counts").document(str(i)), {"count": i})
+    writer.flush()
+
+    assert sleeps == [0.5, 1.0, 2.0]
+    assert writer.stats()["batches_retried"] == 3
+    assert writer.stats()["writes_flushed"] == 3
+    assert stored(db) == {"0": {"count": 0}, "1": {"count": 1}, "2": {"count": 2}}
+
+
+def test_writes_are_requeued_when_retries_run_out(sleeps):
+    db = FlakyFirestore(failures=3)
+    writer = BatchedWriter(db, max_retries=1, background=False)
+    for i in range(5):
+        writer.set(db.collection("counts").document(str(i)), {"count": i})
+
+    # The batch fails twice and gives up before anything is written
+    with pytest.raises(ConnectionError):
+        writer.flush()
+    assert writer.pending() == 5
+    assert stored(db) == {}
+
+    # One failure left: the retry covers it and every write lands once
+    writer.flush()
+    assert writer.pending() == 0
+    assert writer.stats()["writes_flushed"] == 5
+    assert sorted(stored(db)) == ["0", "1", "2", "3", "4"]
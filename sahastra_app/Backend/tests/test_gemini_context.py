@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+
+import gemini_context
+from benchmarks.fake_firestore import FakeFirestore
+from gemini_context import GeminiAssistant, alerts_version
+
+
+class EchoModel:
+    def generate_content(self, prompt):
+        return type("Response", (), {"text": prompt[-20:]})()
+
+
+def test_version_stamp_is_reused_within_its_ttl():
+    gemini_context._versions.clear()
+    db = FakeFirestore()
+    db.seed("alerts", [("a1", {"message": "crowded", "timestamp": datetime.now(timezone.utc)})])
+
+    db.counters.reset()
+    first = alerts_version(db.collection("alerts"))
+    second = alerts_version(db.collection("alerts"))
+    assert first == second is not None
+    assert db.counters.to_dict()["rpcs"] == 3
+
+
+def test_alerts_load_once_per_version_across_queries():
+    loads = []
+
+    def load_alerts():
+        loads.append(1)
+        return [{"message": "crowded", "timestamp": datetime.now(timezone.utc)}]
+
+    assistant = GeminiAssistant(model_factory=EchoModel)
+    assert assistant.answer("Where is it crowded?", load_alerts, "v1")[1] is False
+    assert assistant.answer("Which exit is free?", load_alerts, "v1")[1] is False
+    assert assistant.answer("Where is it crowded", load_alerts, "v1")[1] is True
+    assert len(loads) == 1
+
+    assistant.answer("Which exit is free?", load_alerts, "v2")
+    assert len(loads) == 2
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta, timezone
+
+import geo_index
+from benchmarks.fake_firestore import FakeFirestore
+
+NOW = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def alert(minutes_ago, as_string=False, latitude=28.6, longitude=77.2):
+    timestamp = NOW - timedelta(minutes=minutes_ago)
+    if as_string:
+        # /send_alert writes ``datetime.utcnow().isoformat()``
+        timestamp = timestamp.replace(tzinfo=None).isoformat()
+    return {"location": {"latitude": latitude, "longitude": longitude},
+            "timestamp": timestamp, **geo_index.geo_fields(latitude, longitude)}
+
+
+def test_search_merges_datetime_and_string_timestamps_newest_first():
+    db = FakeFirestore()
+    db.seed("alerts", [("a-old", alert(30)), ("a-new", alert(5)), ("a-far", alert(1, latitude=10.0))])
+    db.seed("alerts2", [("b-mid", alert(10, as_string=True)), ("b-newest", alert(2, as_string=True))])
+    sources = [("alerts", False), ("alerts2", True)]
+    geo = geo_index.near(28.6, 77.2, 300)
+
+    docs = geo_index.search_collections(db, sources, geo, limit=10)
+    assert [doc.id for doc in docs] == ["b-newest", "a-new", "b-mid", "a-old"]
+
+    docs = geo_index.search_collections(db, sources, geo, limit=10, since=NOW - timedelta(minutes=8))
+    assert [doc.id for doc in docs] == ["b-newest", "a-new"]
+
+    docs = geo_index.search_collections(db, sources, geo, limit=3, since=(NOW - timedelta(minutes=20)).replace(tzinfo=None))
+    assert [doc.id for doc in docs] == ["b-newest", "a-new", "b-mid"]
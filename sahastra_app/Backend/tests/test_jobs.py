@@ -0,0 +1,44 @@
+import threading
+
+from jobs import FAILED, SUCCEEDED, JobRunner
+
+
+def test_same_kind_and_params_share_one_run():
+    release = threading.Event()
+    runner = JobRunner(max_workers=1)
+    first, created = runner.submit("replay", lambda progress: release.wait(5), {"file": "a", "speed": 1.0})
+    assert created
+    assert runner.submit("replay", lambda progress: None, {"speed": 1.0, "file": "a"}) == (first, False)
+    other, created = runner.submit("replay", lambda progress: None, {"file": "b", "speed": 1.0})
+    assert created and other is not first
+    release.set()
+
+
+def test_prune_skips_a_job_that_is_finishing():
+    runner = JobRunner(max_workers=1, max_finished=1)
+    job, _ = runner.submit("a", lambda progress: 1)
+    runner._executor.shutdown(wait=True)
+    assert job.status == SUCCEEDED and job.finished_at is not None
+
+    # A job caught between its terminal status and its finish time
+    job.finished_at = None
+    runner._prune()
+    assert runner.get(job.id) is job
+
+
+def test_oldest_finished_jobs_are_dropped_beyond_the_limit():
+    runner = JobRunner(max_workers=1, max_finished=2)
+    jobs = [runner.submit("count", lambda progress: i, {"i": i})[0] for i in range(4)]
+    runner._executor.shutdown(wait=True)
+    runner._prune()
+    assert [runner.get(job.id) is not None for job in jobs] == [False, False, True, True]
+
+
+def test_failed_job_reports_its_error():
+    def explode(progress):
+        raise RuntimeError("boom")
+
+    runner = JobRunner(max_workers=1)
+    job, _ = runner.submit("bad", explode)
+    runner._executor.shutdown(wait=True)
+    assert (job.status, job.error) == (FAILED, "boom")
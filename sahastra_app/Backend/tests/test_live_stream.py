@@ -0,0 +1,48 @@
+import functools
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import generate_tracks
+from live_stream import IncrementalDensityMonitor, ReplaySource, TrackEvent
+
+
+def event(seconds, track_id, captured_at=0.0):
+    return TrackEvent(seconds, track_id, 0.1, 0.1, 0.3, 0.5, captured_at)
+
+
+def test_replayed_tracks_give_the_batch_per_frame_counts(tmp_path):
+    tracks = generate_tracks(people=7, frames=30, fps=10, seed=3)
+    path = str(tmp_path / "tracks.npz")
+    tracks.save(path)
+
+    monitor = IncrementalDensityMonitor(fps=10)
+    frames = list(monitor.consume(ReplaySource.from_file(path, speed=None)))
+
+    expected_frames, expected_counts = np.unique((tracks.seconds * 10).astype(np.int64), return_counts=True)
+    assert [frame for frame, _, _ in frames] == expected_frames.tolist()
+    assert [count for _, count, _ in frames] == expected_counts.tolist()
+
+
+def test_repeated_sightings_count_once_and_late_events_are_dropped():
+    events = [
+        event(0.0, 1, captured_at=1.0), event(0.05, 1, captured_at=2.0), event(0.0, 2),
+        event(0.1, 1), event(0.2, 1),
+        event(0.05, 3),  # Frame 0 was emitted when frame 1 closed the lateness window
+        event(0.3, 1), event(0.3, 2),
+    ]
+    frames = list(IncrementalDensityMonitor(fps=10, lateness_frames=1).consume(events))
+    assert frames == [(0, 2, 2.0), (1, 1, 0.0), (2, 1, 0.0), (3, 2, 0.0)]
+
+
+@pytest.mark.parametrize("contents", [b"", b"PK\x03\x04 truncated"], ids=["empty", "truncated"])
+def test_corrupt_replay_file_is_rejected(tmp_path, monkeypatch, contents):
+    import app
+    import live_stream
+
+    (tmp_path / "broken.npz").write_bytes(contents)
+    monkeypatch.setattr(app, "resolve_input", functools.partial(live_stream.resolve_input, base_dir=str(tmp_path)))
+
+    response = app.app.test_client().post("/run_live_crowd_analysis", json={"replay_file": "broken.npz"})
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("Invalid live input")
@@ -0,0 +1,29 @@
+from benchmarks.run import Context, parse_args
+from benchmarks.synthetic import generate_alerts
+from pagination import DEFAULT_PAGE_SIZE, NEXT_PAGE_HEADER
+
+
+def test_unpaged_alerts_are_bounded_and_point_at_the_next_page():
+    ctx = Context(parse_args(["--alerts", str(DEFAULT_PAGE_SIZE + 20)]))
+    ctx.db.seed("alerts", [("no-timestamp", {"message": "legacy alert"})])
+
+    first = ctx.client.get("/alerts")
+    assert first.status_code == 200
+    assert len(first.get_json()) == DEFAULT_PAGE_SIZE
+    cursor = first.headers[NEXT_PAGE_HEADER]
+    assert cursor == first.get_json()[-1]["id"]
+
+    rest = ctx.client.get(f"/alerts?start_after={cursor}")
+    assert len(rest.get_json()) == 20
+    assert NEXT_PAGE_HEADER not in rest.headers
+
+    # Documents without ``timestamp`` are left out by order_by("timestamp")
+    ids = {alert["id"] for alert in first.get_json() + rest.get_json()}
+    assert ids == {doc_id for doc_id, _ in generate_alerts(DEFAULT_PAGE_SIZE + 20, ctx.args.seed)}
+
+
+def test_exact_page_has_no_next_cursor():
+    ctx = Context(parse_args(["--alerts", "5"]))
+    response = ctx.client.get("/alerts?limit=5")
+    assert len(response.get_json()) == 5
+    assert NEXT_PAGE_HEADER not in response.headers
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.fake_firestore import FakeFirestore
+from firestore_batch import BatchedWriter
+from rollups import RollupAggregator, load_timeseries
+
+T0 = 1_700_000_040  # Start of a minute
+
+
+def rollup(writer, timestamps, counts, run_id):
+    aggregator = RollupAggregator(writer, "gate", run_id=run_id)
+    aggregator.add_many(timestamps, counts)
+    aggregator.flush()
+    return aggregator
+
+
+def series(db, seconds, step):
+    start = datetime.fromtimestamp(T0, timezone.utc)
+    end = datetime.fromtimestamp(T0 + seconds, timezone.utc)
+    return load_timeseries(db, "gate", start, end, step=step)["points"]
+
+
+def test_overlapping_runs_merge_into_the_same_buckets():
+    rng = np.random.default_rng(7)
+    timestamps = T0 + np.arange(0, 120, 0.1)
+    counts = rng.integers(0, 40, len(timestamps))
+
+    merged_db, single_db = FakeFirestore(), FakeFirestore()
+    with BatchedWriter(merged_db, background=False) as writer:
+        # Two runs (two workers, or a restart) each saw every other frame of the same two minutes
+        rollup(writer, timestamps[::2], counts[::2], run_id="run-a")
+        rollup(writer, timestamps[1::2], counts[1::2], run_id="run-b")
+    with BatchedWriter(single_db, background=False) as writer:
+        rollup(writer, timestamps, counts, run_id="only")
+
+    for step in (1, 10, 60):
+        assert series(merged_db, 120, step) == series(single_db, 120, step)
+
+    minutes = series(merged_db, 120, 60)
+    assert [point["samples"] for point in minutes] == [600, 600]
+    assert minutes[0]["max"] == counts[:600].max()
+    assert minutes[1]["min"] == counts[600:].min()
+    assert minutes[0]["mean"] == round(counts[:600].mean(), 2)
+
+
+def test_late_frame_for_a_forgotten_document_is_written_as_a_new_part():
+    db = FakeFirestore()
+    with BatchedWriter(db, background=False) as writer:
+        # The flush after T0 + 70 forgets the first minute's 1 s document
+        aggregator = rollup(writer, [T0 + 1, T0 + 70], [5, 7], run_id="live")
+        aggregator.add(T0 + 3, 30)
+        aggregator.flush()
+
+    parts = {doc.id for doc in db.collection("crowd_rollups").stream() if doc.id.startswith("gate_1s_")}
+    assert len(parts) == 3  # Minute 0 as parts 0 and 1, minute 1 as part 0
+
+    points = series(db, 60, 1)
+    assert [(point["time"][17:19], point["max"]) for point in points] == [("01", 5), ("03", 30)]
+    assert [point["samples"] for point in series(db, 120, 60)] == [2, 1]
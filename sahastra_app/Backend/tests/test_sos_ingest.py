@@ -0,0 +1,58 @@
+import pytest
+
+from benchmarks.fake_firestore import FakeFirestore
+from sos_ingest import SOS_COLLECTION, SosIngestor, SosLog
+
+
+def stored_ids(db):
+    return {doc.id for doc in db.collection(SOS_COLLECTION).stream()}
+
+
+@pytest.fixture
+def ingestor(tmp_path):
+    ingestor = SosIngestor(FakeFirestore(), wal_dir=str(tmp_path), fsync=False, commit_interval=60)
+    yield ingestor
+    ingestor.close()
+
+
+def test_repeat_sos_from_one_device_is_collapsed(ingestor):
+    first, duplicate = ingestor.submit(28.6, 77.2, "phone-1")
+    assert not duplicate
+    assert ingestor.submit(28.7, 77.3, "phone-1") == (first, True)
+    assert ingestor.submit(28.6, 77.2, "phone-2")[1] is False
+
+    assert ingestor.commit() == 2
+    assert first in stored_ids(ingestor.db)
+
+
+def test_failed_append_is_not_remembered_as_a_duplicate(ingestor, monkeypatch):
+    def full_disk(record):
+        raise OSError(28, "No space left on device")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ingestor.log, "append", full_disk)
+        with pytest.raises(OSError):
+            ingestor.submit(28.6, 77.2, "phone-1")
+
+    sos_id, duplicate = ingestor.submit(28.6, 77.2, "phone-1")
+    assert not duplicate
+    ingestor.commit()
+    assert stored_ids(ingestor.db) == {sos_id}
+
+
+def test_log_left_by_a_crashed_worker_is_replayed(tmp_path):
+    orphan = SosLog(str(tmp_path / "sos-1-dead.log"), fsync=False)
+    for i in range(3):
+        orphan.append({"id": f"sos{i}", "latitude": 28.6, "longitude": 77.2, "device_id": None,
+                       "timestamp": f"2026-01-01T00:00:0{i}"})
+    orphan.set_checkpoint(0)
+    orphan.close()  # Crashed before committing anything
+
+    db = FakeFirestore()
+    ingestor = SosIngestor(db, wal_dir=str(tmp_path), fsync=False, commit_interval=60)
+    try:
+        assert ingestor.replayed == 3
+        assert stored_ids(db) == {"sos0", "sos1", "sos2"}
+        assert not (tmp_path / "sos-1-dead.log").exists()
+    finally:
+        ingestor.close()
@@ -0,0 +1,43 @@
+from surge_detector import SurgeDetector, SurgeEvent
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def feed(detector, counts, start=0, **kwargs):
+    return [detector.update(start + i, count, **kwargs) for i, count in enumerate(counts)]
+
+
+def test_hysteresis_keeps_a_crowd_hovering_at_the_limit_high():
+    plain = SurgeDetector("gate", threshold=10, window_frames=3)
+    assert feed(plain, [10, 9, 8]) == [None, None, None]
+
+    sticky = SurgeDetector("gate", threshold=10, window_frames=3, hysteresis=2)
+    assert feed(sticky, [10, 9, 8])[-1] == SurgeEvent("gate", [0, 1, 2], 10)
+
+    # Dropping below threshold - hysteresis releases it, and 9 is no longer enough
+    sticky.reset()
+    assert feed(sticky, [10, 7, 9]) == [None, None, None]
+
+
+def test_cooldown_suppresses_repeat_alerts_until_it_expires():
+    clock = Clock()
+    detector = SurgeDetector("gate", threshold=10, window_frames=2, cooldown=30, clock=clock)
+    assert feed(detector, [12, 11])[-1] == SurgeEvent("gate", [0, 1], 12)
+
+    clock.now = 10
+    assert feed(detector, [12, 12, 12], start=2) == [None, None, None]
+
+    clock.now = 31
+    assert detector.update(5, 13) == SurgeEvent("gate", [4, 5], 13)
+
+
+def test_turbulent_frames_are_high_at_a_lower_count():
+    detector = SurgeDetector("gate", threshold=10, window_frames=2, turbulence_threshold=1.0, turbulence_factor=0.5)
+    assert feed(detector, [6, 6], turbulence=0.5) == [None, None]
+    assert feed(detector, [6, 6], start=2, turbulence=1.5)[-1] == SurgeEvent("gate", [2, 3], 6)
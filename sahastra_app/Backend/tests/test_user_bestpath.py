@@ -0,0 +1,46 @@
+import clients
+import annotation_cache
+import user_bestpath
+from annotation_cache import PersonTracks, StaticProvider
+from benchmarks.fake_firestore import FakeFirestore
+from exit_engine import ExitsTable
+
+
+class SwitchingRegistry:
+    """Exits registry whose table can be replaced mid-run, like a listener update."""
+
+    def __init__(self, table):
+        self.version = 1
+        self._table = table
+
+    def replace(self, table):
+        self._table = table
+        self.version += 1
+
+    def snapshot(self):
+        return self.version, self._table
+
+
+def test_exit_ids_follow_reordered_exits_table():
+    db = FakeFirestore()
+    clients.set_client("firestore", db)
+    registry = SwitchingRegistry(ExitsTable(["A", "B"], [(0.0, 0.5), (1.0, 0.5)], [0, 0], [0, 0]))
+    clients.set_client("exits_registry", registry)
+
+    # Person 1 stays next to exit A, person 2 next to exit B, for four frames
+    rows = [(person, float(second), x - 0.05, 0.45, x + 0.05, 0.55)
+            for person, x in ((1, 0.1), (2, 0.9)) for second in range(4)]
+    annotation_cache.set_provider(StaticProvider({user_bestpath.VIDEO_FILE: PersonTracks.from_rows(rows)},
+                                                 "reordered-exits"))
+
+    def progress(stage, frames_processed=0, **stats):
+        if frames_processed == 1:
+            # Exits reordered and a new, far-away one added: table indices no longer match
+            registry.replace(ExitsTable(["C", "B", "A"], [(0.5, -5.0), (1.0, 0.5), (0.0, 0.5)], [0, 0, 0], [0, 0, 0]))
+
+    summary = user_bestpath.analyze_crowd_density(progress)
+
+    stored = {(d["person_id"], d["frame_number"]): d["current_exit"]
+              for d in (doc.to_dict() for doc in db.collection("person_exits").stream())}
+    assert stored == {(1, 0): "A", (2, 0): "B"}
+    assert summary["frames"] == 4
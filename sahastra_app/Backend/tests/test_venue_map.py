@@ -0,0 +1,21 @@
+from venue_map import get_venue_map
+
+
+def test_missing_or_broken_map_falls_back_to_straight_lines(tmp_path, capsys):
+    path = str(tmp_path / "venue.txt")
+    assert get_venue_map(path) is None
+    assert get_venue_map(path) is None
+    assert capsys.readouterr().out.count("unavailable") == 1
+
+    (tmp_path / "venue.txt").write_text("")
+    assert get_venue_map(path) is None
+
+    (tmp_path / "venue.txt").write_text("....\n.##.\n....\n")
+    venue = get_venue_map(path)
+    assert venue.shape == (3, 4)
+    assert get_venue_map(path) is venue
+
+    broken = str(tmp_path / "venue.npy")
+    (tmp_path / "venue.npy").write_bytes(b"")
+    assert get_venue_map(broken) is None
+    assert "unavailable" in capsys.readouterr().out
@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import shutil
+
+import numpy as np
+
+# ✅ STORE SETTINGS
+TRACK_STORE_DIR = os.environ.get("TRACK_STORE_DIR")  # Set to keep runs as memory-mapped files
+TRACK_STORE_KEEP_RUNS = int(os.environ.get("TRACK_STORE_KEEP_RUNS", 20))  # Older runs are deleted
+RUN_PREFIX = "run_"
+COLUMNS = (("frame", np.int32), ("track_id", np.int64), ("x", np.float32), ("y", np.float32),
+           ("exit_index", np.int32))
+
+
+class TrackStore:
+    """Struct-of-arrays record of one exit-assignment run.
+
+    One row per person per frame, sorted by frame, with typed NumPy columns.
+    Exit ids and descriptions are stored once; rows refer to them by
+    ``exit_index`` (-1 when no exit was available). Frame-range queries
+    return views over the same arrays, never copies.
+    """
+
+    def __init__(self, frame, track_id, x, y, exit_index, exit_ids, exit_descriptions):
+        self.frame = frame
+        self.track_id = track_id
+        self.x = x
+        self.y = y
+        self.exit_index = exit_index
+        self.exit_ids = list(exit_ids)
+        self.exit_descriptions = list(exit_descriptions)
+        self._track_order = None
+
+    @classmethod
+    def from_tracks(cls, tracks, fps, exit_indices, table):
+        """Builds a store from PersonTracks and their assigned exit indices."""
+        frames = tracks.frame_numbers(fps)
+        order = np.argsort(frames, kind="stable")
+        centroids = tracks.centroids()[order]
+        return cls(
+            frames[order].astype(np.int32),
+            tracks.track_id[order],
+            centroids[:, 0].astype(np.float32),
+            centroids[:, 1].astype(np.float32),
+            np.asarray(exit_indices)[order].astype(np.int32),
+            table.exit_ids,
+            table.descriptions
+        )
+
+    def __len__(self):
+        return len(self.frame)
+
+    def exit_lookup(self, table):
+        """Array mapping ``table`` exit indices to this store's; index -1 maps to -1.
+
+        Exits the store has not seen yet are appended, so rows written
+        before the exits table changed keep pointing at the right exit.
+        """
+        known = {exit_id: i for i, exit_id in enumerate(self.exit_ids)}
+        lookup = []
+        for exit_id, description in zip(table.exit_ids, table.descriptions):
+            if exit_id not in known:
+                known[exit_id] = len(self.exit_ids)
+                self.exit_ids.append(exit_id)
+                self.exit_descriptions.append(description)
+            lookup.append(known[exit_id])
+        return np.array(lookup + [-1], dtype=np.int32)
+
+    def _columns(self):
+        return [getattr(self, name) for name, _ in COLUMNS]
+
+    def _view(self, index):
+        return TrackStore(*[column[index] for column in self._columns()], self.exit_ids, self.exit_descriptions)
+
+    def centroids(self):
+        return np.stack([self.x, self.y], axis=1)
+
+    def frame_range(self, start=None, end=None):
+        """Rows with ``start <= frame <= end`` as a zero-copy view."""
+        lo = 0 if start is None else np.searchsorted(self.frame, start, side="left")
+        hi = len(self) if end is None else np.searchsorted(self.frame, end, side="right")
+        return self._view(slice(lo, hi))
+
+    def track(self, track_id):
+        """All rows of one person, in frame order."""
+        if self._track_order is None:
+            self._track_order = np.argsort(self.track_id, kind="stable")
+        ids = self.track_id[self._track_order]
+        lo, hi = np.searchsorted(ids, track_id, side="left"), np.searchsorted(ids, track_id, side="right")
+        return self._view(self._track_order[lo:hi])
+
+    def frame_counts(self):
+        """``(frame_numbers, people_counts)`` arrays."""
+        return np.unique(self.frame, return_counts=True)
+
+    def iter_rows(self):
+        """Yields ``(track_id, frame, x, y, exit_id)`` tuples in frame order."""
+        exit_ids = self.exit_ids + [None]  # exit_index -1 -> None
+        return zip(
+            self.track_id.tolist(),
+            self.frame.tolist(),
+            self.x.tolist(),
+            self.y.tolist(),
+            (exit_ids[i] for i in self.exit_index.tolist())
+        )
+
+    def iter_records(self):
+        """Yields the JSON records ``/run_crowd_navigation`` has always returned."""
+        descriptions = self.exit_descriptions + ["No Description"]
+        for (person_id, frame, x, y, exit_id), exit_index in zip(self.iter_rows(), self.exit_index.tolist()):
+            yield {
+                "frame": frame,
+                "person_id": person_id,
+                "x": round(x, 2),
+                "y": round(y, 2),
+                "exit_id": exit_id,
+                "exit_description": descriptions[exit_index]
+            }
+
+    def save(self, path):
+        """Writes one ``.npy`` per column plus ``exits.json`` into directory ``path``."""
+        os.makedirs(path, exist_ok=True)
+        for name, dtype in COLUMNS:
+            np.save(os.path.join(path, f"{name}.npy"), np.asarray(getattr(self, name), dtype=dtype))
+        with open(os.path.join(path, "exits.json"), "w") as f:
+            json.dump({"exit_ids": self.exit_ids, "exit_descriptions": self.exit_descriptions}, f)
+
+    @classmethod
+    def open(cls, path, mmap_mode="r"):
+        """Opens a saved store with memory-mapped columns."""
+        columns = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name, _ in COLUMNS]
+        with open(os.path.join(path, "exits.json")) as f:
+            exits = json.load(f)
+        return cls(*columns, exits["exit_ids"], exits["exit_descriptions"])
+
+
+def save_run(store, base_dir=TRACK_STORE_DIR, keep=TRACK_STORE_KEEP_RUNS):
+    """Saves ``store`` as a new run under ``base_dir`` and reopens it memory-mapped.
+
+    Only the newest ``keep`` runs are kept. Deleting a run does not break
+    stores that still map it; the files go away once they are closed.
+    """
+    path = os.path.join(base_dir, f"{RUN_PREFIX}{int(time.time() * 1000)}")
+    store.save(path)
+    runs = sorted((name for name in os.listdir(base_dir) if name.startswith(RUN_PREFIX)),
+                  key=lambda name: int(name[len(RUN_PREFIX):]) if name[len(RUN_PREFIX):].isdigit() else -1)
+    for name in runs[:-max(keep, 1)]:
+        shutil.rmtree(os.path.join(base_dir, name), ignore_errors=True)
+    return TrackStore.open(path)
+
+
+def json_chunks(store, message, dumps=json.dumps):
+    """Streams ``{"message": ..., "results": [records]}`` without building the list."""
+    yield '{"message": ' + dumps(message) + ', "results": ['
+    for i, record in enumerate(store.iter_records()):
+        yield ("," if i else "") + dumps(record)
+    yield "]}"
@@ -1,155 +1,230 @@
-import os
-import time
 import math
-from datetime import datetime
-from google.cloud import videointelligence, firestore
-import json
-from google.oauth2 import service_account
+import time
+import logging
+import numpy as np
+from collections import OrderedDict
+from google.cloud import firestore
 
+from annotation_cache import get_person_tracks
+from exit_engine import ExitsTable, IncrementalAssigner
+from firestore_batch import BatchedWriter
+from track_store import TrackStore
+from clients import get_exits_registry, lazy_firestore
+from metrics import STAGE_SECONDS, stage_timer
 
-# ✅ Load Firebase credentials from environment variable
-service_account_info = json.loads(os.environ["GOOGLE_APPLICATION_CREDENTIALS_JSON"])
-credentials = service_account.Credentials.from_service_account_info(service_account_info)
 
+log = logging.getLogger(__name__)
 
-# ✅ GOOGLE CLOUD FIRESTORE SETUP
-PROJECT_ID = "cedar-spring-455002-r4"
-DATABASE_ID = "crowddensity"
 
-# ✅ Initialize Firestore using the credentials
-db = firestore.Client(credentials=credentials, project=PROJECT_ID, database=DATABASE_ID)
+# ✅ GOOGLE CLOUD FIRESTORE SETUP (shared client, created on first use)
+db = lazy_firestore()
 
 
 # ✅ CONSTANTS
 FPS = 1  # Reduced Frames per second to process fewer frames
 VIDEO_FILE = "gs://stampede_video/video.mp4"
 PENALTY_FACTOR = 10  # Adjust this to balance congestion impact
+MAX_TRACKED_PEOPLE = 10000  # Upper bound on people remembered during one run
+TRACK_TTL_FRAMES = 30  # Forget people not seen for this many frames
+MIN_DWELL_FRAMES = 0  # Frames a new exit must hold before it is stored (0 = off)
 
 
-# ✅ Cache to track last assigned exits
-person_last_exit = {}
+class PersonExitTracker:
+   """Per-run record of the last exit stored for each person.
 
+   People are kept in least-recently-seen order, so tracks that left the
+   scene more than ``ttl_frames`` ago (or beyond ``max_people``) are
+   dropped in O(1). With ``min_dwell_frames`` a changed exit is only stored
+   once it has been the best exit for that many frames, which stops people
+   flickering between two exits from causing a write per frame.
+   ``on_evict(person_id)`` is called for every person dropped.
+   """
 
-def fetch_exits():
-   """Fetches exits from Firestore, including their coordinates and congestion level."""
-   print("🔄 Fetching exit points from Firestore...")
-   exit_ref = db.collection("exit_points").stream()
-   exits = {}
-   for doc in exit_ref:
-       data = doc.to_dict()
-       exits[data["exit_id"]] = {
-           "coordinates": data["coordinates"],
-           "congestion_level": data.get("congestion_level", 0)
-       }
-   print(f"✅ Found {len(exits)} exits: {list(exits.keys())}")
-   return exits
+   def __init__(self, writer, max_people=MAX_TRACKED_PEOPLE, ttl_frames=TRACK_TTL_FRAMES,
+                min_dwell_frames=MIN_DWELL_FRAMES, on_evict=None):
+       self.writer = writer
+       self.on_evict = on_evict
+       self.max_people = max_people
+       self.ttl_frames = ttl_frames
+       self.min_dwell_frames = min_dwell_frames
+       self.writes = 0
+       self.evicted = 0
+       # person_id -> [stored_exit, candidate_exit, candidate_since, last_seen]
+       self._people = OrderedDict()
 
 
-def calculate_distance(coord1, coord2):
-   """Calculates Euclidean distance between two points."""
-   return math.sqrt((coord1["x"] - coord2["x"]) ** 2 + (coord1["y"] - coord2["y"]) ** 2)
+   def __len__(self):
+       return len(self._people)
 
 
-def find_best_exit(person_coords, exits):
-   """Finds the best exit based on distance and congestion level."""
-   best_exit = None
-   best_score = float("inf")
-   print(f"\n🔍 Finding best exit for Person at {person_coords}")
+   def observe(self, frame_number, person_id, best_exit):
+       """Records the person's best exit; returns True if a write was queued."""
+       state = self._people.pop(person_id, None)
+       if state is None:
+           state = [None, best_exit, frame_number, frame_number]
 
 
-   for exit_id, exit_data in exits.items():
-       distance = calculate_distance(person_coords, exit_data["coordinates"])
-       congestion = exit_data["congestion_level"]
-       weighted_score = distance + (congestion * PENALTY_FACTOR)
+       stored_exit, candidate_exit, candidate_since, _ = state
+       if best_exit != candidate_exit:
+           candidate_exit, candidate_since = best_exit, frame_number
 
 
-       print(f"➡ Exit {exit_id}: Distance = {distance:.2f}, Congestion = {congestion}, Score = {weighted_score:.2f}")
+       changed = best_exit != stored_exit and (
+           stored_exit is None or frame_number - candidate_since >= self.min_dwell_frames
+       )
+       if changed:
+           stored_exit = best_exit
+           self._write(frame_number, person_id, best_exit)
 
 
-       if weighted_score < best_score:
-           best_score = weighted_score
-           best_exit = exit_id
+       self._people[person_id] = [stored_exit, candidate_exit, candidate_since, frame_number]
+       self._evict(frame_number)
+       return changed
 
 
-   print(f"✅ Best Exit Selected: {best_exit}\n")
-   return best_exit
+   def _write(self, frame_number, person_id, best_exit):
+       # Composite document ID to avoid overwrites
+       doc_id = f"{person_id}_{frame_number}"
+       doc_ref = db.collection("person_exits").document(doc_id)
 
 
-def store_person_exit(frame_number, person_id, best_exit):
-   """Stores new/different exits for a person in Firestore with timestamp."""
-   global person_last_exit
+       data = {
+           "person_id": person_id,
+           "frame_number": frame_number,
+           "current_exit": best_exit,
+           "last_updated": firestore.SERVER_TIMESTAMP
+       }
+       self.writer.set(doc_ref, data)
+       self.writes += 1
 
 
-   if person_id in person_last_exit and person_last_exit[person_id] == best_exit:
-       print(f"🔁 Person {person_id}: Exit unchanged → {best_exit} (not stored again)")
-       return
+   def _evict(self, frame_number):
+       while len(self._people) > self.max_people:
+           self._drop_oldest()
 
 
-   # Update the cache with new exit
-   person_last_exit[person_id] = best_exit
+       while self._people:
+           oldest_state = next(iter(self._people.values()))
+           if frame_number - oldest_state[3] <= self.ttl_frames:
+               break
+           self._drop_oldest()
 
 
-   # Composite document ID to avoid overwrites
-   doc_id = f"{person_id}_{frame_number}"
-   doc_ref = db.collection("person_exits").document(doc_id)
+   def _drop_oldest(self):
+       person_id, _ = self._people.popitem(last=False)
+       self.evicted += 1
+       if self.on_evict:
+           self.on_evict(person_id)
 
 
-   data = {
-       "person_id": person_id,
-       "frame_number": frame_number,
-       "current_exit": best_exit,
-       "last_updated": firestore.SERVER_TIMESTAMP
-   }
-   doc_ref.set(data)
-   print(f"📥 Stored → Person {person_id} | Frame {frame_number} | Exit: {best_exit}")
+def fetch_exits():
+   """Exits with their coordinates and congestion level, from the live exits registry."""
+   return get_exits_registry().exits()
 
 
-def analyze_crowd_density():
-   """Analyzes the video for crowd density and assigns exits to people."""
-   client = videointelligence.VideoIntelligenceServiceClient()
-   features = [videointelligence.Feature.OBJECT_TRACKING]
-   request = videointelligence.AnnotateVideoRequest(input_uri=VIDEO_FILE, features=features)
+def calculate_distance(coord1, coord2):
+   """Calculates Euclidean distance between two points."""
+   return math.sqrt((coord1["x"] - coord2["x"]) ** 2 + (coord1["y"] - coord2["y"]) ** 2)
 
 
-   print("🔄 Processing video... (this may take a while)")
-   operation = client.annotate_video(request=request)
-   result = operation.result(timeout=600)
-   annotations = result.annotation_results[0].object_annotations
+def find_best_exit(person_coords, exits=None):
+   """Finds the best exit based on distance and congestion level.
+
+   ``exits`` is a compiled ExitsTable or a ``fetch_exits()`` dict; the
+   registry's shared table is reused for the current exits.
+   """
+   table = exits if isinstance(exits, ExitsTable) else get_exits_registry().table_for(exits)
+   point = [(person_coords["x"], person_coords["y"])]
+   best_exit = table.exit_id(find_best_exits(point, table)[0])
+
+
+   # Per-exit breakdown only when debugging; skipped entirely otherwise
+   if log.isEnabledFor(logging.DEBUG):
+       log.debug("🔍 Finding best exit for Person at %s", person_coords)
+       distances = table.distances(point)[0]
+       scores = distances + table.offsets(PENALTY_FACTOR, 0)
+       for exit_id, distance, congestion, weighted_score in zip(table.exit_ids, distances, table.congestion, scores):
+           log.debug("➡ Exit %s: Distance = %.2f, Congestion = %g, Score = %.2f", exit_id, distance, congestion, weighted_score)
+       log.debug("✅ Best Exit Selected: %s", best_exit)
+   return best_exit
+
+
+def find_best_exits(points, table):
+   """Finds the best exit index for every row of an (N, 2) array of person centroids."""
+   return table.best_exit_indices(points, PENALTY_FACTOR, 0)
 
 
-   exits = fetch_exits()
-   frame_counts = {}
+def store_person_exit(frame_number, person_id, best_exit, tracker):
+   """Queues new/different exits for a person for a batched Firestore write."""
+   if not tracker.observe(frame_number, person_id, best_exit):
+       return  # Exit unchanged, nothing stored
+
+
+   log.debug("📥 Stored → Person %s | Frame %s | Exit: %s", person_id, frame_number, best_exit)
+
+
+def analyze_crowd_density(progress=None):
+   """Analyzes the video for crowd density and assigns exits to people."""
+   print("🔄 Processing video... (this may take a while)")
+   if progress:
+       progress(stage="annotating")
+   tracks = get_person_tracks(VIDEO_FILE)
 
 
-   for annotation in annotations:
-       if annotation.entity.description.lower() == "person":
-           person_id = annotation.track_id
+   with stage_timer("exit_fetch"):
+       registry = get_exits_registry()
+       exits_version, table = registry.snapshot()
+   store = TrackStore.from_tracks(tracks, FPS, np.full(len(tracks), -1), table)
+   frame_numbers, frame_counts = store.frame_counts()
+   assigner = IncrementalAssigner(table, PENALTY_FACTOR, 0)
+   exit_lookup = store.exit_lookup(table)  # Assigner indices -> store indices
+   rows_processed = 0
+   assign_seconds = 0.0
 
 
-           for frame in annotation.frames:
-               time_offset = frame.time_offset
-               seconds = time_offset.seconds + (time_offset.microseconds / 1e6)
-               frame_number = int(seconds * FPS)
+   with BatchedWriter(db) as writer:
+       tracker = PersonExitTracker(writer, on_evict=assigner.forget)
 
 
-               box = frame.normalized_bounding_box
-               x, y = (box.left + box.right) / 2, (box.top + box.bottom) / 2
+       for frames_processed, frame_number in enumerate(frame_numbers.tolist(), 1):
+           if registry.version != exits_version:
+               # Congestion changed mid-run: re-score cached distances
+               exits_version, table = registry.snapshot()
+               assigner.set_table(table)
+               exit_lookup = store.exit_lookup(table)
 
 
-               if frame_number not in frame_counts:
-                   frame_counts[frame_number] = 0
-               frame_counts[frame_number] += 1
+           # Only people who moved since their exit was last measured are re-scored
+           frame = store.frame_range(frame_number, frame_number)
+           misses = assigner.misses
+           started = time.perf_counter()
+           frame.exit_index[:] = exit_lookup[assigner.assign(frame.track_id.tolist(), frame.centroids())]
+           assign_seconds += time.perf_counter() - started
 
 
-               print(f"🎥 Processing Frame {frame_number}: Person {person_id} at ({x:.2f}, {y:.2f})")
+           for person_id, _, x, y, best_exit in frame.iter_rows():
+               store_person_exit(frame_number, person_id, best_exit, tracker)
+           rows_processed += len(frame)
+           log.debug("🎥 Processed Frame %s: %d people, %d re-scored", frame_number, len(frame), assigner.misses - misses)
 
 
-               person_coords = {"x": x, "y": y}
-               best_exit = find_best_exit(person_coords, exits)
-               store_person_exit(frame_number, person_id, best_exit)
+           if progress:
+               progress(stage="processing", rows_processed=rows_processed, rows_total=len(store),
+                        frames_processed=frames_processed, writes_flushed=writer.writes_flushed,
+                        **assigner.stats())
 
 
-   print("✅ Crowd density analysis with exit assignment completed!")
+   STAGE_SECONDS.observe(assign_seconds, stage="assignment")
+   summary = writer.stats()
+   summary.update(assigner.stats())
+   summary.update({
+       "frames": len(frame_numbers),
+       "peak_people": int(frame_counts.max()) if len(frame_counts) else 0,
+       "exit_changes": tracker.writes,
+       "tracks_evicted": tracker.evicted
+   })
+   print(f"✅ Crowd density analysis with exit assignment completed! {summary}")
+   return summary
 
-def run_user_exit_assignment():
-    analyze_crowd_density()
\ No newline at end of file
+def run_user_exit_assignment(progress=None):
+    return analyze_crowd_density(progress)
\ No newline at end of file
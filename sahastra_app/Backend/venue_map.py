@@ -0,0 +1,174 @@
+import os
+import threading
+
+import numpy as np
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+except ImportError:  # SciPy is optional, NumPy relaxation gives the same fields (slower on mazes)
+    dijkstra = None
+
+# ✅ VENUE MAP SETTINGS
+VENUE_MAP_FILE = os.environ.get("VENUE_MAP_FILE")  # .npy (non-zero = blocked) or text grid ('#' = blocked)
+MAX_CACHED_FIELDS = 8  # Exit layouts whose distance fields are kept per map
+
+_MOVES = ((-1, 0, 1.0, 0.0), (1, 0, 1.0, 0.0), (0, -1, 0.0, 1.0), (0, 1, 0.0, 1.0),
+          (-1, -1, 1.0, 1.0), (-1, 1, 1.0, 1.0), (1, -1, 1.0, 1.0), (1, 1, 1.0, 1.0))
+
+
+def load_occupancy(path):
+    """Reads a venue occupancy grid; True marks walls and barriers."""
+    if path.endswith(".npy"):
+        return np.load(path, allow_pickle=False) != 0
+    with open(path) as f:
+        lines = [line.rstrip("\r\n") for line in f if line.strip()]
+    width = max(len(line) for line in lines)
+    return np.array([[ch == "#" for ch in line.ljust(width)] for line in lines], dtype=bool)
+
+
+def distance_field(blocked, sources):
+    """Walking distance from every cell to the nearest ``sources`` cell.
+
+    ``sources`` is a stack (K, rows, cols) of boolean masks, giving one
+    field per mask over 8-connected shortest paths. Distances are in
+    normalized image units (one cell is ``1 / cols`` wide and ``1 / rows``
+    tall), so they stay comparable to the Euclidean distances they replace.
+    Paths never cross a blocked cell, but a blocked cell still gets the
+    distance of its best free neighbour so people drawn on a wall are not
+    stranded. Unreachable cells are ``inf``.
+    """
+    spreads = ~blocked | sources.any(axis=0)
+    if dijkstra is not None:
+        return _dijkstra_fields(spreads, sources)
+    return _relaxed_fields(spreads, sources)
+
+
+def _move_costs(rows, cols):
+    return [np.hypot(dy_cost / rows, dx_cost / cols) for _, _, dy_cost, dx_cost in _MOVES]
+
+
+def _dijkstra_fields(spreads, sources):
+    rows, cols = spreads.shape
+    cells = np.arange(rows * cols).reshape(rows, cols)
+    starts, ends, weights = [], [], []
+    for (dy, dx, _, _), cost in zip(_MOVES, _move_costs(rows, cols)):
+        # Edge from neighbour (r + dy, c + dx) back to (r, c): searching outward
+        # from the exit yields the distance *to* the exit for every cell
+        r0, r1, c0, c1 = max(0, -dy), rows - max(0, dy), max(0, -dx), cols - max(0, dx)
+        neighbour = (slice(r0 + dy, r1 + dy), slice(c0 + dx, c1 + dx))
+        keep = spreads[neighbour]
+        starts.append(cells[neighbour][keep])
+        ends.append(cells[r0:r1, c0:c1][keep])
+        weights.append(np.full(keep.sum(), cost))
+
+    graph = csr_matrix((np.concatenate(weights), (np.concatenate(starts), np.concatenate(ends))),
+                       shape=(rows * cols, rows * cols))
+    fields = [dijkstra(graph, indices=np.flatnonzero(mask), min_only=True) for mask in sources]
+    return np.stack(fields).reshape(sources.shape)
+
+
+def _relaxed_fields(spreads, sources):
+    # Shifted NumPy minimums over the whole stack until nothing changes
+    rows, cols = spreads.shape
+    dist = np.where(sources, 0.0, np.inf)
+    pad = ((0, 0), (1, 1), (1, 1))
+    costs = _move_costs(rows, cols)
+    while True:
+        padded = np.pad(np.where(spreads, dist, np.inf), pad, constant_values=np.inf)
+        relaxed = dist.copy()
+        for (dy, dx, _, _), cost in zip(_MOVES, costs):
+            np.minimum(relaxed, padded[..., 1 + dy:1 + dy + rows, 1 + dx:1 + dx + cols] + cost, out=relaxed)
+        if np.array_equal(relaxed, dist):
+            return dist
+        dist = relaxed
+
+
+class VenueMap:
+    """Occupancy grid of the venue with one precomputed distance field per exit.
+
+    Fields are built once per exit layout, so scoring a person against
+    every exit is a single array lookup no matter how many people there are.
+    """
+
+    def __init__(self, blocked, source=None):
+        self.blocked = np.asarray(blocked, dtype=bool)
+        self.source = source
+        self._fields = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_occupancy(path), source=path)
+
+    @property
+    def shape(self):
+        return self.blocked.shape
+
+    def cells(self, points):
+        """(row, col) grid cells of an (N, 2) array of normalized points."""
+        rows, cols = self.shape
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        col = np.clip((points[:, 0] * cols).astype(np.int64), 0, cols - 1)
+        row = np.clip((points[:, 1] * rows).astype(np.int64), 0, rows - 1)
+        return row, col
+
+    def fields(self, coordinates):
+        """(M, rows, cols) float32 distance fields for the given exit coordinates."""
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        key = coordinates.tobytes()
+        fields = self._fields.get(key)
+        if fields is None:
+            with self._lock:
+                fields = self._fields.get(key)
+                if fields is None:
+                    fields = self._build_fields(coordinates)
+                    if len(self._fields) >= MAX_CACHED_FIELDS:
+                        self._fields.clear()
+                    self._fields[key] = fields
+        return fields
+
+    def _build_fields(self, coordinates):
+        print(f"🗺️ Building venue distance fields for {len(coordinates)} exits on a {self.shape} grid...")
+        sources = np.zeros((len(coordinates),) + self.shape, dtype=bool)
+        exit_rows, exit_cols = self.cells(coordinates)
+        sources[np.arange(len(coordinates)), exit_rows, exit_cols] = True
+        # One shortest-path pass per exit, only when the map or exit layout changes
+        return distance_field(self.blocked, sources).astype(np.float32)
+
+    def path_distances(self, points, coordinates):
+        """(N, M) walking distances from every point to every exit (``inf`` if walled off)."""
+        row, col = self.cells(points)
+        return self.fields(coordinates)[:, row, col].T
+
+
+_venue = None
+_venue_lock = threading.Lock()
+_venue_failed = None  # Path whose failure was already logged
+
+
+def get_venue_map(path=None):
+    """The configured venue map, reloaded when its file changes.
+
+    None without one, or when the file is missing or unreadable, so
+    callers fall back to straight-line distances; the failure is logged
+    once until the map loads again.
+    """
+    global _venue, _venue_failed
+    path = path or VENUE_MAP_FILE
+    if not path:
+        return None
+
+    with _venue_lock:
+        try:
+            stat = os.stat(path)
+            version = (path, stat.st_mtime_ns, stat.st_size)
+            if _venue is None or _venue[0] != version:
+                _venue = (version, VenueMap.from_file(path))
+        except (OSError, ValueError, EOFError) as e:
+            if _venue_failed != path:
+                print(f"⚠️ Venue map {path} unavailable ({e}), using straight-line distances")
+                _venue_failed = path
+            return None
+        _venue_failed = None
+        return _venue[1]
@@ -0,0 +1,91 @@
+import os
+import json
+
+from clients import get_firestore
+from metrics import count_reads
+
+# ✅ SOURCE SETTINGS
+SOURCES_COLLECTION = "video_sources"
+SOURCES_ENV = "VIDEO_SOURCES_JSON"  # Optional JSON list overriding Firestore
+
+
+class VideoSource:
+    """One camera/entrance: its video, location and alert thresholds."""
+
+    def __init__(self, camera_id, video_uri, latitude, longitude, threshold=None, duration=None):
+        self.camera_id = camera_id
+        self.video_uri = video_uri
+        self.latitude = latitude
+        self.longitude = longitude
+        self.threshold = threshold
+        self.duration = duration
+
+    @classmethod
+    def from_dict(cls, data):
+        location = data.get("location") or {}
+        if not isinstance(location, dict):  # GeoPoint
+            location = {"latitude": location.latitude, "longitude": location.longitude}
+        return cls(
+            data["camera_id"],
+            data["video_uri"],
+            location.get("latitude", data.get("latitude")),
+            location.get("longitude", data.get("longitude")),
+            data.get("threshold"),
+            data.get("duration")
+        )
+
+    def to_dict(self):
+        return {
+            "camera_id": self.camera_id,
+            "video_uri": self.video_uri,
+            "location": {"latitude": self.latitude, "longitude": self.longitude},
+            "threshold": self.threshold,
+            "duration": self.duration
+        }
+
+    def geopoint(self):
+        from google.cloud import firestore
+
+        return firestore.GeoPoint(self.latitude, self.longitude)
+
+    def __repr__(self):
+        return f"VideoSource({self.camera_id!r}, {self.video_uri!r})"
+
+
+class SourceRegistry:
+    """Cameras to analyze, keyed by camera id."""
+
+    def __init__(self, sources=()):
+        self._sources = {}
+        for source in sources:
+            self.add(source)
+
+    def add(self, source):
+        self._sources[source.camera_id] = source
+
+    def get(self, camera_id):
+        return self._sources.get(camera_id)
+
+    def __iter__(self):
+        return iter(self._sources.values())
+
+    def __len__(self):
+        return len(self._sources)
+
+
+def load_sources(default_source=None):
+    """Loads sources from ``VIDEO_SOURCES_JSON`` or the ``video_sources`` collection.
+
+    Falls back to ``default_source`` when neither defines any camera.
+    """
+    raw = os.environ.get(SOURCES_ENV)
+    if raw:
+        registry = SourceRegistry(VideoSource.from_dict(item) for item in json.loads(raw))
+    else:
+        docs = count_reads(get_firestore().collection(SOURCES_COLLECTION).stream(), SOURCES_COLLECTION)
+        registry = SourceRegistry(VideoSource.from_dict(doc.to_dict()) for doc in docs)
+
+    if not len(registry) and default_source is not None:
+        registry.add(default_source)
+    print(f"🎥 Loaded {len(registry)} video sources: {[s.camera_id for s in registry]}")
+    return registry